@@ -0,0 +1,69 @@
+"""
+Compares two benchmark result files written by benchmarks/run.py.
+
+    python benchmarks/compare.py OLD.json NEW.json [--threshold 10]
+
+Prints every metric side by side with the % change and exits with status 1
+if any latency got slower (or throughput or speedup dropped) by more than --threshold %.
+"""
+import argparse
+import json
+import sys
+
+# Metrics (by name suffix) where a bigger number is better: throughputs and the
+# async views' sync/async latency ratio. Everything else is a cost.
+HIGHER_IS_BETTER = ('_per_sec', 'speedup')
+# Counts and settings describing the workload rather than its cost
+IGNORED = ('repeat', 'rows', 'loans', 'status', 'installments', 'regenerated', 'aged', 'updated', 'defaulted',
+           'scenarios')
+
+
+def flatten(prefix, value, out):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            flatten(f"{prefix}.{key}" if prefix else key, item, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark runs.")
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=10.0, help="Regression tolerance in percent")
+    args = parser.parse_args()
+
+    with open(args.old, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(args.new, encoding='utf-8') as f:
+        new = json.load(f)
+
+    print(f"old: {old['commit']} ({old['database']}, {old['timestamp']})")
+    print(f"new: {new['commit']} ({new['database']}, {new['timestamp']})\n")
+
+    old_metrics = flatten('', old['results'], {})
+    new_metrics = flatten('', new['results'], {})
+
+    regressions = []
+    print(f"{'metric':<60} {'old':>12} {'new':>12} {'change':>9}")
+    for key in sorted(set(old_metrics) & set(new_metrics)):
+        name = key.rsplit('.', 1)[-1]
+        if name in IGNORED:
+            continue
+        before, after = old_metrics[key], new_metrics[key]
+        change = ((after - before) / before * 100) if before else 0.0
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        flag = ' <-- regression' if worse > args.threshold else ''
+        if flag:
+            regressions.append(key)
+        print(f"{key:<60} {before:>12.3f} {after:>12.3f} {change:>+8.1f}%{flag}")
+
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) regressed by more than {args.threshold}%.")
+        sys.exit(1)
+    print("\nNo regressions above threshold.")
+
+
+if __name__ == '__main__':
+    main()
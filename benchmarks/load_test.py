@@ -0,0 +1,208 @@
+"""
+Load test for the database connection settings (DB_POOL_MODE, see intellidebt/db_pool.py).
+
+For every --mode it starts gunicorn with that mode, logs in --users concurrent
+users who request --path in a loop for --duration seconds, and reports
+requests/sec, p50/p99 latency, errors and the peak number of database server
+connections (sampled from pg_stat_activity; PostgreSQL only). Uses the database
+DATABASE_URL points at as-is, so seed it first (manage.py generate_portfolio).
+
+    DATABASE_URL=postgres://... python benchmarks/load_test.py --users 200 --mode persistent --mode pool
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --users 20   # an already running server
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.chdir(BASE_DIR)
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'intellidebt.settings')
+django.setup()
+
+from django.db import connection
+
+from run import percentile
+
+LOAD_USER = 'loadtest'
+LOAD_PASSWORD = 'loadtest-pass'
+CONNECTION_SAMPLE_INTERVAL = 0.25
+
+
+# =============================================
+# SERVER + CONNECTION SAMPLING
+# =============================================
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(mode, workers, threads, pool_size):
+    port = free_port()
+    env = {**os.environ, 'DB_POOL_MODE': mode, 'DB_POOL_SIZE': str(pool_size)}
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'intellidebt.wsgi', '--bind', f'127.0.0.1:{port}',
+         '--workers', str(workers), '--threads', str(threads), '--log-level', 'warning'],
+        cwd=BASE_DIR, env=env,
+    )
+    url = f'http://127.0.0.1:{port}'
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(url + '/accounts/login/', timeout=1)
+            return process, url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"gunicorn did not come up on {url}")
+
+
+def server_connections():
+    """Connections to this database other than our own, or None off PostgreSQL."""
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() AND pid <> pg_backend_pid()"
+        )
+        return cursor.fetchone()[0]
+
+
+class ConnectionSampler(threading.Thread):
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.samples = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            count = server_connections()
+            if count is None:
+                return
+            self.samples.append(count)
+            self.stopped.wait(CONNECTION_SAMPLE_INTERVAL)
+        connection.close()
+
+
+# =============================================
+# SIMULATED USERS
+# =============================================
+def login(url):
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    opener.open(url + '/accounts/login/', timeout=30).read()
+    token = next(cookie.value for cookie in jar if cookie.name == 'csrftoken')
+    body = urllib.parse.urlencode({'username': LOAD_USER, 'password': LOAD_PASSWORD, 'csrfmiddlewaretoken': token})
+    request = urllib.request.Request(url + '/accounts/login/', data=body.encode(), headers={'Referer': url + '/'})
+    response = opener.open(request, timeout=30)
+    response.read()
+    if response.geturl().endswith('/accounts/login/'):
+        raise OSError("login rejected")
+    return opener
+
+
+def user_loop(url, paths, state, latencies, errors, ready):
+    try:
+        opener = login(url)
+    except OSError:
+        errors.append('login')
+        return
+    finally:
+        ready.wait()
+    n = 0
+    while time.monotonic() < state['deadline']:
+        path = paths[n % len(paths)]
+        n += 1
+        start = time.perf_counter()
+        try:
+            opener.open(url + path, timeout=60).read()
+            latencies.append(time.perf_counter() - start)
+        except OSError as e:
+            errors.append(str(e))
+
+
+def run_load(url, users, duration, paths):
+    latencies, errors = [], []
+    # Everyone logs in first; the clock starts when all users are ready
+    state = {}
+    ready = threading.Barrier(users + 1, action=lambda: state.update(start=time.monotonic(),
+                                                                     deadline=time.monotonic() + duration))
+    threads = [threading.Thread(target=user_loop, args=(url, paths, state, latencies, errors, ready), daemon=True)
+               for _ in range(users)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    start = state['start']
+    sampler = ConnectionSampler()
+    sampler.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+    sampler.stopped.set()
+    sampler.join()
+
+    samples_ms = [s * 1000 for s in latencies]
+    return {
+        'users': users,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'requests_per_sec': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(samples_ms, 50), 1) if samples_ms else None,
+        'p99_ms': round(percentile(samples_ms, 99), 1) if samples_ms else None,
+        'peak_db_connections': max(sampler.samples) if sampler.samples else None,
+    }
+
+
+def ensure_user():
+    from core.models import User
+
+    user, _ = User.objects.get_or_create(username=LOAD_USER, defaults={'is_staff': True, 'is_superuser': True})
+    user.set_password(LOAD_PASSWORD)
+    user.save()
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-user load test of the DB connection modes.")
+    parser.add_argument('--mode', action='append', help="DB_POOL_MODE to start gunicorn with (repeatable)")
+    parser.add_argument('--url', default=None, help="Test an already running server instead of starting gunicorn")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds of load per mode")
+    parser.add_argument('--path', action='append', help="Page(s) each user requests in turn (default /loans/, /worklist/)")
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn workers")
+    parser.add_argument('--threads', type=int, default=16, help="gunicorn threads per worker")
+    parser.add_argument('--pool-size', type=int, default=4, help="DB_POOL_SIZE for --mode pool")
+    args = parser.parse_args()
+    paths = args.path or ['/loans/', '/worklist/']
+
+    ensure_user()
+    results = {}
+    if args.url:
+        print(f"Load testing {args.url} with {args.users} users for {args.duration:.0f}s...")
+        results['external'] = run_load(args.url.rstrip('/'), args.users, args.duration, paths)
+        print(json.dumps(results['external']))
+    for mode in args.mode or ([] if args.url else ['persistent', 'pool']):
+        print(f"DB_POOL_MODE={mode}: {args.workers} workers x {args.threads} threads, {args.users} users...")
+        process, url = start_gunicorn(mode, args.workers, args.threads, args.pool_size)
+        try:
+            results[mode] = run_load(url, args.users, args.duration, paths)
+        finally:
+            process.terminate()
+            process.wait()
+        print(json.dumps(results[mode]))
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,471 @@
+"""
+IntelliDebt benchmark harness.
+
+Creates a throw-away database, seeds it at each requested scale, runs the
+benchmarks and writes benchmarks/results/<commit>-<vendor>-<timestamp>.json.
+See benchmarks/README.md for usage.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.chdir(BASE_DIR)
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'intellidebt.settings')
+django.setup()
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client as TestClient
+from django.test.utils import setup_test_environment
+from django.urls import reverse
+
+RESULTS_DIR = os.path.join(BASE_DIR, 'benchmarks', 'results')
+SEED_CHUNK = 5000
+
+ALL_BENCHMARKS = ['predict_risk', 'fast_inference', 'batch_scoring', 'explain_batch', 'upload_portfolio', 'update_scores', 'views', 'age_loans', 'generate_schedules', 'forecast', 'snapshot_loans', 'export_analytics', 'async_views', 'worker_rss']
+VIEW_NAMES = ['dashboard', 'loan_list', 'analytics', 'model_performance']
+
+
+# =============================================
+# TIMING HELPERS
+# =============================================
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def measure(fn, repeat, warmup=1):
+    """Runs fn() `repeat` times after `warmup` untimed runs; returns latency stats in ms."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        'repeat': repeat,
+        'p50_ms': round(percentile(samples, 50), 4),
+        'p99_ms': round(percentile(samples, 99), 4),
+        'mean_ms': round(statistics.mean(samples), 4),
+        'min_ms': round(min(samples), 4),
+    }
+
+
+def throughput(count, seconds):
+    return round(count / seconds, 1) if seconds > 0 else None
+
+
+# =============================================
+# DATABASE SETUP + SEEDING
+# =============================================
+def seed_loans(n_loans, seed):
+    """Bulk-inserts a reproducible synthetic book of `n_loans` loans (core.synthetic), chunk by chunk."""
+    from core.synthetic import write_database
+    return write_database(n_loans, seed=seed, chunk_size=SEED_CHUNK, prefix='BEN')
+
+
+def reset_database():
+    """Empties the benchmark database between scales (keeps the schema)."""
+    from django.core.management import call_command
+    call_command('flush', interactive=False, verbosity=0)
+
+
+def feature_rows(limit):
+    """Model-ready feature dicts for the first `limit` seeded loans."""
+    from core.models import Loan
+
+    rows = []
+    for loan in Loan.objects.select_related('client').order_by('id')[:limit].iterator(chunk_size=SEED_CHUNK):
+        income = float(loan.client.monthly_income) or 1
+        collateral = float(loan.collateral_value) or 1
+        rows.append({
+            'Age': loan.client.age, 'Monthly_Income': float(loan.client.monthly_income),
+            'Loan_Amount': float(loan.amount), 'Loan_Tenure': loan.tenure, 'Interest_Rate': float(loan.interest_rate),
+            'Collateral_Value': float(loan.collateral_value), 'Outstanding_Loan_Amount': float(loan.outstanding_amount),
+            'Monthly_EMI': float(loan.monthly_emi), 'Num_Missed_Payments': loan.missed_payments,
+            'Days_Past_Due': loan.days_past_due, 'DTI_Ratio': float(loan.monthly_emi) / income,
+            'Loan_to_Collateral': float(loan.outstanding_amount) / collateral,
+            'Payment_Strain': loan.days_past_due * float(loan.monthly_emi),
+        })
+    return rows
+
+
+# =============================================
+# BENCHMARKS
+# =============================================
+def bench_predict_risk(scale, args):
+    from core.ml_utils import ml_system
+
+    row = feature_rows(1)[0]
+    # Top-level numbers always score (cache off); 'cached' is the same call served by the score cache
+    cache, ml_system.score_cache = ml_system.score_cache, None
+    try:
+        result = measure(lambda: ml_system.predict_risk(row), repeat=args.repeat * 20, warmup=5)
+    finally:
+        ml_system.score_cache = cache
+    if cache is not None:
+        result['cached'] = measure(lambda: ml_system.predict_risk(row), repeat=args.repeat * 20, warmup=5)
+    return result
+
+
+def bench_fast_inference(scale, args):
+    """core.forest_engine vs sklearn on the same forest: single-row latency and batch rows/sec."""
+    import numpy as np
+    from core.forest_engine import FlatForest
+    from core.ml_utils import ml_system
+
+    if not FlatForest.supports(ml_system.serving_model):
+        return {'skipped': f"serving model {ml_system.serving_model_name!r} is not a tree forest"}
+    engine = FlatForest.from_classifier(ml_system.serving_model)
+    rows = feature_rows(min(scale, args.max_batch))
+    X = np.array([[row[col] for col in ml_system.features_list] for row in rows], dtype=np.float32)
+
+    start = time.perf_counter()
+    engine.predict_proba(X)
+    elapsed = time.perf_counter() - start
+    return {
+        'single_row': measure(lambda: engine.predict_proba(X[0]), repeat=args.repeat * 200, warmup=20),
+        'batch_rows': len(X),
+        'batch_rows_per_sec': throughput(len(X), elapsed),
+    }
+
+
+def bench_batch_scoring(scale, args):
+    from core.ml_utils import ml_system
+
+    rows = feature_rows(min(scale, args.max_batch))
+    start = time.perf_counter()
+    ml_system.predict_proba(rows)
+    elapsed = time.perf_counter() - start
+    return {'rows': len(rows), 'seconds': round(elapsed, 4), 'rows_per_sec': throughput(len(rows), elapsed)}
+
+
+def bench_explain_batch(scale, args):
+    from core.ml_utils import ml_system
+
+    rows = feature_rows(min(scale, args.max_batch))
+    start = time.perf_counter()
+    ml_system.explain_batch(rows)
+    elapsed = time.perf_counter() - start
+    return {'rows': len(rows), 'seconds': round(elapsed, 4), 'rows_per_sec': throughput(len(rows), elapsed)}
+
+
+def bench_upload_portfolio(scale, args, client):
+    rows = min(scale, args.max_upload)
+    buffer = io.StringIO()
+    buffer.write("Borrower_ID,Borrower_Name,Age,Monthly_Income,Loan_ID,Loan_Amount,Loan_Tenure,"
+                 "Interest_Rate,Monthly_EMI,Num_Missed_Payments,Days_Past_Due\n")
+    for n in range(rows):
+        buffer.write(f"UPB_{n},Upload {n},35,80000,UPBL_{n},250000,24,12.5,12000,{n % 3},{(n * 7) % 120}\n")
+    upload = SimpleUploadedFile('bench.csv', buffer.getvalue().encode(), content_type='text/csv')
+
+    start = time.perf_counter()
+    response = client.post(reverse('upload_portfolio'), {'csv_file': upload})
+    elapsed = time.perf_counter() - start
+    return {'rows': rows, 'status': response.status_code, 'seconds': round(elapsed, 4),
+            'rows_per_sec': throughput(rows, elapsed)}
+
+
+def bench_update_scores(scale, args):
+    import contextlib
+    import update_scores
+    from core.models import Loan
+
+    loans = Loan.objects.count()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        update_scores.update_all_risk_scores(force=True)
+    elapsed = time.perf_counter() - start
+
+    # Second pass: nothing changed, so every loan is skipped on its feature hash
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        update_scores.update_all_risk_scores()
+    incremental = time.perf_counter() - start
+    return {'loans': loans, 'seconds': round(elapsed, 4), 'loans_per_sec': throughput(loans, elapsed),
+            'incremental_seconds': round(incremental, 4)}
+
+
+def bench_views(scale, args, client):
+    results = {}
+    for name in VIEW_NAMES:
+        url = reverse(name)
+        results[name] = measure(lambda: client.get(url), repeat=args.repeat, warmup=1)
+    return results
+
+
+def bench_age_loans(scale, args):
+    from datetime import timedelta
+    from django.utils import timezone
+    from core.aging import age_book
+
+    # Seeded loans are created today; age them six months on so every schedule has started
+    as_of = timezone.localdate() + timedelta(days=183)
+    start = time.perf_counter()
+    counts = age_book(as_of=as_of)
+    elapsed = time.perf_counter() - start
+    return {**counts, 'seconds': round(elapsed, 4), 'loans_per_sec': throughput(counts['aged'], elapsed)}
+
+
+def bench_generate_schedules(scale, args):
+    from core.amortization import sync_schedules
+
+    start = time.perf_counter()
+    counts = sync_schedules(force=True)
+    elapsed = time.perf_counter() - start
+
+    # Second pass: terms unchanged, so every loan is skipped on its terms hash
+    start = time.perf_counter()
+    sync_schedules()
+    incremental = time.perf_counter() - start
+    return {**counts, 'seconds': round(elapsed, 4), 'installments_per_sec': throughput(counts['installments'], elapsed),
+            'incremental_seconds': round(incremental, 4)}
+
+
+def bench_forecast(scale, args):
+    from core.forecast import forecast_book, get_forecast_config
+
+    config = get_forecast_config()
+    start = time.perf_counter()
+    forecast = forecast_book(config=config)
+    elapsed = time.perf_counter() - start
+    return {'loans': forecast['loans'], 'scenarios': config['scenarios'], 'seconds': round(elapsed, 4),
+            'loan_scenarios_per_sec': throughput(forecast['loans'] * config['scenarios'], elapsed)}
+
+
+def bench_snapshot_loans(scale, args):
+    from datetime import timedelta
+    from django.core.cache import cache
+    from django.utils import timezone
+    from core.cohorts import cohort_report, take_snapshot
+
+    # Two snapshots a month apart so the report has a roll-rate matrix to build
+    today = timezone.localdate()
+    start = time.perf_counter()
+    take_snapshot(today - timedelta(days=30))
+    rows = take_snapshot(today)
+    elapsed = time.perf_counter() - start
+
+    cache.clear()
+    start = time.perf_counter()
+    cohort_report()
+    report_seconds = time.perf_counter() - start
+    return {'rows': rows, 'seconds': round(elapsed / 2, 4), 'rows_per_sec': throughput(rows * 2, elapsed),
+            'report_seconds': round(report_seconds, 4)}
+
+
+def bench_export_analytics(scale, args):
+    """Columnar export, then the analytics view's projected load against a full read of the same rows as CSV."""
+    import shutil
+    import tempfile
+    import tracemalloc
+    import pandas as pd
+    from core.columnar import export_analytics, load_analytics
+    from core.views import ANALYTICS_VIEW_COLUMNS
+
+    root = tempfile.mkdtemp()
+    try:
+        path = os.path.join(root, 'dataset')
+        start = time.perf_counter()
+        meta = export_analytics(path)
+        elapsed = time.perf_counter() - start
+        dataset_bytes = sum(entry.stat().st_size for entry in os.scandir(path))
+        csv_path = os.path.join(root, 'loans.csv')
+        load_analytics(path).to_csv(csv_path, index=False)
+
+        def peak(fn):
+            tracemalloc.start()
+            start = time.perf_counter()
+            fn()
+            seconds = time.perf_counter() - start
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return round(seconds, 4), round(peak_bytes / 1e6, 2)
+
+        load_seconds, load_mb = peak(lambda: load_analytics(path, ANALYTICS_VIEW_COLUMNS))
+        csv_seconds, csv_mb = peak(lambda: pd.read_csv(csv_path))
+        return {'format': meta['format'], 'rows': meta['rows'], 'export_seconds': round(elapsed, 4),
+                'rows_per_sec': throughput(meta['rows'], elapsed), 'dataset_mb': round(dataset_bytes / 1e6, 2),
+                'csv_mb': round(os.path.getsize(csv_path) / 1e6, 2), 'load_seconds': load_seconds, 'load_peak_mb': load_mb,
+                'csv_load_seconds': csv_seconds, 'csv_load_peak_mb': csv_mb}
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_async_views(scale, args):
+    """
+    dashboard and loan_detail: the sync views against the async ones with queries
+    on the request thread (ASYNC_QUERY_THREADS=0, as Django's async ORM runs
+    them) and on query threads. Run once as-is and once with --db-latency-ms
+    added to every query, standing in for a database across the network.
+    """
+    from asgiref.sync import async_to_sync
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+    from django.test import RequestFactory, override_settings
+    from core import views
+    from core.models import Loan, User
+
+    latency = {'seconds': 0.0}
+
+    def delay(execute, sql, params, many, context):
+        time.sleep(latency['seconds'])
+        return execute(sql, params, many, context)
+
+    def add_delay(connection, **kwargs):
+        connection.execute_wrappers.append(delay)
+
+    user = User.objects.get(username='bench')
+    loan = Loan.objects.filter(status='Active').order_by('id').first()
+    factory = RequestFactory()
+
+    def request(path):
+        req = factory.get(path)
+        req.user = user
+        return req
+
+    pages = {
+        'dashboard': (views.dashboard, views.dashboard_async, '/dashboard/', ()),
+        'loan_detail': (views.loan_detail, views.loan_detail_async, f'/loan/{loan.pk}/', (loan.pk,)),
+    }
+    # The query threads' connections are opened on first use: delay them as well
+    connection_created.connect(add_delay)
+    for conn in connections.all(initialized_only=True):
+        add_delay(conn)
+    results = {}
+    try:
+        for label, seconds in (('local', 0.0), (f'latency_{args.db_latency_ms:g}ms', args.db_latency_ms / 1000)):
+            latency['seconds'] = seconds
+            for name, (sync_view, async_view, path, view_args) in pages.items():
+                runs = {'sync': measure(lambda: sync_view(request(path), *view_args), repeat=args.repeat)}
+                for mode, query_threads in (('async_serial', 0), ('async_threads', settings.ASYNC_QUERY_THREADS or 4)):
+                    with override_settings(ASYNC_QUERY_THREADS=query_threads):
+                        runs[mode] = measure(lambda: async_to_sync(async_view)(request(path), *view_args),
+                                             repeat=args.repeat)
+                runs['speedup'] = round(runs['sync']['p50_ms'] / runs['async_threads']['p50_ms'], 2)
+                results[f'{name}_{label}'] = runs
+    finally:
+        connection_created.disconnect(add_delay)
+        for conn in connections.all(initialized_only=True):
+            if delay in conn.execute_wrappers:
+                conn.execute_wrappers.remove(delay)
+    return results
+
+
+_model_load_rss = {}
+
+
+def bench_worker_rss(scale, args):
+    """
+    Peak RSS of a fresh interpreter after Django setup + model load (computed once),
+    plus this process's peak RSS after the scale's benchmarks ran.
+    """
+    import resource
+
+    if not _model_load_rss:
+        code = (
+            "import os, resource, django;"
+            "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'intellidebt.settings');"
+            "django.setup();"
+            "from core.ml_utils import ml_system;"
+            "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+        )
+        output = subprocess.run([sys.executable, '-c', code], cwd=BASE_DIR, capture_output=True, text=True, check=True)
+        _model_load_rss['kb'] = int(output.stdout.strip().splitlines()[-1])
+    # Linux reports KiB, macOS bytes
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {
+        'model_load_max_rss_mb': round(_model_load_rss['kb'] / divisor, 1),
+        'process_max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor, 1),
+    }
+
+
+def run_scale(scale, args, benchmarks):
+    from core.models import User
+
+    print(f"\n=== Scale: {scale:,} loans ===")
+    reset_database()
+    start = time.perf_counter()
+    counts = seed_loans(scale, args.seed)
+    print(f"Seeded {counts} in {time.perf_counter() - start:.1f}s")
+
+    user = User.objects.create_superuser('bench', 'bench@example.com', 'bench-pass')
+    client = TestClient()
+    client.force_login(user)
+
+    results = {}
+    for name in benchmarks:
+        print(f"  - {name}...", end=' ', flush=True)
+        func = globals()[f'bench_{name}']
+        needs_client = name in ('upload_portfolio', 'views')
+        results[name] = func(scale, args, client) if needs_client else func(scale, args)
+        print(json.dumps(results[name]))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run IntelliDebt performance benchmarks.")
+    parser.add_argument('--scale', type=int, action='append', help="Loans to seed (repeatable). Default: 1000")
+    parser.add_argument('--only', action='append', choices=ALL_BENCHMARKS, help="Run a subset (repeatable)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the synthetic book (see generate_portfolio)")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed repetitions per latency benchmark")
+    parser.add_argument('--max-batch', type=int, default=100000, help="Row cap for batch_scoring")
+    parser.add_argument('--max-upload', type=int, default=20000, help="Row cap for upload_portfolio")
+    parser.add_argument('--db-latency-ms', type=float, default=2.0, help="Simulated round trip per query for async_views")
+    parser.add_argument('--output', default=None, help="Result file (default: benchmarks/results/<commit>-<vendor>-<ts>.json)")
+    args = parser.parse_args()
+
+    scales = args.scale or [1000]
+    # worker_rss last, so it sees the peak of everything else at that scale
+    benchmarks = [name for name in ALL_BENCHMARKS if name in (args.only or ALL_BENCHMARKS)]
+
+    # Benchmarks must not accumulate connection.queries
+    settings.DEBUG = False
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        report = {
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'seed': args.seed,
+            'results': {str(scale): run_scale(scale, args, benchmarks) for scale in scales},
+        }
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['commit']}-{report['database']}-{stamp}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
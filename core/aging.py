@@ -0,0 +1,147 @@
+from decimal import Decimal
+
+import numpy as np
+
+from .amortization import add_months
+from .portfolio import record_change, status_counts
+from .strategy import STRATEGY_FIELDS, assign
+
+# Same rule the CSV upload applies to imported loans
+DEFAULT_DPD = 90
+DEFAULT_MISSED_PAYMENTS = 5
+
+# Payments this close to a whole instalment count as covering it (cent rounding)
+PAYMENT_TOLERANCE = 0.01
+
+# Loans aged and written back per round trip by age_book()
+AGING_CHUNK_SIZE = 20000
+
+# Loan columns written by age_book()
+AGING_FIELDS = ['days_past_due', 'missed_payments', 'status', *STRATEGY_FIELDS]
+
+
+def age(created, tenure, monthly_emi, paid, as_of, opening_missed=None, opening_dpd=None):
+    """
+    Days past due and missed instalments for arrays of loans on `as_of`.
+
+    Instalment k (1..tenure) falls due k months after `created` (datetime64[D]).
+    A loan imported in arrears also owes `opening_missed` instalments from
+    before `created`, the oldest `opening_dpd` days overdue on that date and the
+    rest monthly after it. `paid` (total repaid since `created`) covers
+    floor(paid / emi) instalments, oldest first. A loan is past due from the
+    first uncovered instalment's due date. Returns a dict of arrays: due
+    (instalments fallen due, arrears included), missed and days_past_due.
+    """
+    created = np.asarray(created, dtype='datetime64[D]')
+    tenure = np.asarray(tenure, dtype=np.int64)
+    emi = np.asarray(monthly_emi, dtype=np.float64)
+    paid = np.asarray(paid, dtype=np.float64)
+    as_of = np.datetime64(as_of, 'D')
+    opening_missed = np.zeros_like(tenure) if opening_missed is None else np.asarray(opening_missed, dtype=np.int64)
+    opening_dpd = np.zeros_like(tenure) if opening_dpd is None else np.asarray(opening_dpd, dtype=np.int64)
+
+    # 1. Instalments due: imported arrears (at least one if it was overdue), plus whole months
+    #    elapsed, minus one if this month's date is still ahead
+    arrears = np.where(opening_dpd > 0, np.maximum(opening_missed, 1), np.maximum(opening_missed, 0))
+    months = (as_of.astype('datetime64[M]') - created.astype('datetime64[M]')).astype(np.int64)
+    months -= add_months(created, months) > as_of
+    due = arrears + np.clip(months, 0, tenure)
+
+    # 2. Instalments covered by payments
+    covered = np.floor(np.divide(paid + PAYMENT_TOLERANCE, emi, out=np.zeros_like(paid), where=emi > 0)).astype(np.int64)
+    missed = np.maximum(due - covered, 0)
+
+    # 3. Days since the oldest unpaid instalment fell due: an imported arrear, or one of the schedule's
+    arrears_start = created - np.maximum(opening_dpd, 0).astype('timedelta64[D]')
+    oldest_unpaid = np.where(
+        covered < arrears,
+        add_months(arrears_start, np.minimum(covered, arrears)),
+        add_months(created, np.clip(covered - arrears, 0, tenure) + 1),
+    )
+    dpd = np.where(missed > 0, (as_of - oldest_unpaid).astype(np.int64), 0)
+    return {'due': due, 'missed': missed, 'days_past_due': np.maximum(dpd, 0)}
+
+
+def age_book(as_of=None, chunk_size=AGING_CHUNK_SIZE):
+    """
+    Rolls days_past_due, missed_payments and status forward for every open loan.
+
+    Per keyset chunk: one query for the loan terms (creation date truncated in
+    SQL), one GROUP BY for payment totals, one vectorised age() + strategy pass,
+    and one executemany UPDATE for the loans that actually changed, with the
+    status / overdue counts moved on the live dashboard totals in the same
+    transaction. Active loans crossing DEFAULT_DPD / DEFAULT_MISSED_PAYMENTS
+    become Defaulted. Imported arrears (opening_* fields) roll forward from the
+    loan's creation date; loans with nothing due yet keep their stored figures.
+    Returns counts.
+    """
+    from django.db import connections, router, transaction
+    from django.db.models import F, Sum
+    from django.db.models.functions import TruncDate
+    from django.utils import timezone
+    from .models import Loan, Payment
+
+    as_of = as_of or timezone.localdate()
+    db = router.db_for_write(Loan)
+    connection = connections[db]
+    qn = connection.ops.quote_name
+    update_sql = "UPDATE {} SET {} WHERE {} = %s".format(
+        qn(Loan._meta.db_table), ', '.join(f"{qn(field)} = %s" for field in AGING_FIELDS), qn('id'),
+    )
+
+    counts = {'aged': 0, 'updated': 0, 'defaulted': 0}
+    columns = ('id', 'created_day', 'tenure', 'monthly_emi', 'opening_missed_payments', 'opening_days_past_due',
+               'status', 'days_past_due', 'missed_payments', 'risk_percentage', 'predicted_default_risk',
+               'outstanding_amount', *STRATEGY_FIELDS)
+    open_loans = (
+        Loan.objects.using(db)
+        .filter(status__in=['Active', 'Defaulted'], created_at__isnull=False, monthly_emi__gt=0, outstanding_amount__gt=0)
+        .annotate(created_day=TruncDate('created_at'))
+        .order_by('id')
+    )
+    last_id = 0
+    while True:
+        rows = list(open_loans.filter(id__gt=last_id).values_list(*columns)[:chunk_size])
+        if not rows:
+            return counts
+        first_id, last_id = rows[0][0], rows[-1][0]
+        (ids, created, tenure, emi, opening_missed, opening_dpd, status, old_dpd, old_missed,
+         risk_pct, predicted, outstanding, *current) = zip(*rows)
+
+        # 1. Payment totals for the chunk since each loan's creation, aggregated in SQL (earlier,
+        #    e.g. generated, payments are already reflected in the opening arrears)
+        totals = dict(
+            Payment.objects.using(db)
+            .filter(loan_id__gte=first_id, loan_id__lte=last_id, payment_date__gte=F('loan__created_at'))
+            .values('loan_id').annotate(total=Sum('amount_paid')).values_list('loan_id', 'total')
+        )
+        paid = [float(totals.get(pk) or 0) for pk in ids]
+
+        # 2. Age, apply the default rule, and re-run the strategy on the new DPD/status
+        aged = age(created, tenure, [float(e) for e in emi], paid, as_of, opening_missed, opening_dpd)
+        dpd, missed = aged['days_past_due'], aged['missed']
+        status = np.asarray(status)
+        defaulted = (status == 'Active') & ((dpd > DEFAULT_DPD) | (missed > DEFAULT_MISSED_PAYMENTS))
+        new_status = np.where(defaulted, 'Defaulted', status)
+        risk = [p / 100.0 if p is not None else (d or 0.0) for p, d in zip(risk_pct, predicted)]
+        strategy = assign(risk, dpd, [float(o) for o in outstanding])
+
+        # 3. Write back only the loans with something due and whose figures moved
+        started = aged['due'] > 0
+        new = zip(dpd.tolist(), missed.tolist(), new_status.tolist(), strategy['channel'].tolist(),
+                  strategy['discount_percent'].tolist(), strategy['settlement_amount'].tolist(),
+                  strategy['priority'].tolist())
+        changed = [
+            (d, m, s, channel, discount, Decimal(str(amount)).quantize(Decimal('0.01')), priority, pk)
+            for pk, is_started, (d, m, s, channel, discount, amount, priority), old in zip(
+                ids, started.tolist(), new, zip(old_dpd, old_missed, status.tolist(), *current))
+            if is_started and (d, m, s, channel, discount, amount, priority) != (*old[:5], float(old[5]), old[6])
+        ]
+        if changed:
+            with transaction.atomic(using=db), connection.cursor() as cursor:
+                cursor.executemany(update_sql, changed)
+                record_change(status_counts(status[started], np.asarray(old_dpd)[started]),
+                              status_counts(new_status[started], dpd[started]))
+        counts['aged'] += int(started.sum())
+        counts['updated'] += len(changed)
+        counts['defaulted'] += int((defaulted & started).sum())
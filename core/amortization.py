@@ -0,0 +1,186 @@
+import hashlib
+
+import numpy as np
+
+METHOD_CHOICES = [
+    ('flat', 'Flat Rate'),
+    ('reducing', 'Reducing Balance'),
+]
+
+# Loans whose schedules are rebuilt per round trip by sync_schedules()
+SCHEDULE_CHUNK_SIZE = 2000
+
+# Installment rows per INSERT statement
+INSTALLMENT_BATCH_SIZE = 5000
+
+
+def add_months(start, months):
+    """start (datetime64[D]) + months, clipped to the end of the target month (Jan 31 + 1 -> Feb 28/29)."""
+    start = np.asarray(start, dtype='datetime64[D]')
+    start_month = start.astype('datetime64[M]')
+    day = (start - start_month.astype('datetime64[D]')).astype(np.int64)
+    target = start_month + months
+    month_length = ((target + 1).astype('datetime64[D]') - target.astype('datetime64[D]')).astype(np.int64)
+    return target.astype('datetime64[D]') + np.minimum(day, month_length - 1)
+
+
+def installment_amount(principal, annual_rate, tenure, method='flat'):
+    """
+    Monthly instalment for arrays of loans. Flat: (principal + principal x rate x
+    years) / tenure. Reducing balance: the annuity payment P.r / (1 - (1 + r)^-n)
+    at the monthly rate r. 0 when tenure <= 0.
+    """
+    principal, rate, tenure, method = np.broadcast_arrays(
+        np.asarray(principal, dtype=np.float64), np.asarray(annual_rate, dtype=np.float64) / 1200.0,
+        np.asarray(tenure, dtype=np.int64), np.asarray(method),
+    )
+    n = np.maximum(tenure, 1)
+    flat = principal / n + principal * rate
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annuity = np.where(rate > 0, principal * rate / (1 - np.power(1 + rate, -n)), principal / n)
+    return np.where(tenure > 0, np.where(method == 'reducing', annuity, flat), 0.0)
+
+
+def build_schedules(principal, annual_rate, tenure, start, method='flat'):
+    """
+    Full repayment schedules for many loans in one pass.
+
+    Returns flat arrays with one entry per instalment, grouped by loan in input
+    order: loan (index into the inputs), number (1..tenure), due_date
+    (start + number months), amount, principal, interest and balance (after the
+    instalment). Money is rounded to cents; principal portions are taken from
+    the rounded balances, so each loan's principal sums exactly to the amount
+    lent and the last balance is 0.
+    """
+    principal, annual_rate, tenure, start, method = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(principal, dtype=np.float64)), np.asarray(annual_rate, dtype=np.float64),
+        np.maximum(np.asarray(tenure, dtype=np.int64), 0), np.asarray(start, dtype='datetime64[D]'), np.asarray(method),
+    )
+    emi = installment_amount(principal, annual_rate, tenure, method)
+
+    # 1. One row per instalment: loan index and instalment number
+    loan = np.repeat(np.arange(principal.size), tenure)
+    number = np.arange(loan.size) - np.repeat(np.cumsum(tenure) - tenure, tenure) + 1
+    P, r, n, E = principal[loan], annual_rate[loan] / 1200.0, tenure[loan], emi[loan]
+    reducing = (method[loan] == 'reducing') & (r > 0)
+
+    # 2. Balance after each instalment: straight-line (flat, or interest-free) or annuity (reducing)
+    straight = P * (1 - number / n)
+    growth = np.power(1 + r, number)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        balance = np.where(reducing, P * growth - E * (growth - 1) / r, straight)
+    balance = np.where(number == n, 0.0, np.maximum(np.round(balance, 2), 0.0))
+
+    # 3. Principal from consecutive rounded balances; interest on the opening balance (reducing) or amount lent (flat)
+    opening = np.round(P, 2)
+    follows = np.flatnonzero(number > 1)
+    opening[follows] = balance[follows - 1]
+    principal_part = np.round(opening - balance, 2)
+    interest = np.round(np.where(reducing, opening * r, P * r), 2)
+    return {
+        'loan': loan,
+        'number': number,
+        'due_date': add_months(start[loan], number),
+        'amount': np.round(principal_part + interest, 2),
+        'principal': principal_part,
+        'interest': interest,
+        'balance': balance,
+    }
+
+
+def terms_hash(amount, annual_rate, tenure, method, start):
+    """16-hex-char digest of the terms a schedule is built from (regenerate when it changes)."""
+    key = f"{float(amount):.2f}|{float(annual_rate):.4f}|{int(tenure)}|{method}|{start}"
+    return hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+
+
+def schedule_installments(loans):
+    """
+    Sets schedule_hash on new Loan instances and returns their unsaved
+    Installment rows (anchored on created_at, or today before the first save).
+    The caller saves the loans first, then bulk_creates the returned rows.
+    """
+    from django.utils import timezone
+    from .models import Installment
+
+    starts = [timezone.localdate(loan.created_at) if loan.created_at else timezone.localdate() for loan in loans]
+    for loan, start in zip(loans, starts):
+        loan.schedule_hash = terms_hash(loan.amount, loan.interest_rate, loan.tenure, loan.amortization_method, start)
+    schedule = build_schedules(
+        [float(loan.amount) for loan in loans], [float(loan.interest_rate) for loan in loans],
+        [loan.tenure for loan in loans], np.array(starts, dtype='datetime64[D]'),
+        np.array([loan.amortization_method for loan in loans]),
+    )
+    return [
+        Installment(loan=loans[index], number=number, due_date=due_date, amount=amount,
+                    principal=principal, interest=interest, balance=balance)
+        for index, number, due_date, amount, principal, interest, balance in zip(
+            schedule['loan'].tolist(), schedule['number'].tolist(), schedule['due_date'].tolist(),
+            schedule['amount'].tolist(), schedule['principal'].tolist(), schedule['interest'].tolist(),
+            schedule['balance'].tolist())
+    ]
+
+
+def sync_schedules(queryset=None, chunk_size=SCHEDULE_CHUNK_SIZE, force=False):
+    """
+    Brings the Installment table in line with loan terms. Per keyset chunk: one
+    read of the terms, a terms_hash() comparison against Loan.schedule_hash,
+    then for the loans that changed (all with force=True) one DELETE of their old
+    rows, one executemany INSERT of the new ones and one executemany of the new
+    hashes (bulk_create's per-value field preparation costs ~8x the INSERT
+    itself at this volume). Loans without created_at have no anchor date and
+    are skipped. Returns counts.
+    """
+    from django.db import connections, router, transaction
+    from django.db.models.functions import TruncDate
+    from .models import Installment, Loan
+
+    queryset = Loan.objects.all() if queryset is None else queryset
+    db = router.db_for_write(Loan)
+    connection = connections[db]
+    qn = connection.ops.quote_name
+    update_sql = "UPDATE {} SET {} = %s WHERE {} = %s".format(
+        qn(Loan._meta.db_table), qn('schedule_hash'), qn('id'),
+    )
+    insert_columns = ['loan_id', 'number', 'due_date', 'amount', 'principal', 'interest', 'balance']
+    insert_sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        qn(Installment._meta.db_table), ', '.join(qn(column) for column in insert_columns),
+        ', '.join(['%s'] * len(insert_columns)),
+    )
+
+    counts = {'loans': 0, 'regenerated': 0, 'installments': 0}
+    terms = (
+        queryset.using(db).filter(created_at__isnull=False)
+        .annotate(created_day=TruncDate('created_at')).order_by('id')
+    )
+    columns = ('id', 'amount', 'interest_rate', 'tenure', 'amortization_method', 'created_day', 'schedule_hash')
+    last_id = 0
+    while last_id is not None:
+        rows = list(terms.filter(id__gt=last_id).values_list(*columns)[:chunk_size])
+        # A short chunk is the last one; skip the empty read that would confirm it
+        last_id = rows[-1][0] if len(rows) == chunk_size else None
+        counts['loans'] += len(rows)
+
+        hashes = [terms_hash(*row[1:6]) for row in rows]
+        stale = [(row, digest) for row, digest in zip(rows, hashes) if force or digest != row[6]]
+        if not stale:
+            continue
+        ids, amount, rate, tenure, method, created, old_hashes = zip(*(row for row, _ in stale))
+        schedule = build_schedules(
+            [float(a) for a in amount], [float(r) for r in rate], tenure,
+            np.array(created, dtype='datetime64[D]'), np.array(method),
+        )
+        installments = list(zip(
+            np.asarray(ids)[schedule['loan']].tolist(), schedule['number'].tolist(), schedule['due_date'].tolist(),
+            *(schedule[column].tolist() for column in ('amount', 'principal', 'interest', 'balance')),
+        ))
+        with transaction.atomic(using=db), connection.cursor() as cursor:
+            previously_scheduled = [pk for pk, old in zip(ids, old_hashes) if old]
+            if previously_scheduled:
+                Installment.objects.using(db).filter(loan_id__in=previously_scheduled).delete()
+            if installments:
+                cursor.executemany(insert_sql, installments)
+            cursor.executemany(update_sql, [(digest, row[0]) for row, digest in stale])
+        counts['regenerated'] += len(stale)
+        counts['installments'] += len(installments)
+    return counts
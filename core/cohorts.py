@@ -0,0 +1,179 @@
+# DPD bucket key -> (label, lowest days past due in the bucket), least to most delinquent
+DPD_BUCKETS = {
+    'current': ('Current', 0),
+    '30': ('30-59 DPD', 30),
+    '60': ('60-89 DPD', 60),
+    '90': ('90+ DPD', 90),
+}
+BUCKET_CHOICES = [(key, label) for key, (label, _) in DPD_BUCKETS.items()] + [('closed', 'Closed')]
+DELINQUENT_BUCKETS = ['30', '60', '90']
+
+# Loan ids per INSERT ... SELECT statement written by take_snapshot()
+SNAPSHOT_CHUNK_SIZE = 50000
+
+# Days between the two snapshots compared by roll_rates()
+ROLL_RATE_PERIOD_DAYS = 30
+
+# Roll rates / vintages are recomputed when a newer snapshot exists, else at most this often (seconds)
+COHORT_CACHE_TTL = 24 * 3600
+
+
+def bucket_expression():
+    """SQL CASE mapping a loan's status, balance and days_past_due to its DPD bucket."""
+    from django.db.models import CharField, Case, Q, Value, When
+
+    whens = [When(Q(status='Paid') | Q(outstanding_amount__lte=0), then=Value('closed'))]
+    for key, (_, floor) in reversed(DPD_BUCKETS.items()):
+        if floor:
+            whens.append(When(days_past_due__gte=floor, then=Value(key)))
+    return Case(*whens, default=Value('current'), output_field=CharField())
+
+
+def take_snapshot(as_of=None, chunk_size=SNAPSHOT_CHUNK_SIZE):
+    """
+    Writes one LoanSnapshot row per loan for `as_of` (default today), replacing
+    any earlier run for that date. Rows are produced by INSERT ... SELECT over
+    id ranges, so bucketing and vintage truncation happen in the database and no
+    loan is loaded into Python. Returns the number of rows written.
+    """
+    from django.db import connections, router, transaction
+    from django.db.models import DateField, F, Max, Min, Value
+    from django.db.models.functions import TruncMonth
+    from django.utils import timezone
+    from .models import Loan, LoanSnapshot
+
+    as_of = as_of or timezone.localdate()
+    db = router.db_for_write(LoanSnapshot)
+    connection = connections[db]
+    qn = connection.ops.quote_name
+    # Every output column is an annotation, so the SELECT list follows this order exactly
+    selected = {
+        'snapshot_date': Value(as_of, output_field=DateField()),
+        'loan_id': F('id'),
+        'bucket': bucket_expression(),
+        'days_past_due': F('days_past_due'),
+        'outstanding': F('outstanding_amount'),
+        'vintage': TruncMonth('created_at', output_field=DateField()),
+    }
+    source = Loan.objects.using(db).annotate(**{f'snap_{column}': expression for column, expression in selected.items()})
+
+    written = 0
+    with transaction.atomic(using=db):
+        LoanSnapshot.objects.using(db).filter(snapshot_date=as_of).delete()
+        bounds = Loan.objects.using(db).aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            return 0
+        with connection.cursor() as cursor:
+            for start in range(bounds['first'], bounds['last'] + 1, chunk_size):
+                select = source.filter(id__gte=start, id__lt=start + chunk_size).values_list(
+                    *(f'snap_{column}' for column in selected)
+                )
+                sql, params = select.query.sql_with_params()
+                cursor.execute("INSERT INTO {} ({}) {}".format(
+                    qn(LoanSnapshot._meta.db_table), ', '.join(qn(column) for column in selected), sql,
+                ), params)
+                written += cursor.rowcount
+    return written
+
+
+def snapshot_dates():
+    from .models import LoanSnapshot
+    return list(LoanSnapshot.objects.order_by('snapshot_date').values_list('snapshot_date', flat=True).distinct())
+
+
+def roll_rates(as_of, period_days=ROLL_RATE_PERIOD_DAYS, dates=None):
+    """
+    Roll-rate matrix between the snapshot on `as_of` and the latest one at least
+    `period_days` earlier (or the earliest available). One self-join GROUP BY:
+    rows are the earlier bucket, columns the later one, cells the percentage of
+    that bucket's loans that moved there. Returns None with fewer than two snapshots.
+    """
+    from django.db.models import Count, F
+    from .models import LoanSnapshot
+
+    earlier = [d for d in (dates or snapshot_dates()) if d < as_of]
+    if not earlier:
+        return None
+    start = max((d for d in earlier if (as_of - d).days >= period_days), default=earlier[0])
+
+    counts = (
+        LoanSnapshot.objects.filter(snapshot_date=as_of, loan__snapshots__snapshot_date=start)
+        .values(from_bucket=F('loan__snapshots__bucket'), to_bucket=F('bucket'))
+        .annotate(loans=Count('id'))
+    )
+    buckets = [*DPD_BUCKETS, 'closed']
+    cells = {(row['from_bucket'], row['to_bucket']): row for row in counts}
+    matrix = []
+    for source in DPD_BUCKETS:
+        total = sum(cells.get((source, target), {}).get('loans', 0) for target in buckets)
+        matrix.append({
+            'bucket': DPD_BUCKETS[source][0],
+            'loans': total,
+            'rates': [round(100.0 * cells[(source, target)]['loans'] / total, 1) if (source, target) in cells else 0.0
+                      for target in buckets],
+        })
+    return {
+        'from_date': start,
+        'to_date': as_of,
+        'columns': [dict(BUCKET_CHOICES)[key] for key in buckets],
+        'rows': matrix,
+    }
+
+
+def vintage_curves(dates=None):
+    """
+    Share of each origination month's loans that are 30+ DPD, by months on book.
+    Uses the last snapshot of every calendar month; one GROUP BY (vintage,
+    snapshot_date) query. Returns {vintage 'YYYY-MM': [(months_on_book, pct), ...]}.
+    """
+    from django.db.models import Count, Q
+    from .models import LoanSnapshot
+
+    month_ends = {}
+    for d in dates or snapshot_dates():
+        month_ends[(d.year, d.month)] = d
+    rows = (
+        LoanSnapshot.objects.filter(snapshot_date__in=list(month_ends.values()), vintage__isnull=False)
+        .values('vintage', 'snapshot_date')
+        .annotate(loans=Count('id'), delinquent=Count('id', filter=Q(bucket__in=DELINQUENT_BUCKETS)))
+        .order_by('vintage', 'snapshot_date')
+    )
+    curves = {}
+    for row in rows:
+        vintage, taken = row['vintage'], row['snapshot_date']
+        months_on_book = (taken.year - vintage.year) * 12 + taken.month - vintage.month
+        if months_on_book < 0 or not row['loans']:
+            continue
+        curves.setdefault(vintage.strftime('%Y-%m'), []).append(
+            (months_on_book, round(100.0 * row['delinquent'] / row['loans'], 2))
+        )
+    return curves
+
+
+def cohort_report():
+    """Roll rates and vintage curves as of the latest snapshot, cached until a newer snapshot is written."""
+    from django.core.cache import cache
+    from django.db.models import Max
+    from .models import LoanSnapshot
+
+    latest = LoanSnapshot.objects.aggregate(latest=Max('snapshot_date'))['latest']
+    if latest is None:
+        return None
+    key = f"cohort_report:{latest.isoformat()}"
+    report = cache.get(key)
+    if report is None:
+        dates = snapshot_dates()
+        report = {'as_of': latest, 'roll_rates': roll_rates(latest, dates=dates), 'vintages': vintage_curves(dates)}
+        cache.set(key, report, COHORT_CACHE_TTL)
+    return report
+
+
+def refresh_cohort_report():
+    """Recomputes the cached report for the latest snapshot (a day's snapshot may have been re-run)."""
+    from django.core.cache import cache
+    from .models import LoanSnapshot
+
+    latest = LoanSnapshot.objects.order_by('-snapshot_date').values_list('snapshot_date', flat=True).first()
+    if latest is not None:
+        cache.delete(f"cohort_report:{latest.isoformat()}")
+    return cohort_report()
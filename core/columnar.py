@@ -0,0 +1,220 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional; without it datasets use the .npy layout
+    pa = pq = None
+
+# The analytics dataset: the portfolio exported from the database into typed
+# per-column storage that the charts memory-map, reading only the columns they
+# use. Parquet (zstd, dictionary-encoded categoricals) when pyarrow is installed,
+# else one .npy file per column with categoricals as int codes; meta.json holds
+# the format, row count, dtypes and category values for both.
+
+# Dataset column -> (Loan lookup, storage dtype). Names follow synthetic_loans_1000.csv.
+ANALYTICS_COLUMNS = {
+    'Age': ('client__age', 'int16'),
+    'Monthly_Income': ('client__monthly_income', 'float64'),
+    'Loan_Amount': ('amount', 'float64'),
+    'Loan_Tenure': ('tenure', 'int16'),
+    'Interest_Rate': ('interest_rate', 'float32'),
+    'Loan_Type': ('loan_type', 'category'),
+    'Collateral_Value': ('collateral_value', 'float64'),
+    'Outstanding_Loan_Amount': ('outstanding_amount', 'float64'),
+    'Monthly_EMI': ('monthly_emi', 'float64'),
+    'Payment_History': ('payment_history', 'category'),
+    'Num_Missed_Payments': ('missed_payments', 'int16'),
+    'Days_Past_Due': ('days_past_due', 'int32'),
+    'Recovery_Status': ('recovery_status', 'category'),
+}
+CATEGORICAL_COLUMNS = [name for name, (_, dtype) in ANALYTICS_COLUMNS.items() if dtype == 'category']
+
+# Storage dtype of category codes (the .npy layout)
+CATEGORY_CODE_DTYPE = 'int16'
+
+# Loans read per keyset chunk (= one Parquet row group)
+EXPORT_CHUNK_SIZE = 50_000
+
+META_FILE = 'meta.json'
+PARQUET_FILE = 'loans.parquet'
+
+
+def available_formats():
+    return ['parquet', 'npy'] if pq is not None else ['npy']
+
+
+def iter_loan_chunks(chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields the portfolio as {column: ndarray} chunks in keyset order, numbers
+    cast in SQL (no Decimal objects) and categoricals as raw strings.
+    """
+    from django.db.models import FloatField, IntegerField
+    from django.db.models.functions import Cast
+    from .models import Loan
+
+    annotations = {}
+    for i, (lookup, dtype) in enumerate(ANALYTICS_COLUMNS.values()):
+        if dtype != 'category':
+            output = FloatField() if dtype.startswith('float') else IntegerField()
+            annotations[f'c_{i}'] = Cast(lookup, output)
+    fields = ['id'] + [f'c_{i}' if f'c_{i}' in annotations else lookup
+                       for i, (lookup, _) in enumerate(ANALYTICS_COLUMNS.values())]
+    queryset = Loan.objects.annotate(**annotations).order_by('id')
+
+    last_id = 0
+    while last_id is not None:
+        rows = list(queryset.filter(id__gt=last_id).values_list(*fields)[:chunk_size])
+        last_id = rows[-1][0] if len(rows) == chunk_size else None
+        if not rows:
+            break
+        columns = list(zip(*rows))[1:]
+        yield {
+            name: np.array(values, dtype=object if dtype == 'category' else dtype)
+            for (name, (_, dtype)), values in zip(ANALYTICS_COLUMNS.items(), columns)
+        }
+
+
+def _encode(values, categories):
+    """int codes for `values`, appending unseen values to `categories` (a dict value -> code, kept across chunks)."""
+    uniques, inverse = np.unique(values.astype(str), return_inverse=True)
+    lookup = np.array([categories.setdefault(value, len(categories)) for value in uniques.tolist()],
+                      dtype=CATEGORY_CODE_DTYPE)
+    return lookup[inverse]
+
+
+def export_analytics(path, fmt=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Writes the portfolio to the dataset directory `path` in `fmt` ('parquet' or
+    'npy', default the best available), one keyset chunk at a time so memory
+    stays at a chunk. The new dataset is built next to `path` and swapped in at
+    the end; readers still mapping the old files keep them until they close.
+    Returns the meta dict.
+    """
+    from django.utils import timezone
+    from .models import Loan
+
+    fmt = fmt or available_formats()[0]
+    if fmt not in available_formats():
+        raise ValueError(f"Format {fmt!r} is not available (install pyarrow for parquet).")
+    path = os.path.abspath(path)
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.analytics-', dir=parent)
+
+    categories = {name: {} for name in CATEGORICAL_COLUMNS}
+    rows = 0
+    try:
+        if fmt == 'npy':
+            # Sized from a count; loans added meanwhile wait for the next export
+            total = Loan.objects.count()
+            arrays = {
+                name: np.lib.format.open_memmap(
+                    os.path.join(staging, f'{name}.npy'), mode='w+', shape=(total,),
+                    dtype=CATEGORY_CODE_DTYPE if dtype == 'category' else dtype,
+                )
+                for name, (_, dtype) in ANALYTICS_COLUMNS.items()
+            }
+            for chunk in iter_loan_chunks(chunk_size):
+                size = min(len(chunk['Age']), total - rows)
+                for name, values in chunk.items():
+                    if name in categories:
+                        values = _encode(values, categories[name])
+                    arrays[name][rows:rows + size] = values[:size]
+                rows += size
+                if rows == total:
+                    break
+            for array in arrays.values():
+                array.flush()
+            del arrays
+        else:
+            schema = pa.schema([
+                (name, pa.dictionary(pa.int32(), pa.string()) if dtype == 'category' else pa.from_numpy_dtype(np.dtype(dtype)))
+                for name, (_, dtype) in ANALYTICS_COLUMNS.items()
+            ])
+            writer = pq.ParquetWriter(os.path.join(staging, PARQUET_FILE), schema, compression='zstd')
+            for chunk in iter_loan_chunks(chunk_size):
+                batch = {}
+                for name, values in chunk.items():
+                    if name in categories:
+                        codes = _encode(values, categories[name]).astype('int32')
+                        batch[name] = pa.DictionaryArray.from_arrays(codes, list(categories[name]))
+                    else:
+                        batch[name] = pa.array(values)
+                # Dictionaries grow across chunks; each row group carries the one current at its write
+                table = pa.table(batch, schema=schema)
+                writer.write_table(table)
+                rows += table.num_rows
+            writer.close()
+
+        meta = {
+            'format': fmt,
+            'rows': rows,
+            'columns': {name: dtype for name, (_, dtype) in ANALYTICS_COLUMNS.items()},
+            'categories': {name: list(values) for name, values in categories.items()},
+            'exported_at': timezone.now().isoformat(),
+        }
+        with open(os.path.join(staging, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+
+        # Swap the finished dataset in
+        retired = None
+        if os.path.exists(path):
+            retired = tempfile.mkdtemp(prefix='.analytics-old-', dir=parent)
+            os.replace(path, os.path.join(retired, 'dataset'))
+        os.replace(staging, path)
+        if retired:
+            shutil.rmtree(retired, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return meta
+
+
+def read_meta(path):
+    """The dataset's meta.json, or None when nothing has been exported to `path`."""
+    try:
+        with open(os.path.join(path, META_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def load_analytics(path, columns=None):
+    """
+    The exported dataset as a DataFrame with only `columns` (default all)
+    read: Parquet column projection over a memory-mapped file, or np.load
+    with mmap_mode='r' per column. Categoricals come back as pandas
+    categoricals. Returns None when nothing has been exported to `path`.
+    """
+    meta = read_meta(path)
+    if meta is None:
+        return None
+    columns = list(meta['columns']) if columns is None else list(columns)
+    unknown = set(columns) - set(meta['columns'])
+    if unknown:
+        raise KeyError(f"Not in the analytics dataset: {', '.join(sorted(unknown))}")
+
+    if meta['format'] == 'parquet':
+        if pq is None:
+            raise RuntimeError("This analytics dataset is Parquet; install pyarrow or re-export with --format npy.")
+        frame = pq.read_table(os.path.join(path, PARQUET_FILE), columns=columns, memory_map=True).to_pandas()
+    else:
+        frame = pd.DataFrame({
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')[:meta['rows']] for name in columns
+        })
+
+    for name in columns:
+        if meta['columns'][name] == 'category':
+            dtype = pd.CategoricalDtype(meta['categories'][name])
+            if meta['format'] == 'parquet':
+                frame[name] = frame[name].astype(dtype)
+            else:
+                frame[name] = pd.Categorical.from_codes(frame[name].to_numpy(), dtype=dtype)
+    return frame
@@ -0,0 +1,70 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.db import connections
+
+from . import metrics
+
+# Helpers for the async views. Django 4.2's async ORM runs every query through
+# one thread per request (sync_to_async, thread_sensitive), so awaiting two
+# querysets still runs them back to back. run_query() instead hands each query
+# to a small shared pool of ASYNC_QUERY_THREADS threads, each with its own
+# database connection, so independent queries really overlap. With
+# ASYNC_QUERY_THREADS = 0 queries run on the request thread, as the async ORM
+# does (also needed inside a transaction, which other connections can't see).
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def query_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.ASYNC_QUERY_THREADS, thread_name_prefix='db-query')
+        return _executor
+
+
+def _run_query(fn):
+    try:
+        if metrics.metrics_enabled():
+            # The request's metrics context is copied here by sync_to_async; count this thread's queries too
+            with metrics.query_timers():
+                return fn()
+        return fn()
+    finally:
+        # The pool threads never see request_finished: apply CONN_MAX_AGE / health checks here
+        for conn in connections.all(initialized_only=True):
+            conn.close_if_unusable_or_obsolete()
+
+
+async def run_query(fn):
+    """Awaits fn() (ORM work, must evaluate its querysets) on a query thread, or the request thread."""
+    if not settings.ASYNC_QUERY_THREADS:
+        return await sync_to_async(fn)()
+    return await sync_to_async(functools.partial(_run_query, fn), thread_sensitive=False, executor=query_executor())()
+
+
+async def gather_queries(*fns):
+    """run_query() for each fn concurrently; their results in order."""
+    return await asyncio.gather(*(run_query(fn) for fn in fns))
+
+
+async def run_in_thread(fn, *args):
+    """CPU-bound work (model calls) off the event loop, without tying up a query thread."""
+    return await sync_to_async(fn, thread_sensitive=False)(*args)
+
+
+def async_login_required(view):
+    """login_required for async views (Django 4.2's only wraps sync ones)."""
+    @functools.wraps(view)
+    async def wrapped(request, *args, **kwargs):
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapped
@@ -0,0 +1,87 @@
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# DATABASES alias of the read replica (configured from DATABASE_REPLICA_URL)
+REPLICA_ALIAS = 'replica'
+
+# Session key holding the time until which this session reads from the primary
+STICKY_SESSION_KEY = '_read_primary_until'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+# Set by replica_reads / use_replica(): reads in this context may go to the replica
+_replica_reads = ContextVar('replica_reads', default=False)
+# Set by ReplicaStickinessMiddleware after a write: this request reads its own writes from the primary
+_pin_primary = ContextVar('pin_primary', default=False)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+@contextmanager
+def use_replica():
+    """Routes reads inside the block to the replica (when configured); writes still go to the primary."""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def pin_primary(pinned=True):
+    token = _pin_primary.set(pinned)
+    try:
+        yield
+    finally:
+        _pin_primary.reset(token)
+
+
+def replica_reads(view):
+    """View decorator: the view's read queries go to the replica, unless the session recently wrote."""
+    @functools.wraps(view)
+    def wrapped(request, *args, **kwargs):
+        with use_replica():
+            return view(request, *args, **kwargs)
+    return wrapped
+
+
+class ReplicaRouter:
+    """
+    Reads inside replica_reads / use_replica() go to the replica, everything
+    else (and every write) to the primary. Reads stay on the primary while the
+    request is pinned (read-your-writes after a POST) or inside a transaction,
+    which must see its own uncommitted writes. The replica is a copy of the
+    primary: relations across the two are allowed, migrations run on the
+    primary only.
+    """
+
+    def db_for_read(self, model, **hints):
+        if (_replica_reads.get() and not _pin_primary.get() and replica_configured()
+                and not connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return REPLICA_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_ALIAS
+
+
+def sticky_until(seconds=None):
+    seconds = settings.REPLICA_STICKY_SECONDS if seconds is None else seconds
+    return time.time() + seconds
+
+
+def is_pinned(session):
+    return session.get(STICKY_SESSION_KEY, 0) > time.time()
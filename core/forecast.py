@@ -0,0 +1,163 @@
+import hashlib
+from datetime import date
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+DEFAULT_FORECAST = {
+    'horizon_months': 12,
+    'scenarios': 1000,
+    'recovery_rate': 0.35,   # share of the balance at default eventually recovered...
+    'recovery_lag_months': 6,  # ...this many months after the default
+    'pd_volatility': 0.25,   # spread of the per-scenario shock applied to every loan's default probability
+    'seed': 0,
+}
+
+# Loans simulated per chunk; the loans x scenarios work arrays stay around 50 MB at 1000 scenarios
+FORECAST_CHUNK_SIZE = 2000
+
+BAND_PERCENTILES = (5, 50, 95)
+
+
+def get_forecast_config():
+    return {**DEFAULT_FORECAST, **getattr(settings, 'CASHFLOW_FORECAST', {})}
+
+
+def scenario_shocks(scenarios, volatility, rng):
+    """Mean-one lognormal multiplier per scenario: one draw shifts every loan's default probability together."""
+    z = rng.standard_normal(scenarios)
+    return np.exp(volatility * z - volatility ** 2 / 2)
+
+
+def contractual_schedule(outstanding, emi, horizon):
+    """Opening balance and scheduled payment, min(EMI, balance), per loan and month: two (loans, horizon) arrays."""
+    outstanding = np.asarray(outstanding, dtype=np.float64)
+    emi = np.asarray(emi, dtype=np.float64)
+    opening = outstanding[:, None] - np.minimum(emi[:, None] * np.arange(horizon), outstanding[:, None])
+    return opening, np.minimum(emi[:, None], opening)
+
+
+def simulate_chunk(outstanding, emi, risk, shocks, horizon, recovery_rate, recovery_lag, rng):
+    """
+    Collections per scenario and month for one chunk of loans: (scenarios, horizon) array.
+
+    Each loan pays min(EMI, balance) a month until it is repaid or defaults. Its
+    lifetime default probability (the model score, scaled by the scenario shock)
+    becomes a constant monthly hazard over the payments left (balance / EMI), so
+    the default month is one geometric draw per loan x scenario. A defaulted
+    loan pays nothing more until recovery_rate of its balance comes in
+    recovery_lag months later (if that is still inside the horizon).
+    """
+    opening, scheduled = contractual_schedule(outstanding, emi, horizon)
+    emi = np.asarray(emi, dtype=np.float64)
+    risk = np.clip(np.asarray(risk, dtype=np.float64), 0.0, 1.0)
+
+    # 1. Monthly log-survival per loan x scenario (0 = never defaults)
+    remaining = np.maximum(np.ceil(np.divide(opening[:, 0], emi, out=np.ones_like(emi), where=emi > 0)), 1)
+    pd = np.minimum(risk[:, None] * shocks[None, :], 1.0 - 1e-9)
+    log_survival = np.log1p(-pd) / remaining[:, None]
+
+    # 2. Default month: geometric draw by inversion (horizon = survives the window)
+    draws = np.log(rng.random(pd.shape))
+    default_month = np.full(pd.shape, horizon, dtype=np.int16)
+    hazard = log_survival < 0
+    default_month[hazard] = np.minimum(np.floor(draws[hazard] / log_survival[hazard]), horizon)
+
+    # 3. Month by month: matrix-vector products over the loans still paying / defaulting now
+    cash = np.empty((len(shocks), horizon))
+    for m in range(horizon):
+        cash[:, m] = scheduled[:, m] @ (default_month > m)
+        if m >= recovery_lag:
+            cash[:, m] += (recovery_rate * opening[:, m - recovery_lag]) @ (default_month == m - recovery_lag)
+    return cash
+
+
+def forecast_book(model_version='', config=None, chunk_size=FORECAST_CHUNK_SIZE, as_of=None):
+    """
+    Monte Carlo projection of monthly collections over the open book.
+
+    Reads outstanding balance, EMI and default probability in keyset chunks and
+    simulates every chunk against the same scenario shocks, so the per-scenario
+    totals add up across chunks while memory stays at chunk x scenarios.
+    Returns months (label, scheduled, expected and percentile band) and totals.
+    """
+    from .models import Loan
+
+    config = config or get_forecast_config()
+    horizon, scenarios = int(config['horizon_months']), int(config['scenarios'])
+    rng = np.random.default_rng(config['seed'])
+    shocks = scenario_shocks(scenarios, config['pd_volatility'], rng)
+
+    cash = np.zeros((scenarios, horizon))
+    scheduled = np.zeros(horizon)
+    loans = 0
+    open_loans = Loan.objects.filter(status__in=['Active', 'Defaulted'], outstanding_amount__gt=0).order_by('id')
+    columns = ('id', 'outstanding_amount', 'monthly_emi', 'risk_percentage', 'predicted_default_risk')
+    last_id = 0
+    while last_id is not None:
+        rows = list(open_loans.filter(id__gt=last_id).values_list(*columns)[:chunk_size])
+        last_id = rows[-1][0] if len(rows) == chunk_size else None
+        if not rows:
+            break
+        _, outstanding, emi, risk_pct, predicted = zip(*rows)
+        outstanding = np.array(outstanding, dtype=np.float64)
+        emi = np.array(emi, dtype=np.float64)
+        risk = [p / 100.0 if p is not None else (d or 0.0) for p, d in zip(risk_pct, predicted)]
+        cash += simulate_chunk(outstanding, emi, risk, shocks, horizon, config['recovery_rate'],
+                               int(config['recovery_lag_months']), rng)
+        scheduled += contractual_schedule(outstanding, emi, horizon)[1].sum(axis=0)
+        loans += len(rows)
+
+    bands = np.percentile(cash, BAND_PERCENTILES, axis=0)
+    totals = cash.sum(axis=1)
+    first_month = (as_of or date.today()).replace(day=1)
+    labels = [(np.datetime64(first_month, 'M') + 1 + m).astype(date).strftime('%b %Y') for m in range(horizon)]
+    return {
+        'model_version': model_version,
+        'loans': loans,
+        'scenarios': scenarios,
+        'months': [
+            {'month': label, 'scheduled': round(float(scheduled[m]), 2), 'expected': round(float(cash[:, m].mean()), 2),
+             **{f'p{pct}': round(float(bands[i, m]), 2) for i, pct in enumerate(BAND_PERCENTILES)}}
+            for m, label in enumerate(labels)
+        ],
+        'total': {
+            'scheduled': round(float(scheduled.sum()), 2), 'expected': round(float(totals.mean()), 2),
+            **{f'p{pct}': round(float(np.percentile(totals, pct)), 2) for pct in BAND_PERCENTILES},
+        },
+    }
+
+
+def config_hash(config):
+    """Short digest of a forecast config: stored forecasts only apply to the config they were run with."""
+    return hashlib.blake2b(repr(sorted(config.items())).encode(), digest_size=8).hexdigest()
+
+
+def compute_forecast(model_version, as_of=None):
+    """Runs forecast_book() and stores it as that day's CashFlowForecast (re-running the same day replaces it)."""
+    from .models import CashFlowForecast
+
+    config = get_forecast_config()
+    as_of = as_of or date.today()
+    result = forecast_book(model_version, config, as_of=as_of)
+    forecast, _ = CashFlowForecast.objects.update_or_create(
+        model_version=model_version, config_hash=config_hash(config), as_of=as_of,
+        defaults={'loans': result['loans'], 'result': result, 'computed_at': timezone.now()},
+    )
+    return forecast
+
+
+def get_forecast(model_version):
+    """
+    The latest stored forecast for this model version and the current config
+    (one query), with its computed_at time; None until `manage.py forecast_collections` has run.
+    """
+    from .models import CashFlowForecast
+
+    forecast = (CashFlowForecast.objects
+                .filter(model_version=model_version, config_hash=config_hash(get_forecast_config()))
+                .order_by('-as_of').first())
+    if forecast is None:
+        return None
+    return {**forecast.result, 'as_of': forecast.as_of, 'computed_at': forecast.computed_at}
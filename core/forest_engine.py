@@ -0,0 +1,127 @@
+import numpy as np
+
+# Rows walked together in contributions(). Keeps the rows x trees node matrix
+# cache-sized; bigger blocks measured slower, not faster.
+CONTRIBUTION_CHUNK_ROWS = 256
+
+
+class FlatForest:
+    """
+    A fitted RandomForest / ExtraTrees / DecisionTree classifier flattened into
+    contiguous node arrays, evaluated with a vectorised tree walk.
+
+    Skips sklearn's per-call input validation, feature-name checks and joblib
+    dispatch, which dominate the cost of scoring a single loan. Produces the
+    same probabilities as `classifier.predict_proba` (tests assert equality):
+    inputs are cast to float32 and compared `<=` against the float64 split
+    thresholds exactly as sklearn's tree code does.
+    """
+
+    def __init__(self, feature, threshold, children, leaf_value, roots, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        # children[2 * node] = left, children[2 * node + 1] = right; leaves point to themselves
+        self.children = children
+        self.leaf_value = leaf_value
+        self.roots = roots
+        self.max_depth = max_depth
+
+    @classmethod
+    def supports(cls, classifier):
+        estimators = getattr(classifier, 'estimators_', [classifier])
+        return bool(estimators) and all(hasattr(tree, 'tree_') for tree in estimators)
+
+    @classmethod
+    def from_classifier(cls, classifier):
+        estimators = getattr(classifier, 'estimators_', [classifier])
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset, max_depth = 0, 0
+
+        for estimator in estimators:
+            tree = estimator.tree_
+            node_ids = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+
+            left = np.where(is_leaf, node_ids, tree.children_left) + offset
+            right = np.where(is_leaf, node_ids, tree.children_right) + offset
+            pairs = np.empty(2 * tree.node_count, dtype=np.intp)
+            pairs[0::2], pairs[1::2] = left, right
+
+            # Per-node class distribution, normalised the way DecisionTreeClassifier.predict_proba does
+            value = tree.value[:, 0, :].astype(np.float64)
+            totals = value.sum(axis=1, keepdims=True)
+            totals[totals == 0] = 1.0
+
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            children.append(pairs)
+            values.append(value / totals)
+            roots.append(offset)
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features), dtype=np.intp),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64),
+            children=np.ascontiguousarray(np.concatenate(children)),
+            leaf_value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max_depth,
+        )
+
+    def predict_proba(self, X):
+        """Class probabilities for a 2-D array (rows x features), averaged over the trees."""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if len(X) == 1:
+            return self._predict_row(X[0])[None, :]
+
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+
+        # Every row walks every tree one level per step; leaves loop onto themselves
+        for _ in range(self.max_depth):
+            go_right = X[rows, self.feature[nodes]] > self.threshold[nodes]
+            nodes = self.children[2 * nodes + go_right]
+        return self.leaf_value[nodes].mean(axis=1)
+
+    def _predict_row(self, row):
+        # Single loan (the view path): 1-D node vector, no row broadcasting
+        nodes = self.roots
+        for _ in range(self.max_depth):
+            nodes = self.children[2 * nodes + (row[self.feature[nodes]] > self.threshold[nodes])]
+        return self.leaf_value[nodes].mean(axis=0)
+
+    def contributions(self, X, class_index=1):
+        """
+        Per-feature contributions to one class probability (Saabas / tree path
+        decomposition). Every split moves a row from its node's class share to
+        its child's; that change is credited to the split feature. Returns
+        (bias, contributions) where bias + contributions.sum(axis=1) equals
+        predict_proba(X)[:, class_index].
+        """
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        n_rows, n_features = X.shape
+        value = self.leaf_value[:, class_index]
+        n_trees = len(self.roots)
+        result = np.zeros((n_rows, n_features))
+
+        for start in range(0, n_rows, CONTRIBUTION_CHUNK_ROWS):
+            block = X[start:start + CONTRIBUTION_CHUNK_ROWS]
+            rows = np.arange(len(block))[:, None]
+            cells = rows * n_features  # flat (row, feature) index base
+            totals = np.zeros(len(block) * n_features)
+            nodes = np.broadcast_to(self.roots, (len(block), n_trees))
+
+            # Same level-by-level walk as predict_proba; leaves loop onto themselves and add 0
+            for _ in range(self.max_depth):
+                split = self.feature[nodes]
+                child = self.children[2 * nodes + (block[rows, split] > self.threshold[nodes])]
+                totals += np.bincount((cells + split).ravel(), weights=(value[child] - value[nodes]).ravel(),
+                                      minlength=totals.size)
+                nodes = child
+            result[start:start + len(block)] = totals.reshape(len(block), n_features) / n_trees
+        return value[self.roots].mean(), result
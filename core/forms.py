@@ -1,6 +1,29 @@
 from django import forms
+from django.urls import reverse_lazy
 from .models import Client, Loan, Payment
 
+
+class ClientAutocompleteWidget(forms.Select):
+    """
+    Client picker that renders only the selected client (if any). The other
+    options are fetched from the client_autocomplete endpoint as the user types,
+    so the page never iterates the whole Client table.
+    """
+
+    def __init__(self, attrs=None):
+        default_attrs = {'class': 'form-control client-autocomplete', 'data-autocomplete-url': reverse_lazy('client_autocomplete')}
+        super().__init__({**default_attrs, **(attrs or {})})
+
+    def optgroups(self, name, value, attrs=None):
+        groups = [(None, [self.create_option(name, '', '', False, 0)], 0)]
+        selected = [v for v in value if str(v).isdigit()]
+        if selected:
+            # One primary-key lookup instead of iterating every choice
+            for index, client in enumerate(self.choices.queryset.filter(pk__in=selected), start=1):
+                groups.append((None, [self.create_option(name, str(client.pk), str(client), True, index)], index))
+        return groups
+
+
 class ClientForm(forms.ModelForm):
     class Meta:
         model = Client
@@ -21,18 +44,27 @@ class ClientForm(forms.ModelForm):
 class LoanForm(forms.ModelForm):
     class Meta:
         model = Loan
-        fields = ['loan_id', 'client', 'amount', 'tenure', 'interest_rate', 'collateral_value']
+        fields = ['loan_id', 'client', 'amount', 'tenure', 'interest_rate', 'amortization_method', 'collateral_value']
         widgets = {
             'loan_id': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'e.g., LN_1001'}),
-            'client': forms.Select(attrs={'class': 'form-control searchable-select'}),
+            'client': ClientAutocompleteWidget(),
             'amount': forms.NumberInput(attrs={'class': 'form-control'}),
             'tenure': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Months (e.g., 12, 24)'}),
             'interest_rate': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.1'}),
+            'amortization_method': forms.Select(attrs={'class': 'form-select'}),
             'loan_type': forms.Select(choices=[('Personal', 'Personal'), ('Home', 'Home'), ('Auto', 'Auto'), ('Business', 'Business')], attrs={'class': 'form-select'}),
             'collateral_value': forms.NumberInput(attrs={'class': 'form-control'}),
             'monthly_emi': forms.NumberInput(attrs={'class': 'form-control bg-light', 'id': 'loan_emi', 'readonly': 'readonly'}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['amortization_method'].required = False
+
+    def clean_amortization_method(self):
+        # Older clients post no method: keep their flat-rate terms
+        return self.cleaned_data.get('amortization_method') or 'flat'
+
 class PaymentForm(forms.ModelForm):
     class Meta:
         model = Payment
@@ -0,0 +1,25 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from core.aging import AGING_CHUNK_SIZE, DEFAULT_DPD, DEFAULT_MISSED_PAYMENTS, age_book
+
+
+class Command(BaseCommand):
+    help = (
+        "Nightly aging: recomputes days past due and missed instalments for every open loan from its "
+        "repayment schedule and payments, and marks Active loans past the default rule as Defaulted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--as-of', type=date.fromisoformat, default=None, help="Aging date (YYYY-MM-DD), default today")
+        parser.add_argument('--chunk-size', type=int, default=AGING_CHUNK_SIZE, help="Loans read and updated per batch")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        counts = age_book(as_of=options['as_of'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Aged {counts['aged']} loans in {time.perf_counter() - start:.1f}s: {counts['updated']} updated, "
+            f"{counts['defaulted']} defaulted (> {DEFAULT_DPD} DPD or > {DEFAULT_MISSED_PAYMENTS} missed)."
+        ))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.strategy import STRATEGY_CHUNK_SIZE, assign_book, get_strategy_config
+
+
+class Command(BaseCommand):
+    help = (
+        "Assigns a recovery channel, settlement offer and worklist priority to every loan in one "
+        "vectorised pass per chunk (thresholds from settings.RECOVERY_STRATEGY)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=STRATEGY_CHUNK_SIZE, help="Loans read and updated per batch")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        counts = assign_book(chunk_size=options['chunk_size'])
+        config = get_strategy_config()
+        summary = ', '.join(f"{count} {channel}" for channel, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Assigned strategies to {sum(counts.values())} loans in {time.perf_counter() - start:.1f}s: {summary} "
+            f"(legal > {config['legal_risk']} risk or > {config['legal_dpd']} DPD, settlement >= {config['settlement_risk']})."
+        ))
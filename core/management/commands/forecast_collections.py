@@ -0,0 +1,26 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from core.forecast import compute_forecast
+from core.ml_utils import ml_system
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the Monte Carlo collections forecast over the open book for the active model "
+        "and stores it for the reports page (schedule it daily)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, default=None, help="Forecast date (YYYY-MM-DD), default today")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        forecast = compute_forecast(ml_system.model_version or '', as_of=options['date'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Forecast for {forecast.as_of} (model {forecast.model_version or 'bundled'}): {forecast.loans} loans, "
+            f"KES {forecast.result['total']['expected']:,.2f} expected over {len(forecast.result['months'])} months "
+            f"({time.perf_counter() - start:.1f}s)."
+        ))
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.amortization import SCHEDULE_CHUNK_SIZE, sync_schedules
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds the Installment schedule of every loan whose terms changed since its schedule was "
+        "generated (flat or reducing balance, computed in one NumPy pass per chunk)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Regenerate every schedule, changed or not")
+        parser.add_argument('--chunk-size', type=int, default=SCHEDULE_CHUNK_SIZE, help="Loans read and rebuilt per batch")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        counts = sync_schedules(chunk_size=options['chunk_size'], force=options['force'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Checked {counts['loans']} loans in {time.perf_counter() - start:.1f}s: "
+            f"{counts['regenerated']} schedules rebuilt ({counts['installments']} instalments)."
+        ))
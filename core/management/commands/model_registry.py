@@ -0,0 +1,80 @@
+import json
+import os
+
+import joblib
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.model_registry import ARTIFACT_NAME, ModelRegistry, ModelRegistryError, file_checksum, shadow_summary
+
+
+class Command(BaseCommand):
+    help = (
+        "Manages the versioned model registry: list, publish ARTIFACT, activate VERSION, "
+        "shadow VERSION|off, shadow-report [VERSION], verify [VERSION]."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['list', 'publish', 'activate', 'shadow', 'shadow-report', 'verify'])
+        parser.add_argument('target', nargs='?', help="Artifact path (publish) or version")
+        parser.add_argument('--name', help="Version name for publish (default: timestamp + checksum)")
+        parser.add_argument('--notes', default='', help="Free-text notes stored in metadata.json")
+        parser.add_argument('--activate', action='store_true', help="Activate right after publishing")
+
+    def handle(self, *args, **options):
+        registry = ModelRegistry(settings.MODEL_REGISTRY_DIR)
+        action, target = options['action'], options['target']
+        try:
+            getattr(self, 'do_' + action.replace('-', '_'))(registry, target, options)
+        except ModelRegistryError as e:
+            raise CommandError(str(e))
+
+    def _require(self, target, what):
+        if not target:
+            raise CommandError(f"Missing {what}.")
+        return target
+
+    def do_list(self, registry, target, options):
+        active, shadow = registry.active_version(), registry.shadow_version()
+        versions = registry.versions()
+        if not versions:
+            self.stdout.write(f"No versions in {registry.root}; serving the bundled loan_ml_model.joblib.")
+            return
+        for meta in versions:
+            marker = ' [ACTIVE]' if meta['version'] == active else ' [SHADOW]' if meta['version'] == shadow else ''
+            holdout = meta.get('training_report', {}).get('holdout', {})
+            self.stdout.write(
+                f"{meta['version']}{marker}  {meta['created_at'][:19]}  {meta['bytes']:,} bytes  "
+                f"F1 {holdout.get('f1', '-')}  AUC {holdout.get('roc_auc', '-')}  {meta.get('notes', '')}"
+            )
+
+    def do_publish(self, registry, target, options):
+        model_data = joblib.load(self._require(target, "artifact path"))
+        meta = registry.publish(model_data, version=options['name'], notes=options['notes'])
+        self.stdout.write(self.style.SUCCESS(f"✅ Published {meta['version']} (sha256 {meta['sha256'][:12]})."))
+        if options['activate']:
+            self.do_activate(registry, meta['version'], options)
+
+    def do_activate(self, registry, target, options):
+        registry.activate(self._require(target, "version"))
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {target} is now active; workers switch within {settings.MODEL_RELOAD_INTERVAL:g}s."))
+
+    def do_shadow(self, registry, target, options):
+        version = None if self._require(target, "version (or 'off')") == 'off' else target
+        registry.set_shadow(version)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Shadow scoring {'stopped' if version is None else 'started for ' + version}."))
+
+    def do_shadow_report(self, registry, target, options):
+        version = target or registry.shadow_version()
+        if not version:
+            raise CommandError("No shadow version given or configured.")
+        self.stdout.write(json.dumps(shadow_summary(version), indent=2))
+
+    def do_verify(self, registry, target, options):
+        versions = [target] if target else [meta['version'] for meta in registry.versions()]
+        for version in versions:
+            meta = registry.metadata(version)
+            ok = file_checksum(os.path.join(registry.version_dir(version), ARTIFACT_NAME)) == meta['sha256']
+            self.stdout.write(f"{version}: {'OK' if ok else 'CHECKSUM MISMATCH'}")
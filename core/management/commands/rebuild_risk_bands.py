@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Loan, get_risk_band_thresholds
+
+
+class Command(BaseCommand):
+    help = "Recomputes Loan.risk_band for the whole book using settings.RISK_BAND_THRESHOLDS."
+
+    def handle(self, *args, **options):
+        medium, high = get_risk_band_thresholds()
+        updated = Loan.objects.rebuild_risk_bands()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Re-banded {updated} loans (medium >= {medium}%, high >= {high}%)."
+        ))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.portfolio import take_portfolio_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Records the portfolio KPIs (one aggregate query) as a PortfolioSnapshot for the dashboard trends, "
+        "and re-bases the live dashboard totals on them."
+    )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        snapshot, drift = take_portfolio_snapshot()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Portfolio snapshot: {snapshot.total_loans} loans, KES {snapshot.total_outstanding:,.2f} outstanding "
+            f"({time.perf_counter() - start:.1f}s)."
+        ))
+        if drift:
+            corrected = ', '.join(f"{field} {value:+}" for field, value in drift.items())
+            self.stdout.write(self.style.WARNING(f"Live totals had drifted and were corrected: {corrected}"))
@@ -0,0 +1,61 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.model_registry import ModelRegistry
+from core.training import DB_CHUNK_SIZE, load_csv, load_database, save_model, train
+
+
+class Command(BaseCommand):
+    help = (
+        "Retrains the risk model from the live database (default) or from CSV files, "
+        "tunes it with successive halving and evaluates it on a held-out split."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--csv', action='append', metavar='PATH', help="Train from CSV instead of the database (repeatable)")
+        parser.add_argument('--chunk-size', type=int, default=DB_CHUNK_SIZE, help="Rows read from the database per query")
+        parser.add_argument('--candidates', type=int, default=30, help="Parameter sets tried by the search")
+        parser.add_argument('--test-size', type=float, default=0.2, help="Held-out share used for evaluation")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', default=os.path.join(settings.BASE_DIR, 'loan_ml_model.joblib'))
+        parser.add_argument('--dry-run', action='store_true', help="Train and report without saving the model")
+        parser.add_argument('--publish', action='store_true', help="Publish to the model registry instead of --output")
+        parser.add_argument('--activate', action='store_true', help="Publish and make it the active version")
+        parser.add_argument('--shadow', action='store_true', help="Publish and shadow-score it next to the active version")
+
+    def handle(self, *args, **options):
+        if options['csv']:
+            self.stdout.write(f"Loading {', '.join(options['csv'])}...")
+            df = load_csv(options['csv'])
+        else:
+            self.stdout.write("Loading loans from the database...")
+            df = load_database(options['chunk_size'])
+        if len(df) < 50:
+            raise CommandError(f"Only {len(df)} loans to train on; need at least 50.")
+
+        model_data, report = train(
+            df, test_size=options['test_size'], n_candidates=options['candidates'],
+            random_state=options['seed'], log=self.stdout.write,
+        )
+        self.stdout.write(json.dumps(report, indent=2, default=str))
+
+        if options['dry_run']:
+            self.stdout.write("Dry run: model not saved.")
+            return
+        holdout = report['holdout']
+        summary = f"held-out F1 {holdout['f1']:.1%}, {report['total_seconds']}s, peak {report['peak_memory_mb']} MB"
+        if options['publish'] or options['activate'] or options['shadow']:
+            registry = ModelRegistry(settings.MODEL_REGISTRY_DIR)
+            version = registry.publish(model_data, notes=f"train_model ({len(df)} rows)")['version']
+            if options['activate']:
+                registry.activate(version)
+            elif options['shadow']:
+                registry.set_shadow(version)
+            state = 'active' if options['activate'] else 'shadow' if options['shadow'] else 'published'
+            self.stdout.write(self.style.SUCCESS(f"✅ Model version {version} {state} ({summary})."))
+            return
+        save_model(model_data, options['output'])
+        self.stdout.write(self.style.SUCCESS(f"✅ Saved model to {options['output']} ({summary})."))
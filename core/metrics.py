@@ -0,0 +1,209 @@
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+# Per-process registry. Each gunicorn worker exports its own series; Prometheus
+# aggregates them by instance, so nothing here needs to be shared between workers.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+_request_stats = ContextVar('request_stats', default=None)
+_query_stats_lock = threading.Lock()
+
+
+def metrics_enabled():
+    return getattr(settings, 'METRICS_ENABLED', False)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+class ViewStats:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.db_seconds = 0.0
+        self.ml_seconds = 0.0
+        self.template_seconds = 0.0
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+        # Extra counters pushed by other subsystems (e.g. the scoring cache)
+        self.counters = {}
+
+    def record_request(self, view, seconds, stats):
+        with self.lock:
+            view_stats = self.views.setdefault(view, ViewStats())
+            view_stats.latency.observe(seconds)
+            view_stats.queries.observe(stats['db_queries'])
+            view_stats.db_seconds += stats['db']
+            view_stats.ml_seconds += stats['ml']
+            view_stats.template_seconds += stats['template']
+
+    def incr(self, name, labels=None, amount=1):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+            self.counters.clear()
+
+
+registry = MetricsRegistry()
+
+
+# =============================================
+# REQUEST-SCOPED TIMERS
+# =============================================
+def start_request():
+    """Opens a per-request accumulator; returns the token for end_request()."""
+    return _request_stats.set({'db_queries': 0, 'db': 0.0, 'ml': 0.0, 'template': 0.0})
+
+
+def end_request(token):
+    stats = _request_stats.get()
+    _request_stats.reset(token)
+    return stats
+
+
+@contextmanager
+def timed(kind):
+    """Adds the block's wall time to the current request under `kind` ('ml', 'template', 'db')."""
+    stats = _request_stats.get()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats[kind] += time.perf_counter() - start
+
+
+def query_timer(execute, sql, params, many, context):
+    """connection.execute_wrapper hook: counts and times every query of the request."""
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        # An async view's query threads add to the same request's stats concurrently
+        with _query_stats_lock:
+            stats['db'] += elapsed
+            stats['db_queries'] += 1
+
+
+@contextmanager
+def query_timers():
+    """Installs query_timer on this thread's connections (the request thread, or an async view's query thread)."""
+    with ExitStack() as stack:
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(query_timer))
+        yield
+
+
+# =============================================
+# TEMPLATE BACKEND (times the top-level render)
+# =============================================
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        with timed('template'):
+            return self.template.render(context, request)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """Drop-in for the Django template backend that reports render time to the metrics registry."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+# =============================================
+# PROMETHEUS TEXT EXPORT
+# =============================================
+def _labels(**labels):
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels.items()) + '}'
+
+
+def _histogram_lines(name, view, histogram):
+    lines = []
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        lines.append(f'{name}_bucket{_labels(view=view, le=bound)} {count}')
+    lines.append(f'{name}_bucket{_labels(view=view, le="+Inf")} {histogram.count}')
+    lines.append(f'{name}_sum{_labels(view=view)} {histogram.total}')
+    lines.append(f'{name}_count{_labels(view=view)} {histogram.count}')
+    return lines
+
+
+def render_prometheus():
+    """Serialises the registry in the Prometheus text exposition format (v0.0.4)."""
+    with registry.lock:
+        views = sorted(registry.views.items())
+        counters = sorted(registry.counters.items())
+
+    lines = [
+        '# HELP intellidebt_request_duration_seconds Request latency by URL name.',
+        '# TYPE intellidebt_request_duration_seconds histogram',
+    ]
+    for view, stats in views:
+        lines += _histogram_lines('intellidebt_request_duration_seconds', view, stats.latency)
+
+    lines += [
+        '# HELP intellidebt_db_queries_per_request Database queries issued per request.',
+        '# TYPE intellidebt_db_queries_per_request histogram',
+    ]
+    for view, stats in views:
+        lines += _histogram_lines('intellidebt_db_queries_per_request', view, stats.queries)
+
+    for metric, attr, help_text in (
+        ('intellidebt_db_query_seconds_total', 'db_seconds', 'Time spent executing database queries.'),
+        ('intellidebt_ml_seconds_total', 'ml_seconds', 'Time spent in ml_system prediction calls.'),
+        ('intellidebt_template_render_seconds_total', 'template_seconds', 'Time spent rendering templates.'),
+    ):
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+        for view, stats in views:
+            lines.append(f'{metric}{_labels(view=view)} {getattr(stats, attr)}')
+
+    declared = set()
+    for (name, labels), value in counters:
+        if name not in declared:
+            lines.append(f'# TYPE {name} counter')
+            declared.add(name)
+        lines.append(f'{name}{_labels(**dict(labels)) if labels else ""} {value}')
+
+    return '\n'.join(lines) + '\n'
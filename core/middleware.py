@@ -0,0 +1,53 @@
+import time
+
+from . import db_routing, metrics
+
+
+class MetricsMiddleware:
+    """
+    Records latency, query count/time, ML time and template time per URL name.
+    No-op unless settings.METRICS_ENABLED is on; read the results at /metrics/.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not metrics.metrics_enabled():
+            return self.get_response(request)
+
+        token = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            with metrics.query_timers():
+                response = self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - start
+            stats = metrics.end_request(token)
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match and match.view_name else '<unresolved>')
+        metrics.registry.record_request(view, elapsed, stats)
+        return response
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Read-your-writes for the replica router: after a successful write request
+    the session reads from the primary for REPLICA_STICKY_SECONDS, so the
+    redirect that follows a POST never shows replica-lagged data.
+    No-op unless a 'replica' database is configured.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not db_routing.replica_configured():
+            return self.get_response(request)
+
+        with db_routing.pin_primary(db_routing.is_pinned(request.session)):
+            response = self.get_response(request)
+        if request.method not in db_routing.SAFE_METHODS and response.status_code < 500:
+            request.session[db_routing.STICKY_SESSION_KEY] = db_routing.sticky_until()
+        return response
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+from core.search import SEARCH_INDEX_SQL, SEARCH_INDEX_DROP_SQL
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_loan_risk_percentage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='client',
+            name='phone_number',
+            field=models.CharField(blank=True, db_index=True, max_length=20, null=True),
+        ),
+        # Search index maintained on write: FTS5 triggers on SQLite, a generated
+        # tsvector column + trigram index on PostgreSQL. Other vendors use the LIKE fallback.
+        migrations.RunPython(
+            _run(SEARCH_INDEX_SQL),
+            _run(SEARCH_INDEX_DROP_SQL),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations, models
+
+
+# Band thresholds (percent) as of this migration. Frozen here so the backfill
+# never changes with later edits to core.models or settings; deployments with
+# other RISK_BAND_THRESHOLDS re-band with `manage.py rebuild_risk_bands`.
+MEDIUM_THRESHOLD = 40
+HIGH_THRESHOLD = 70
+
+
+def backfill_risk_bands(apps, schema_editor):
+    from django.db.models import Case, CharField, Q, Value, When
+
+    Loan = apps.get_model('core', 'Loan')
+    Loan.objects.using(schema_editor.connection.alias).update(risk_band=Case(
+        When(Q(status='Paid') | Q(outstanding_amount__lte=0), then=Value('closed')),
+        When(risk_percentage__isnull=True, then=Value('pending')),
+        When(risk_percentage__gte=HIGH_THRESHOLD, then=Value('high')),
+        When(risk_percentage__gte=MEDIUM_THRESHOLD, then=Value('medium')),
+        default=Value('low'),
+        output_field=CharField(),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_client_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loan',
+            name='risk_band',
+            field=models.CharField(choices=[('pending', 'Pending'), ('low', 'Low Risk'), ('medium', 'Medium Risk'), ('high', 'High Risk'), ('closed', 'Closed')], db_index=True, default='pending', max_length=10),
+        ),
+        migrations.RunPython(backfill_risk_bands, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.19 on 2026-10-19 13:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_loan_risk_band'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShadowScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('active_version', models.CharField(max_length=64)),
+                ('shadow_version', models.CharField(db_index=True, max_length=64)),
+                ('primary_score', models.FloatField()),
+                ('shadow_score', models.FloatField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('loan', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='shadow_scores', to='core.loan')),
+            ],
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.19 on 2026-10-19 13:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_shadowscore'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loan',
+            name='feature_hash',
+            field=models.CharField(blank=True, default='', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='model_version',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='scored_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='RiskScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_version', models.CharField(db_index=True, max_length=64)),
+                ('feature_hash', models.CharField(max_length=16)),
+                ('probability', models.FloatField()),
+                ('source', models.CharField(blank=True, default='', max_length=30)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('loan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='risk_scores', to='core.loan')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['loan', '-created_at'], name='riskscore_loan_recent_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 4.2.19 on 2026-10-19 13:48
+
+from django.db import migrations, models
+
+
+# core.strategy.DEFAULT_STRATEGY as of this migration, frozen so the backfill
+# never depends on later versions of core.strategy (its fields and columns can
+# grow). Deployments with another RECOVERY_STRATEGY re-run
+# `manage.py assign_strategies` afterwards.
+LEGAL_RISK = 0.75
+SETTLEMENT_RISK = 0.50
+LEGAL_DPD = 90
+LEGAL_DISCOUNT = 30
+SETTLEMENT_DISCOUNT = 15
+
+
+def backfill_strategies(apps, schema_editor):
+    """One UPDATE: the same channel / discount / settlement / priority rules as core.strategy.assign() had."""
+    from decimal import Decimal
+    from django.db.models import Case, DecimalField, F, FloatField, IntegerField, Q, Value, When
+    from django.db.models.functions import Cast, Coalesce, Round
+
+    Loan = apps.get_model('core', 'Loan')
+
+    def risk_above(threshold, inclusive=False):
+        # risk = risk_percentage / 100 when scored, else predicted_default_risk (0 when unset)
+        op = 'gte' if inclusive else 'gt'
+        return (
+            Q(risk_percentage__isnull=False, **{f'risk_percentage__{op}': threshold * 100})
+            | Q(risk_percentage__isnull=True, **{f'predicted_default_risk__{op}': threshold})
+        )
+
+    closed = Q(status='Paid') | Q(outstanding_amount__lte=0)
+    legal = risk_above(LEGAL_RISK) | Q(days_past_due__gt=LEGAL_DPD)
+    settlement = risk_above(SETTLEMENT_RISK, inclusive=True)
+    risk = Case(
+        When(risk_percentage__isnull=False, then=F('risk_percentage') / Value(100.0)),
+        default=Coalesce(F('predicted_default_risk'), Value(0.0)),
+        output_field=FloatField(),
+    )
+
+    def settle(discount):
+        factor = Value(Decimal(100 - discount) / 100, output_field=DecimalField(max_digits=5, decimal_places=2))
+        return Round(F('outstanding_amount') * factor, 2, output_field=DecimalField(max_digits=15, decimal_places=2))
+
+    Loan.objects.using(schema_editor.connection.alias).update(
+        recovery_channel=Case(
+            When(closed, then=Value('closed')),
+            When(legal, then=Value('legal')),
+            When(settlement, then=Value('settlement')),
+            default=Value('reminders'),
+        ),
+        settlement_discount=Case(
+            When(closed, then=Value(0)),
+            When(legal, then=Value(LEGAL_DISCOUNT)),
+            When(settlement, then=Value(SETTLEMENT_DISCOUNT)),
+            default=Value(0),
+            output_field=IntegerField(),
+        ),
+        settlement_amount=Case(
+            When(closed, then=Value(Decimal('0'))),
+            When(legal, then=settle(LEGAL_DISCOUNT)),
+            When(settlement, then=settle(SETTLEMENT_DISCOUNT)),
+            default=Value(Decimal('0')),
+            output_field=DecimalField(max_digits=15, decimal_places=2),
+        ),
+        collection_priority=Case(
+            When(closed, then=Value(0.0)),
+            default=Round(risk * Cast('outstanding_amount', FloatField()), 2),
+            output_field=FloatField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_risk_score_provenance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loan',
+            name='collection_priority',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='recovery_channel',
+            field=models.CharField(choices=[('legal', 'Immediate Legal Action'), ('settlement', 'Settlement Offers'), ('reminders', 'Automated Reminders'), ('closed', 'Loan Closed')], default='reminders', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='settlement_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=15),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='settlement_discount',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['recovery_channel', '-collection_priority'], name='loan_worklist_idx'),
+        ),
+        migrations.RunPython(backfill_strategies, migrations.RunPython.noop),
+    ]
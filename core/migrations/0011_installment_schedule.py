@@ -0,0 +1,44 @@
+# Generated by Django 4.2.19 on 2026-10-19 14:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_recovery_strategy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loan',
+            name='amortization_method',
+            field=models.CharField(choices=[('flat', 'Flat Rate'), ('reducing', 'Reducing Balance')], default='flat', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='schedule_hash',
+            field=models.CharField(blank=True, default='', max_length=16),
+        ),
+        migrations.CreateModel(
+            name='Installment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveSmallIntegerField()),
+                ('due_date', models.DateField(db_index=True)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('principal', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('interest', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('balance', models.DecimalField(decimal_places=2, help_text='Principal left after this instalment', max_digits=15)),
+                ('loan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='installments', to='core.loan')),
+            ],
+            options={
+                'ordering': ['loan', 'number'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='installment',
+            constraint=models.UniqueConstraint(fields=('loan', 'number'), name='installment_loan_number_uniq'),
+        ),
+    ]
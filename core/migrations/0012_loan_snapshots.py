@@ -0,0 +1,33 @@
+# Generated by Django 4.2.19 on 2026-10-19 14:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_installment_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('snapshot_date', models.DateField()),
+                ('bucket', models.CharField(choices=[('current', 'Current'), ('30', '30-59 DPD'), ('60', '60-89 DPD'), ('90', '90+ DPD'), ('closed', 'Closed')], max_length=10)),
+                ('days_past_due', models.IntegerField(default=0)),
+                ('outstanding', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('vintage', models.DateField(blank=True, help_text="First day of the loan's origination month", null=True)),
+                ('loan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='core.loan')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['snapshot_date', 'vintage'], name='loansnapshot_vintage_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='loansnapshot',
+            constraint=models.UniqueConstraint(fields=('snapshot_date', 'loan'), name='loansnapshot_date_loan_uniq'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.19 on 2026-10-19 14:13
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_loan_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_loans', models.IntegerField(default=0)),
+                ('active_loans', models.IntegerField(default=0)),
+                ('defaulted_loans', models.IntegerField(default=0)),
+                ('paid_loans', models.IntegerField(default=0)),
+                ('overdue_loans', models.IntegerField(default=0, help_text='Active loans with days past due')),
+                ('total_disbursed', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('total_outstanding', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('taken_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'get_latest_by': 'taken_at',
+            },
+        ),
+        migrations.CreateModel(
+            name='PortfolioTotals',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_loans', models.IntegerField(default=0)),
+                ('active_loans', models.IntegerField(default=0)),
+                ('defaulted_loans', models.IntegerField(default=0)),
+                ('paid_loans', models.IntegerField(default=0)),
+                ('overdue_loans', models.IntegerField(default=0, help_text='Active loans with days past due')),
+                ('total_disbursed', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('total_outstanding', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
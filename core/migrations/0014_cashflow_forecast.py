@@ -0,0 +1,33 @@
+# Generated by Django 4.2.19 on 2026-10-19 14:45
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_portfolio_kpis'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CashFlowForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_version', models.CharField(max_length=64)),
+                ('config_hash', models.CharField(max_length=16)),
+                ('as_of', models.DateField()),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('loans', models.IntegerField(default=0)),
+                ('result', models.JSONField(help_text='core.forecast.forecast_book() output: months, totals and bands')),
+            ],
+            options={
+                'get_latest_by': 'as_of',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cashflowforecast',
+            constraint=models.UniqueConstraint(fields=('model_version', 'config_hash', 'as_of'), name='cashflowforecast_key_uniq'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.19 on 2026-10-19 14:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_cashflow_forecast'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loan',
+            name='opening_days_past_due',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='opening_missed_payments',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -1,69 +1,273 @@
 import pandas as pd
 import numpy as np
 import os
+import threading
+import time
 import joblib
 from django.conf import settings
 
+from . import strategy
+from .columnar import CATEGORICAL_COLUMNS, load_analytics, read_meta
+from .forest_engine import FlatForest
+from .metrics import timed
+from .model_registry import ModelRegistry, ModelRegistryError, ShadowScorer
+from .score_cache import build_score_cache
+from .scoring import hash_rows
+
+# Above this many rows sklearn's compiled per-tree loops beat the NumPy tree walk,
+# so large batches (update_scores, uploads) keep going through predict_proba.
+FAST_ENGINE_MAX_ROWS = 256
+
+# Batches up to this size go through the score cache. Bigger ones (update_scores,
+# uploads) are mostly distinct loans and would only flush the hot entries.
+SCORE_CACHE_MAX_ROWS = 256
+
+# Reasons returned per loan, and the smallest contribution (in probability) worth showing
+EXPLANATION_TOP_K = 3
+MIN_CONTRIBUTION = 0.01
+
+# Plain-language names for the model features in explanations
+FEATURE_LABELS = {
+    'Age': 'Borrower age',
+    'Monthly_Income': 'Monthly income',
+    'Loan_Amount': 'Loan amount',
+    'Loan_Tenure': 'Loan tenure',
+    'Interest_Rate': 'Interest rate',
+    'Collateral_Value': 'Collateral value',
+    'Outstanding_Loan_Amount': 'Outstanding balance',
+    'Monthly_EMI': 'Monthly instalment',
+    'Num_Missed_Payments': 'Missed payments',
+    'Days_Past_Due': 'Days past due',
+    'DTI_Ratio': 'Debt-to-income ratio',
+    'Loan_to_Collateral': 'Loan-to-collateral ratio',
+    'Payment_Strain': 'Payment strain',
+}
+
+# Version reported for the bundled loan_ml_model.joblib when the registry has no ACTIVE pointer
+LEGACY_VERSION = 'legacy'
+
+
+def choose_serving_model(serving_models, model_profiles, budget_ms=None):
+    """
+    Name of the most accurate model (held-out AUC) whose measured p99 single-row
+    latency fits `budget_ms`, or the fastest one if none does. No budget, or an
+    artifact without profiles, keeps the full forest.
+    """
+    profiles = {name: p for name, p in model_profiles.items() if name in serving_models}
+    if not budget_ms or not profiles:
+        return 'forest'
+    fitting = [name for name, p in profiles.items() if p['p99_ms'] <= budget_ms]
+    if fitting:
+        return max(fitting, key=lambda name: (profiles[name]['roc_auc'] or 0, -profiles[name]['p99_ms']))
+    return min(profiles, key=lambda name: profiles[name]['p99_ms'])
+
+
 class LoanMLSystem:
     def __init__(self):
         self.classifier = None
         self.kmeans = None
         self.cluster_scaler = None
-        self.df_data = pd.DataFrame()
+        self._analytics_frames = {}
+        self._analytics_state = None
         self.features_list = [
             'Age', 'Monthly_Income', 'Loan_Amount', 'Loan_Tenure', 'Interest_Rate', 
             'Collateral_Value', 'Outstanding_Loan_Amount', 'Monthly_EMI', 
             'Num_Missed_Payments', 'Days_Past_Due'
         ]
         self.custom_threshold = 0.50 # Default threshold
+        self.serving_models = {}
+        self.model_profiles = {}
+        self.serving_model_name = 'forest'
+        self.serving_model = None
+        self.fast_engine = None
+        self.explainer = None
+        self.score_cache = build_score_cache(settings)
+        self.model_version = None
+        self.shadow = None
+        self.registry = None
+        self._pointer_state = None
+        self._next_reload_check = 0.0
+        self._reload_lock = threading.Lock()
         self.load_system()
 
     def load_system(self):
-        # 1. Load the Analytics Data for charts
-        csv_path = os.path.join(settings.BASE_DIR, 'synthetic_loans_1000.csv')
-        if os.path.exists(csv_path):
-            self.df_data = pd.read_csv(csv_path)
-
-        # 2. Load the Pre-Trained Machine Learning Model
-        model_path = os.path.join(settings.BASE_DIR, 'loan_ml_model.joblib')
-        if os.path.exists(model_path):
-            model_data = joblib.load(model_path)
-            self.classifier = model_data['classifier']
-            self.kmeans = model_data['kmeans']
-            self.cluster_scaler = model_data['cluster_scaler']
-            self.segment_map = model_data['segment_map']
-            self.features_list = model_data['features_list']
-            self.custom_threshold = model_data.get('custom_threshold', 0.50)
-            print("✅ ML Models loaded successfully from disk!")
+        # Load the active model version (falls back to the bundled loan_ml_model.joblib).
+        # Analytics data for the charts is read on first use, see analytics_frame().
+        self.registry = ModelRegistry(settings.MODEL_REGISTRY_DIR)
+        self._pointer_state = self.registry.pointer_state()
+        self._next_reload_check = time.monotonic() + settings.MODEL_RELOAD_INTERVAL
+        try:
+            self._load_active()
+        except (ModelRegistryError, OSError) as e:
+            print(f"WARNING: Could not load the active model: {e}")
+
+    def _load_active(self):
+        active = self.registry.active_version()
+        if active:
+            model_data, _ = self.registry.load(active)
+            self._apply(model_data, active)
+        else:
+            model_path = os.path.join(settings.BASE_DIR, 'loan_ml_model.joblib')
+            if not os.path.exists(model_path):
+                print(f"WARNING: Model file not found at {model_path}.")
+                return
+            self._apply(joblib.load(model_path), LEGACY_VERSION)
+        self._load_shadow()
+        print(f"✅ ML Models loaded successfully from disk! (version {self.model_version})")
+
+    def _apply(self, model_data, version):
+        # Everything is built first, then swapped in, so a request never sees a half-loaded model
+        serving_models = {'forest': model_data['classifier'], **model_data.get('serving_models', {})}
+        model_profiles = model_data.get('model_profiles', {})
+        serving_model_name = choose_serving_model(
+            serving_models, model_profiles, getattr(settings, 'ML_LATENCY_BUDGET_MS', None))
+        serving_model = serving_models[serving_model_name]
+
+        # Optional flattened-forest engine (same probabilities, no sklearn/pandas per call)
+        fast_engine = None
+        if getattr(settings, 'ML_FAST_INFERENCE', False) and FlatForest.supports(serving_model):
+            fast_engine = FlatForest.from_classifier(serving_model)
+
+        # Explanations always decompose the forest's own paths, whichever model serves scores
+        classifier = model_data['classifier']
+        explainer = None
+        if fast_engine is not None and serving_model is classifier:
+            explainer = fast_engine
+        elif FlatForest.supports(classifier):
+            explainer = FlatForest.from_classifier(classifier)
+
+        self.classifier = model_data['classifier']
+        self.kmeans = model_data['kmeans']
+        self.cluster_scaler = model_data['cluster_scaler']
+        self.segment_map = model_data['segment_map']
+        self.features_list = model_data['features_list']
+        self.custom_threshold = model_data.get('custom_threshold', 0.50)
+        self.serving_models = serving_models
+        self.model_profiles = model_profiles
+        self.serving_model_name = serving_model_name
+        self.serving_model = serving_model
+        self.fast_engine = fast_engine
+        self.explainer = explainer
+        self.model_version = version
+        if self.score_cache is not None:
+            self.score_cache.clear()
+
+    def _load_shadow(self):
+        shadow_version = self.registry.shadow_version()
+        old = self.shadow
+        if shadow_version and shadow_version != self.model_version:
+            if old is not None and old.version == shadow_version and old.active_version == self.model_version:
+                return
+            model_data, _ = self.registry.load(shadow_version)
+            self.shadow = ShadowScorer(
+                model_data['classifier'], model_data['features_list'], shadow_version, self.model_version)
         else:
-            print(f"WARNING: Model file not found at {model_path}.")
+            self.shadow = None
+        if old is not None and old is not self.shadow:
+            old.stop()
+
+    def refresh_if_changed(self):
+        """
+        Hot swap: at most every MODEL_RELOAD_INTERVAL seconds, stat the registry's
+        ACTIVE/SHADOW pointers and reload if either was replaced. Returns True on reload.
+        """
+        now = time.monotonic()
+        if now < self._next_reload_check or self.registry is None:
+            return False
+        self._next_reload_check = now + settings.MODEL_RELOAD_INTERVAL
+        state = self.registry.pointer_state()
+        if state == self._pointer_state:
+            return False
+        with self._reload_lock:
+            if state == self._pointer_state:
+                return False
+            try:
+                self._load_active()
+            except (ModelRegistryError, OSError, KeyError) as e:
+                # Keep serving the current model rather than failing requests
+                print(f"WARNING: Model reload failed, keeping version {self.model_version}: {e}")
+            self._pointer_state = state
+        return True
 
     def get(self, key, default=None):
         """Allows dictionary-like access to system attributes (e.g., custom_threshold)"""
         return getattr(self, key, default)
 
+    def select_model(self, budget_ms=None):
+        return choose_serving_model(self.serving_models, self.model_profiles, budget_ms)
+
+    def predict_proba(self, features_dicts, loan_ids=None):
+        """
+        Default probability for each feature dict (raises KeyError if a model feature is missing).
+        `loan_ids` only label the rows stored by shadow scoring.
+        """
+        self.refresh_if_changed()
+        cache = self.score_cache
+        if cache is None or len(features_dicts) > SCORE_CACHE_MAX_ROWS:
+            scores = self._score(features_dicts)
+        else:
+            X = np.array([[row[col] for col in self.features_list] for row in features_dicts], dtype=np.float64)
+            version = self.model_version
+            keys = [f"{version}:{digest}" for digest in hash_rows(X)]
+            cached = cache.get_many(keys)
+            misses = [i for i, key in enumerate(keys) if key not in cached]
+            scores = np.array([cached.get(key, np.nan) for key in keys])
+            if misses:
+                scores[misses] = self._score([features_dicts[i] for i in misses])
+                if version == self.model_version:  # not swapped mid-call
+                    cache.set_many({keys[i]: scores[i] for i in misses})
+
+        shadow = self.shadow
+        if shadow is not None:
+            shadow.submit(features_dicts, scores, loan_ids)
+        return scores
+
+    def _score(self, features_dicts):
+        with timed('ml'):
+            if self.fast_engine is not None and len(features_dicts) <= FAST_ENGINE_MAX_ROWS:
+                X = np.array([[row[col] for col in self.features_list] for row in features_dicts], dtype=np.float32)
+                return self.fast_engine.predict_proba(X)[:, 1]
+            df_input = pd.DataFrame(features_dicts)[self.features_list]
+            return self.serving_model.predict_proba(df_input)[:, 1]
+
     def predict_risk(self, features_dict):
         if not self.classifier:
             return 0.5, "System Not Ready"
 
-        df_input = pd.DataFrame([features_dict])
-        
-        for col in self.features_list:
-            if col not in df_input.columns:
-                df_input[col] = 0 
-                
-        risk_score = self.classifier.predict_proba(df_input[self.features_list])[:, 1][0]
-        
-        if risk_score > 0.75:
-            strategy = "Immediate legal notices & aggressive recovery attempts"
-        elif 0.50 <= risk_score <= 0.75:
-            strategy = "Settlement offers & repayment plans"
-        else:
-            strategy = "Automated reminders & monitoring"
-            
-        return risk_score, strategy
+        features_dict = {col: features_dict.get(col, 0) for col in self.features_list}
+        risk_score = self.predict_proba([features_dict])[0]
+        action = self.recommend_channel(risk_score, features_dict.get('Days_Past_Due', 0))['action']
+        return risk_score, action
 
     def explain_prediction(self, features_dict):
+        return self.explain_batch([features_dict])[0]
+
+    def explain_batch(self, features_dicts, top_k=EXPLANATION_TOP_K):
+        """
+        Top-k reasons per loan from the forest's per-feature contributions
+        (one vectorised pass for the whole batch), largest effect first.
+        """
+        if self.explainer is None:
+            return [self._rule_reasons(row) for row in features_dicts]
+
+        X = np.array([[row.get(col, 0) for col in self.features_list] for row in features_dicts], dtype=np.float32)
+        with timed('ml'):
+            _, contributions = self.explainer.contributions(X)
+        order = np.argsort(-np.abs(contributions), axis=1)[:, :top_k]
+        top = np.take_along_axis(contributions, order, axis=1)
+
+        explanations = []
+        for columns, values in zip(order, top):
+            reasons = [
+                f"{FEATURE_LABELS.get(self.features_list[col], self.features_list[col])} "
+                f"{'raised' if value > 0 else 'lowered'} risk by {abs(value) * 100:.1f}%"
+                for col, value in zip(columns, values) if abs(value) >= MIN_CONTRIBUTION
+            ]
+            explanations.append(reasons or ["No single factor stands out; risk is close to the portfolio average."])
+        return explanations
+
+    def _rule_reasons(self, features_dict):
+        # Fallback for models that cannot be decomposed (no forest loaded)
         reasons = []
         if features_dict.get('Num_Missed_Payments', 0) > 1:
             reasons.append("History of missed payments.")
@@ -85,42 +289,46 @@ class LoanMLSystem:
                 input_df[col] = 0
                 
         clustering_features = ['Monthly_Income', 'Loan_Amount']
-        X_input = self.cluster_scaler.transform(input_df[clustering_features])
-        labels = self.kmeans.predict(X_input)
+        with timed('ml'):
+            X_input = self.cluster_scaler.transform(input_df[clustering_features])
+            labels = self.kmeans.predict(X_input)
         return [self.segment_map.get(l, "Unknown") for l in labels]
 
+    @property
+    def df_data(self):
+        return self.analytics_frame()
+
+    def analytics_frame(self, columns=None):
+        """
+        Analytics data with only `columns` (default all) loaded: the memory-mapped
+        dataset from `manage.py export_analytics`, or the bundled CSV before the
+        first export. Cached per column set until a new export replaces the dataset.
+        """
+        key = tuple(columns) if columns is not None else None
+        meta = read_meta(settings.ANALYTICS_DATASET_DIR)
+        state = meta and meta['exported_at']
+        if state != self._analytics_state:
+            self._analytics_frames, self._analytics_state = {}, state
+        if key not in self._analytics_frames:
+            if meta is not None:
+                frame = load_analytics(settings.ANALYTICS_DATASET_DIR, columns)
+            else:
+                csv_path = os.path.join(settings.BASE_DIR, 'synthetic_loans_1000.csv')
+                frame = pd.read_csv(
+                    csv_path, usecols=columns,
+                    dtype={name: 'category' for name in CATEGORICAL_COLUMNS if columns is None or name in columns},
+                ) if os.path.exists(csv_path) else pd.DataFrame(columns=columns)
+                if columns is not None:
+                    frame = frame[list(columns)]
+            self._analytics_frames[key] = frame
+        return self._analytics_frames[key]
+
     def get_analytics_json(self):
         return self.df_data.to_json(orient='records')
 
     def recommend_channel(self, risk_score, days_past_due, outstanding_amount=None):
-        if outstanding_amount is not None and outstanding_amount <= 0:
-            return {
-                'method': 'Loan Closed',
-                'icon': 'bi-check-circle-fill',
-                'color': 'success',
-                'action': 'No further action required. Good job!'
-            }
-
-        if risk_score > 0.75:
-            return {
-                'method': 'Immediate Legal Action',
-                'icon': 'bi-hammer',
-                'color': 'danger', 
-                'action': 'Immediate legal notices & aggressive recovery attempts'
-            }
-        elif 0.50 <= risk_score <= 0.75:
-            return {
-                'method': 'Settlement Offers',
-                'icon': 'bi-hand-thumbs-up-fill',
-                'color': 'warning', 
-                'action': 'Settlement offers & repayment plans'
-            }
-        else:
-            return {
-                'method': 'Automated Reminders',
-                'icon': 'bi-chat-dots-fill',
-                'color': 'success', 
-                'action': 'Automated reminders & monitoring'
-            }
+        outstanding = 1.0 if outstanding_amount is None else float(outstanding_amount)
+        channel = strategy.assign([risk_score], [days_past_due or 0], [outstanding])['channel'][0]
+        return dict(strategy.CHANNELS[str(channel)])
 
 ml_system = LoanMLSystem()
\ No newline at end of file
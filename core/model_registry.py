@@ -0,0 +1,270 @@
+import hashlib
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timezone as dt_timezone
+
+import joblib
+import sklearn
+
+from .metrics import registry as metrics_registry
+
+# Registry layout:
+#   <root>/versions/<version>/model.joblib   the artifact (same dict train_model saves)
+#   <root>/versions/<version>/metadata.json  features, threshold, training report, sha256
+#   <root>/ACTIVE                            version served by every worker
+#   <root>/SHADOW                            optional candidate scored in the background
+ARTIFACT_NAME = 'model.joblib'
+METADATA_NAME = 'metadata.json'
+ACTIVE_POINTER = 'ACTIVE'
+SHADOW_POINTER = 'SHADOW'
+
+# Shadow batches waiting to be scored; beyond this they are dropped, never blocking a request
+SHADOW_QUEUE_SIZE = 1000
+
+
+class ModelRegistryError(Exception):
+    pass
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _atomic_write(path, text):
+    """Writes via a temp file in the same directory + os.replace, so readers see old or new, never half."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.chmod(tmp_path, 0o644)  # mkstemp creates 0600; workers may run as another user
+    os.replace(tmp_path, path)
+
+
+# =============================================
+# REGISTRY (artifacts + pointers on disk)
+# =============================================
+class ModelRegistry:
+    def __init__(self, root):
+        self.root = root
+        self.versions_dir = os.path.join(root, 'versions')
+
+    def version_dir(self, version):
+        return os.path.join(self.versions_dir, version)
+
+    def publish(self, model_data, version=None, notes=''):
+        """Stores a new immutable version and returns its metadata. Does not activate it."""
+        os.makedirs(self.versions_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=self.versions_dir, prefix='.staging-')
+        try:
+            artifact = os.path.join(staging, ARTIFACT_NAME)
+            joblib.dump(model_data, artifact)
+            checksum = file_checksum(artifact)
+            version = version or f"{datetime.now(dt_timezone.utc):%Y%m%dT%H%M%S}-{checksum[:8]}"
+            if os.path.exists(self.version_dir(version)):
+                raise ModelRegistryError(f"Version {version} already exists.")
+
+            report = model_data.get('training_report', {})
+            metadata = {
+                'version': version,
+                'created_at': datetime.now(dt_timezone.utc).isoformat(),
+                'sha256': checksum,
+                'bytes': os.path.getsize(artifact),
+                'features_list': list(model_data['features_list']),
+                'custom_threshold': model_data.get('custom_threshold', 0.50),
+                'serving_models': ['forest', *model_data.get('serving_models', {})],
+                'training_report': report,
+                'sklearn_version': sklearn.__version__,
+                'notes': notes,
+            }
+            with open(os.path.join(staging, METADATA_NAME), 'w', encoding='utf-8') as f:
+                json.dump(metadata, f, indent=2, default=str)
+            os.chmod(staging, 0o755)
+            os.replace(staging, self.version_dir(version))
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return metadata
+
+    def metadata(self, version):
+        path = os.path.join(self.version_dir(version), METADATA_NAME)
+        if not os.path.exists(path):
+            raise ModelRegistryError(f"Unknown model version {version!r}.")
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def versions(self):
+        """Metadata of every published version, oldest first."""
+        if not os.path.isdir(self.versions_dir):
+            return []
+        names = sorted(name for name in os.listdir(self.versions_dir) if not name.startswith('.'))
+        return [self.metadata(name) for name in names]
+
+    def load(self, version):
+        """Returns (model_data, metadata) after verifying the artifact's checksum."""
+        metadata = self.metadata(version)
+        artifact = os.path.join(self.version_dir(version), ARTIFACT_NAME)
+        if file_checksum(artifact) != metadata['sha256']:
+            raise ModelRegistryError(f"Checksum mismatch for model version {version}; refusing to load it.")
+        return joblib.load(artifact), metadata
+
+    # --- pointers ---
+    def _read_pointer(self, name):
+        try:
+            with open(os.path.join(self.root, name), encoding='utf-8') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _write_pointer(self, name, version):
+        path = os.path.join(self.root, name)
+        if version is None:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        self.metadata(version)  # must exist
+        os.makedirs(self.root, exist_ok=True)
+        _atomic_write(path, version + '\n')
+
+    def active_version(self):
+        return self._read_pointer(ACTIVE_POINTER)
+
+    def shadow_version(self):
+        return self._read_pointer(SHADOW_POINTER)
+
+    def activate(self, version):
+        self._write_pointer(ACTIVE_POINTER, version)
+
+    def set_shadow(self, version):
+        """Starts shadow-scoring `version` next to the active model (None stops it)."""
+        self._write_pointer(SHADOW_POINTER, version)
+
+    def pointer_state(self):
+        """Cheap fingerprint of both pointer files; changes whenever either is replaced."""
+        state = []
+        for name in (ACTIVE_POINTER, SHADOW_POINTER):
+            try:
+                stat = os.stat(os.path.join(self.root, name))
+                state.append((stat.st_ino, stat.st_mtime_ns))
+            except FileNotFoundError:
+                state.append(None)
+        return tuple(state)
+
+
+# =============================================
+# SHADOW SCORING (off the request path)
+# =============================================
+class ShadowScorer:
+    """
+    Scores the batches the active model just scored with a candidate model on a
+    background thread and stores both scores as ShadowScore rows. submit() only
+    enqueues; a full queue drops the batch instead of slowing the request.
+    """
+
+    def __init__(self, model, features_list, version, active_version, start_thread=True):
+        self.model = model
+        self.features_list = features_list
+        self.version = version
+        self.active_version = active_version
+        self.queue = queue.Queue(maxsize=SHADOW_QUEUE_SIZE)
+        self.start_thread = start_thread
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, features_dicts, primary_scores, loan_ids=None):
+        try:
+            self.queue.put_nowait((list(features_dicts), list(primary_scores), loan_ids))
+        except queue.Full:
+            metrics_registry.incr('intellidebt_shadow_dropped_total', {'version': self.version})
+            return
+        if self.start_thread:
+            self._ensure_thread()
+
+    def _ensure_thread(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='shadow-scorer', daemon=True)
+                self.thread.start()
+
+    def stop(self):
+        """Lets the worker thread exit once it reaches the end of the queue (model swapped out)."""
+        if self.thread is not None:
+            try:
+                self.queue.put_nowait(None)
+            except queue.Full:
+                pass
+
+    def _run(self):
+        from django.db import close_old_connections
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            try:
+                self.score(*item)
+            except Exception as e:
+                print(f"Shadow scoring error ({self.version}): {e}")
+            finally:
+                close_old_connections()
+                self.queue.task_done()
+
+    def run_pending(self):
+        """Drains the queue in the calling thread (tests, management commands)."""
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None:
+                self.score(*item)
+            self.queue.task_done()
+
+    def score(self, features_dicts, primary_scores, loan_ids=None):
+        import pandas as pd
+        from .models import ShadowScore
+
+        df_input = pd.DataFrame(features_dicts)[self.features_list]
+        shadow_scores = self.model.predict_proba(df_input)[:, 1]
+        loan_ids = loan_ids or [None] * len(primary_scores)
+        ShadowScore.objects.bulk_create([
+            ShadowScore(
+                loan_id=loan_id, active_version=self.active_version, shadow_version=self.version,
+                primary_score=float(primary), shadow_score=float(shadow),
+            )
+            for loan_id, primary, shadow in zip(loan_ids, primary_scores, shadow_scores)
+        ])
+        metrics_registry.incr('intellidebt_shadow_scored_total', {'version': self.version}, len(shadow_scores))
+
+
+def shadow_summary(shadow_version, threshold=0.5):
+    """Agreement between the active and shadow models, aggregated in SQL over the stored ShadowScore rows."""
+    from django.db.models import Avg, Count, F, IntegerField, Max, Q, Sum, Case, When
+    from django.db.models.functions import Abs
+    from .models import ShadowScore
+
+    same_decision = (
+        Q(primary_score__gte=threshold, shadow_score__gte=threshold) |
+        Q(primary_score__lt=threshold, shadow_score__lt=threshold)
+    )
+    stats = ShadowScore.objects.filter(shadow_version=shadow_version).aggregate(
+        scored=Count('id'),
+        mean_abs_diff=Avg(Abs(F('primary_score') - F('shadow_score'))),
+        max_abs_diff=Max(Abs(F('primary_score') - F('shadow_score'))),
+        agreed=Sum(Case(When(same_decision, then=1), default=0, output_field=IntegerField())),
+        mean_primary=Avg('primary_score'),
+        mean_shadow=Avg('shadow_score'),
+    )
+    scored = stats.pop('scored')
+    agreed = stats.pop('agreed') or 0
+    summary = {'shadow_version': shadow_version, 'scored': scored}
+    if scored:
+        summary.update({key: round(value, 4) for key, value in stats.items()})
+        summary['decision_agreement'] = round(agreed / scored, 4)
+    return summary
@@ -1,7 +1,13 @@
+from django.conf import settings
 from django.db import models
+from django.db.models import Case, When, Value, Q
 from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 
+from .amortization import METHOD_CHOICES
+from .cohorts import BUCKET_CHOICES
+from .strategy import CHANNEL_CHOICES, STRATEGY_FIELDS, apply_to_loans
+
 class User(AbstractUser):
     pass
 
@@ -12,7 +18,7 @@ class Client(models.Model):
     age = models.IntegerField(default=30)
     gender = models.CharField(max_length=20, default="Unknown")
 
-    phone_number = models.CharField(max_length=20, null=True, blank=True)
+    phone_number = models.CharField(max_length=20, null=True, blank=True, db_index=True)
     address = models.TextField(null=True, blank=True)
     email = models.EmailField(null=True, blank=True)
     
@@ -24,6 +30,59 @@ class Client(models.Model):
     def __str__(self):
         return f"{self.name} ({self.client_id})"
 
+# --- RISK BANDS (thresholds live in settings.RISK_BAND_THRESHOLDS) ---
+
+RISK_BAND_CHOICES = [
+    ('pending', 'Pending'),
+    ('low', 'Low Risk'),
+    ('medium', 'Medium Risk'),
+    ('high', 'High Risk'),
+    ('closed', 'Closed'),
+]
+RISK_BAND_COLORS = {'pending': 'light', 'low': 'success', 'medium': 'warning', 'high': 'danger', 'closed': 'success'}
+
+
+def get_risk_band_thresholds():
+    thresholds = getattr(settings, 'RISK_BAND_THRESHOLDS', {})
+    return thresholds.get('medium', 40), thresholds.get('high', 70)
+
+
+def compute_risk_band(risk_percentage, status, outstanding_amount):
+    medium, high = get_risk_band_thresholds()
+    if status == 'Paid' or (outstanding_amount is not None and outstanding_amount <= 0):
+        return 'closed'
+    if risk_percentage is None:
+        return 'pending'
+    if risk_percentage >= high:
+        return 'high'
+    if risk_percentage >= medium:
+        return 'medium'
+    return 'low'
+
+
+def risk_band_expression():
+    """SQL twin of compute_risk_band(), used for bulk rebuilds."""
+    medium, high = get_risk_band_thresholds()
+    return Case(
+        When(Q(status='Paid') | Q(outstanding_amount__lte=0), then=Value('closed')),
+        When(risk_percentage__isnull=True, then=Value('pending')),
+        When(risk_percentage__gte=high, then=Value('high')),
+        When(risk_percentage__gte=medium, then=Value('medium')),
+        default=Value('low'),
+        output_field=models.CharField(),
+    )
+
+
+class LoanQuerySet(models.QuerySet):
+    def rebuild_risk_bands(self):
+        """Re-bands every loan in one UPDATE (run after changing RISK_BAND_THRESHOLDS)."""
+        return self.update(risk_band=risk_band_expression())
+
+    def stale_for(self, model_version):
+        """Loans whose stored score was not produced by `model_version` (including never-scored ones)."""
+        return self.exclude(model_version=model_version)
+
+
 class Loan(models.Model):
     # Loan Details (Matches ML CSV)
     loan_id = models.CharField(max_length=50, unique=True, help_text="e.g., LN_1001")
@@ -38,9 +97,15 @@ class Loan(models.Model):
     # Repayment Status
     outstanding_amount = models.DecimalField(max_digits=15, decimal_places=2)
     monthly_emi = models.DecimalField(max_digits=15, decimal_places=2)
+    amortization_method = models.CharField(max_length=10, choices=METHOD_CHOICES, default='flat')
+    # terms_hash() of the terms behind the stored Installment rows (see core.amortization)
+    schedule_hash = models.CharField(max_length=16, blank=True, default='')
     payment_history = models.CharField(max_length=50, default="On-Time")
     missed_payments = models.IntegerField(default=0)
     days_past_due = models.IntegerField(default=0)
+    # Arrears a loan was imported with on created_at; nightly aging (core.aging) rolls them forward
+    opening_missed_payments = models.IntegerField(default=0)
+    opening_days_past_due = models.IntegerField(default=0)
     
     # System Status
     status = models.CharField(max_length=50, default="Active") # Needed for your views
@@ -50,10 +115,52 @@ class Loan(models.Model):
     predicted_default_risk = models.FloatField(default=0.0)
     risk_percentage = models.FloatField(null=True, blank=True)
     risk_explanation = models.TextField(blank=True, null=True)
+    risk_band = models.CharField(max_length=10, choices=RISK_BAND_CHOICES, default='pending', db_index=True)
+    # Provenance of the current score (see core.scoring); history lives in RiskScore
+    model_version = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    feature_hash = models.CharField(max_length=16, blank=True, default='')
+    scored_at = models.DateTimeField(null=True, blank=True)
+    # Recovery strategy (see core.strategy; bulk refresh: `manage.py assign_strategies`)
+    recovery_channel = models.CharField(max_length=20, choices=CHANNEL_CHOICES, default='reminders')
+    settlement_discount = models.IntegerField(default=0)
+    settlement_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    collection_priority = models.FloatField(default=0.0)
+
+    objects = LoanQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['recovery_channel', '-collection_priority'], name='loan_worklist_idx')]
 
     def __str__(self):
         return f"{self.loan_id} - {self.client.name}"
 
+    def refresh_risk_band(self):
+        self.risk_band = compute_risk_band(self.risk_percentage, self.status, self.outstanding_amount)
+        return self.risk_band
+
+    def save(self, *args, **kwargs):
+        # Keep the stored band and recovery strategy in step with every score/status write
+        self.refresh_risk_band()
+        apply_to_loans([self])
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            derived = ['risk_band', *STRATEGY_FIELDS]
+            kwargs['update_fields'] = list(update_fields) + [f for f in derived if f not in update_fields]
+        super().save(*args, **kwargs)
+
+    @property
+    def strategy(self):
+        from .strategy import CHANNELS
+        return CHANNELS.get(self.recovery_channel, CHANNELS['reminders'])
+
+    @property
+    def risk_badge_color(self):
+        return RISK_BAND_COLORS.get(self.risk_band, 'light')
+
+    @property
+    def risk_label(self):
+        return self.get_risk_band_display()
+
 # --- TRANSACTIONAL TABLES (Required for your views to work) ---
 
 class Payment(models.Model):
@@ -65,6 +172,87 @@ class Payment(models.Model):
     def __str__(self):
         return f"Payment of {self.amount_paid} for {self.loan.loan_id}"
 
+class Installment(models.Model):
+    """One row of a loan's repayment schedule, generated by core.amortization.sync_schedules()."""
+    loan = models.ForeignKey(Loan, on_delete=models.CASCADE, related_name='installments')
+    number = models.PositiveSmallIntegerField()
+    due_date = models.DateField(db_index=True)
+    amount = models.DecimalField(max_digits=15, decimal_places=2)
+    principal = models.DecimalField(max_digits=15, decimal_places=2)
+    interest = models.DecimalField(max_digits=15, decimal_places=2)
+    balance = models.DecimalField(max_digits=15, decimal_places=2, help_text="Principal left after this instalment")
+
+    class Meta:
+        ordering = ['loan', 'number']
+        constraints = [models.UniqueConstraint(fields=['loan', 'number'], name='installment_loan_number_uniq')]
+
+    def __str__(self):
+        return f"{self.loan_id} #{self.number} due {self.due_date}"
+
+class LoanSnapshot(models.Model):
+    """A loan's DPD bucket and balance on one day, written in bulk by `manage.py snapshot_loans` (see core.cohorts)."""
+    snapshot_date = models.DateField()
+    loan = models.ForeignKey(Loan, on_delete=models.CASCADE, related_name='snapshots')
+    bucket = models.CharField(max_length=10, choices=BUCKET_CHOICES)
+    days_past_due = models.IntegerField(default=0)
+    outstanding = models.DecimalField(max_digits=15, decimal_places=2)
+    vintage = models.DateField(null=True, blank=True, help_text="First day of the loan's origination month")
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['snapshot_date', 'loan'], name='loansnapshot_date_loan_uniq')]
+        indexes = [models.Index(fields=['snapshot_date', 'vintage'], name='loansnapshot_vintage_idx')]
+
+    def __str__(self):
+        return f"{self.loan_id} on {self.snapshot_date}: {self.bucket}"
+
+class PortfolioKPIs(models.Model):
+    """The dashboard's headline figures (see core.portfolio.KPI_FIELDS)."""
+    total_loans = models.IntegerField(default=0)
+    active_loans = models.IntegerField(default=0)
+    defaulted_loans = models.IntegerField(default=0)
+    paid_loans = models.IntegerField(default=0)
+    overdue_loans = models.IntegerField(default=0, help_text="Active loans with days past due")
+    total_disbursed = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    total_outstanding = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        abstract = True
+
+class PortfolioSnapshot(PortfolioKPIs):
+    """Portfolio KPIs at one point in time, written by `manage.py snapshot_portfolio`."""
+    taken_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        get_latest_by = 'taken_at'
+
+    def __str__(self):
+        return f"Portfolio on {self.taken_at:%Y-%m-%d %H:%M}: {self.total_loans} loans"
+
+class PortfolioTotals(PortfolioKPIs):
+    """Single live row of portfolio KPIs, incremented as loans are written (core.portfolio.record_change)."""
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Live portfolio totals: {self.total_loans} loans"
+
+class CashFlowForecast(models.Model):
+    """Projected collections for one model version, config and day, written by `manage.py forecast_collections`."""
+    model_version = models.CharField(max_length=64)
+    config_hash = models.CharField(max_length=16)
+    as_of = models.DateField()
+    computed_at = models.DateTimeField(default=timezone.now)
+    loans = models.IntegerField(default=0)
+    result = models.JSONField(help_text="core.forecast.forecast_book() output: months, totals and bands")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model_version', 'config_hash', 'as_of'], name='cashflowforecast_key_uniq'),
+        ]
+        get_latest_by = 'as_of'
+
+    def __str__(self):
+        return f"Forecast {self.model_version or 'bundled'} on {self.as_of}: {self.loans} loans"
+
 class Reminder(models.Model):
     loan = models.ForeignKey(Loan, on_delete=models.CASCADE, related_name='reminders')
     message = models.TextField()
@@ -82,4 +270,37 @@ class CollectionLog(models.Model):
     notes = models.TextField(blank=True, null=True)
 
     def __str__(self):
-        return f"Attempt on {self.loan.loan_id} via {self.method}"
\ No newline at end of file
+        return f"Attempt on {self.loan.loan_id} via {self.method}"
+
+class ShadowScore(models.Model):
+    """A candidate (shadow) model's score next to the active model's score for the same request."""
+    loan = models.ForeignKey(Loan, on_delete=models.CASCADE, null=True, blank=True, related_name='shadow_scores')
+    active_version = models.CharField(max_length=64)
+    shadow_version = models.CharField(max_length=64, db_index=True)
+    primary_score = models.FloatField()
+    shadow_score = models.FloatField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.shadow_version} vs {self.active_version}: {self.shadow_score:.3f} / {self.primary_score:.3f}"
+
+
+class RiskScore(models.Model):
+    """Append-only history of model scores: which model scored which inputs, and when."""
+    loan = models.ForeignKey(Loan, on_delete=models.CASCADE, related_name='risk_scores')
+    model_version = models.CharField(max_length=64, db_index=True)
+    feature_hash = models.CharField(max_length=16)
+    probability = models.FloatField()
+    source = models.CharField(max_length=30, blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['loan', '-created_at'], name='riskscore_loan_recent_idx')]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("RiskScore rows are append-only; write a new row instead.")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.loan_id} @ {self.model_version}: {self.probability:.3f}"
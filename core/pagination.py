@@ -0,0 +1,127 @@
+import base64
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+
+# How long a filtered COUNT(*) is reused before it is recomputed.
+COUNT_CACHE_TIMEOUT = 300
+
+# Largest id a cursor may carry (signed 64-bit, the widest primary key column)
+MAX_CURSOR_ID = 2 ** 63 - 1
+
+
+def encode_cursor(pk, direction):
+    """Opaque token: base64url JSON, e.g. {"id": 512, "d": "n"}."""
+    raw = json.dumps({'id': pk, 'd': direction}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Returns (pk, direction) or (None, None) for a missing/tampered token."""
+    if not token:
+        return None, None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        pk = data['id']
+        direction = data['d'] if data['d'] in ('n', 'p') else None
+    except (ValueError, KeyError, TypeError, OverflowError):
+        return None, None
+    # Only ids a BIGINT primary key can hold (rejects floats, Infinity, bools, huge ints)
+    if type(pk) is not int or not 0 < pk <= MAX_CURSOR_ID:
+        return None, None
+    return pk, direction
+
+
+def approximate_count(queryset):
+    """
+    Row estimate without a fresh COUNT(*): PostgreSQL table statistics for an
+    unfiltered table, otherwise a COUNT(*) cached per query for COUNT_CACHE_TIMEOUT.
+    """
+    table = queryset.model._meta.db_table
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+            row = cursor.fetchone()
+        # reltuples is -1 until the table has been analyzed
+        if row and row[0] >= 0:
+            return row[0]
+
+    key = 'approx_count:' + hashlib.md5(str(queryset.query).encode()).hexdigest()
+    total = cache.get(key)
+    if total is None:
+        total = queryset.count()
+        cache.set(key, total, COUNT_CACHE_TIMEOUT)
+    return total
+
+
+class CursorPage:
+    """One page of keyset results; iterates like a Paginator page."""
+    is_cursor = True
+
+    def __init__(self, object_list, next_cursor, previous_cursor, approximate_total):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.approximate_total = approximate_total
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Keyset pagination on (-id). Each page is an indexed range scan
+    (`id < last_seen ORDER BY id DESC LIMIT n`), so deep pages cost the same
+    as the first one and no COUNT(*) is issued per request.
+    Any existing ordering on the queryset (e.g. search rank) is replaced by -id.
+    """
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset.order_by()
+        self.per_page = int(per_page)
+
+    def get_page(self, cursor=None):
+        pk, direction = decode_cursor(cursor)
+
+        if pk is not None and direction == 'p':
+            # Walk backwards from the first row of the current page, then flip
+            rows = list(self.queryset.filter(id__gt=pk).order_by('id')[:self.per_page + 1])
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next, has_previous = True, has_more
+        else:
+            qs = self.queryset.filter(id__lt=pk) if pk is not None else self.queryset
+            rows = list(qs.order_by('-id')[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = pk is not None
+
+        next_cursor = encode_cursor(rows[-1].id, 'n') if rows and has_next else None
+        previous_cursor = encode_cursor(rows[0].id, 'p') if rows and has_previous else None
+        return CursorPage(rows, next_cursor, previous_cursor, approximate_count(self.queryset))
+
+
+def paginate(request, queryset, per_page):
+    """
+    Returns a Paginator page, or a CursorPage when the user opted into cursor
+    mode (Settings page) or the URL already carries a cursor token.
+    """
+    if request.session.get('ui_pagination') == 'cursor' or 'cursor' in request.GET:
+        return CursorPaginator(queryset, per_page).get_page(request.GET.get('cursor'))
+    return Paginator(queryset, per_page).get_page(request.GET.get('page'))
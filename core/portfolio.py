@@ -0,0 +1,140 @@
+from decimal import Decimal
+
+import numpy as np
+
+# Headline figures kept live in PortfolioTotals and recorded in PortfolioSnapshot
+COUNT_FIELDS = ['total_loans', 'active_loans', 'defaulted_loans', 'paid_loans', 'overdue_loans']
+AMOUNT_FIELDS = ['total_disbursed', 'total_outstanding']
+KPI_FIELDS = COUNT_FIELDS + AMOUNT_FIELDS
+
+# Loan status -> the counter it feeds
+STATUS_FIELDS = {'Active': 'active_loans', 'Defaulted': 'defaulted_loans', 'Paid': 'paid_loans'}
+
+# PortfolioTotals is a single row
+TOTALS_ID = 1
+
+# Snapshots drawn in each dashboard sparkline
+SPARKLINE_POINTS = 30
+
+
+def compute_kpis(queryset=None):
+    """Every KPI from scratch in one conditional-aggregate query (the scheduled job and first-run bootstrap)."""
+    from django.db.models import Count, Q, Sum
+    from .models import Loan
+
+    queryset = Loan.objects.all() if queryset is None else queryset
+    kpis = queryset.aggregate(
+        total_loans=Count('id'),
+        **{field: Count('id', filter=Q(status=status)) for status, field in STATUS_FIELDS.items()},
+        overdue_loans=Count('id', filter=Q(status='Active', days_past_due__gt=0)),
+        total_disbursed=Sum('amount'),
+        total_outstanding=Sum('outstanding_amount'),
+    )
+    return {field: kpis[field] or (Decimal('0.00') if field in AMOUNT_FIELDS else 0) for field in KPI_FIELDS}
+
+
+def status_counts(status, days_past_due):
+    """The count KPIs for arrays of loan statuses and DPD (what a batch of loans adds to the book)."""
+    status = np.asarray(status)
+    dpd = np.asarray(days_past_due)
+    counts = {'total_loans': int(status.size), 'overdue_loans': int(((status == 'Active') & (dpd > 0)).sum())}
+    counts.update({field: int((status == value).sum()) for value, field in STATUS_FIELDS.items()})
+    return counts
+
+
+def loan_kpis(loans):
+    """What these Loan instances contribute to every KPI, computed in Python (no query)."""
+    return {
+        **status_counts([loan.status for loan in loans], [loan.days_past_due for loan in loans]),
+        'total_disbursed': sum((Decimal(str(loan.amount)) for loan in loans), Decimal('0.00')),
+        'total_outstanding': sum((Decimal(str(loan.outstanding_amount)) for loan in loans), Decimal('0.00')),
+    }
+
+
+def record_change(before=None, after=None):
+    """
+    Applies the difference between two KPI contributions to the live totals as
+    one UPDATE of F() increments, so concurrent writers (and gunicorn workers)
+    never overwrite each other. Before the first bootstrap there is no row to
+    update; live_kpis() then computes totals that already include this write.
+    """
+    from django.db.models import F
+    from django.utils import timezone
+    from .models import PortfolioTotals
+
+    before, after = before or {}, after or {}
+    delta = {field: after.get(field, 0) - before.get(field, 0) for field in KPI_FIELDS}
+    delta = {field: value for field, value in delta.items() if value}
+    if delta:
+        PortfolioTotals.objects.filter(pk=TOTALS_ID).update(
+            updated_at=timezone.now(), **{field: F(field) + value for field, value in delta.items()},
+        )
+
+
+def rebase_totals(kpis=None):
+    """Overwrites the live totals with `kpis` (default: compute_kpis()), discarding any drift."""
+    from django.utils import timezone
+    from .models import PortfolioTotals
+
+    kpis = compute_kpis() if kpis is None else kpis
+    if not PortfolioTotals.objects.filter(pk=TOTALS_ID).update(updated_at=timezone.now(), **kpis):
+        PortfolioTotals.objects.bulk_create([PortfolioTotals(pk=TOTALS_ID, **kpis)], ignore_conflicts=True)
+    return kpis
+
+
+def live_kpis():
+    """The live totals: one primary-key read, bootstrapped from compute_kpis() the first time."""
+    from .models import PortfolioTotals
+
+    kpis = PortfolioTotals.objects.filter(pk=TOTALS_ID).values(*KPI_FIELDS).first()
+    if kpis is None:
+        # A concurrent bootstrap may win the insert; both computed the same totals
+        kpis = compute_kpis()
+        PortfolioTotals.objects.bulk_create([PortfolioTotals(pk=TOTALS_ID, **kpis)], ignore_conflicts=True)
+    return kpis
+
+
+def take_portfolio_snapshot():
+    """
+    Records the current KPIs as a PortfolioSnapshot and re-bases the live totals
+    on them, correcting drift from writes that bypass record_change() (admin
+    edits, shell scripts). The totals row is locked meanwhile so increments
+    wait rather than get lost. Returns (snapshot, drift from the live totals).
+    """
+    from django.db import transaction
+    from .models import PortfolioSnapshot, PortfolioTotals
+
+    with transaction.atomic():
+        live = PortfolioTotals.objects.select_for_update().filter(pk=TOTALS_ID).values(*KPI_FIELDS).first()
+        kpis = compute_kpis()
+        snapshot = PortfolioSnapshot.objects.create(**kpis)
+        rebase_totals(kpis)
+    drift = {field: kpis[field] - live[field] for field in KPI_FIELDS if live and kpis[field] != live[field]}
+    return snapshot, drift
+
+
+def kpi_history(points=SPARKLINE_POINTS):
+    """The KPI values of the last `points` snapshots, oldest first. One query."""
+    from .models import PortfolioSnapshot
+
+    return list(PortfolioSnapshot.objects.order_by('-taken_at').values(*KPI_FIELDS)[:points])[::-1]
+
+
+def kpi_trends(kpis, points=SPARKLINE_POINTS, history=None):
+    """
+    Per KPI: the last `points` snapshot values followed by the live value (the
+    sparkline) and the percentage change since the first of them (None without
+    history or from zero). 'active_defaults' is defaulted plus overdue active
+    loans, the dashboard's Overdue figure. One query, none when `history`
+    (from kpi_history) is passed in.
+    """
+    history = kpi_history(points) if history is None else history
+    for row in [*history, kpis]:
+        row['active_defaults'] = row['defaulted_loans'] + row['overdue_loans']
+    trends = {}
+    for field in [*KPI_FIELDS, 'active_defaults']:
+        values = [float(row[field]) for row in history] + [float(kpis[field])]
+        first = values[0]
+        change = round(100.0 * (values[-1] - first) / first, 1) if history and first else None
+        trends[field] = {'values': values, 'change': change}
+    return trends
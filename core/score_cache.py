@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict
+
+from .metrics import registry as metrics_registry
+
+# Prefix for entries in the shared Django cache (keys are '<prefix><model version>:<feature hash>')
+SHARED_KEY_PREFIX = 'mlscore:'
+
+
+class ScoreCache:
+    """
+    Bounded LRU of default probabilities keyed by '<model version>:<feature hash>',
+    each entry living at most `ttl` seconds. An optional shared Django cache
+    (e.g. file-based or Redis) sits behind it so every gunicorn worker reuses
+    the others' scores. Keys carry the model version, so a reload can never
+    serve a previous model's score; the local LRU is also cleared on reload.
+    """
+
+    def __init__(self, max_entries, ttl=None, shared=None):
+        self.max_entries = max_entries
+        self.ttl = ttl or None
+        self.shared = shared
+        self.entries = OrderedDict()  # key -> (expires_at or None, score)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get_many(self, keys):
+        """Returns {key: score} for every key found locally or in the shared cache."""
+        found = {}
+        now = time.monotonic()
+        with self.lock:
+            for key in keys:
+                entry = self.entries.get(key)
+                if entry is None:
+                    continue
+                if entry[0] is not None and entry[0] <= now:
+                    del self.entries[key]
+                    continue
+                self.entries.move_to_end(key)
+                found[key] = entry[1]
+        local_hits = len(found)
+
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if self.shared is not None and missing:
+            try:
+                shared = self.shared.get_many([SHARED_KEY_PREFIX + key for key in missing])
+            except Exception as e:
+                # A shared-cache outage only costs recomputation
+                print(f"Score cache backend error: {e}")
+                metrics_registry.incr('intellidebt_score_cache_errors_total')
+                shared = {}
+            hits = {key[len(SHARED_KEY_PREFIX):]: score for key, score in shared.items()}
+            self._store(hits)
+            found.update(hits)
+
+        if local_hits:
+            metrics_registry.incr('intellidebt_score_cache_hits_total', {'tier': 'local'}, local_hits)
+        if len(found) > local_hits:
+            metrics_registry.incr('intellidebt_score_cache_hits_total', {'tier': 'shared'}, len(found) - local_hits)
+        misses = len(set(keys)) - len(found)
+        if misses:
+            metrics_registry.incr('intellidebt_score_cache_misses_total', amount=misses)
+        return found
+
+    def set_many(self, scores):
+        self._store(scores)
+        if self.shared is not None and scores:
+            try:
+                self.shared.set_many({SHARED_KEY_PREFIX + key: score for key, score in scores.items()}, timeout=self.ttl)
+            except Exception as e:
+                print(f"Score cache backend error: {e}")
+                metrics_registry.incr('intellidebt_score_cache_errors_total')
+
+    def _store(self, scores):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        evicted = 0
+        with self.lock:
+            for key, score in scores.items():
+                self.entries[key] = (expires_at, float(score))
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            metrics_registry.incr('intellidebt_score_cache_evictions_total', amount=evicted)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def build_score_cache(settings):
+    """ScoreCache from ML_SCORE_CACHE_* settings, or None when ML_SCORE_CACHE_SIZE is 0."""
+    max_entries = getattr(settings, 'ML_SCORE_CACHE_SIZE', 0)
+    if not max_entries:
+        return None
+    shared = None
+    alias = getattr(settings, 'ML_SCORE_CACHE_BACKEND', '')
+    if alias:
+        from django.core.cache import caches
+        shared = caches[alias]
+    return ScoreCache(max_entries, getattr(settings, 'ML_SCORE_CACHE_TTL', None), shared)
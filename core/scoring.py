@@ -0,0 +1,61 @@
+import hashlib
+
+import numpy as np
+from django.utils import timezone
+
+# Feature values are rounded before hashing so Decimal -> float noise does not
+# make an unchanged loan look like it has new inputs.
+FEATURE_HASH_DECIMALS = 4
+
+
+def quantize_features(features_dicts, features_list):
+    """Rows x features float64 matrix in model column order, rounded to FEATURE_HASH_DECIMALS."""
+    X = np.array(
+        [[float(row.get(col, 0) or 0) for col in features_list] for row in features_dicts],
+        dtype=np.float64,
+    ).reshape(len(features_dicts), len(features_list))
+    return quantize_matrix(X)
+
+
+def quantize_matrix(X):
+    # + 0.0 folds -0.0 into 0.0, which would otherwise hash differently
+    return np.round(np.asarray(X, dtype=np.float64), FEATURE_HASH_DECIMALS) + 0.0
+
+
+def hash_rows(X):
+    """16-hex-char blake2b digest of each row of a feature matrix (quantized first)."""
+    X = np.ascontiguousarray(quantize_matrix(X))
+    return [hashlib.blake2b(row.tobytes(), digest_size=8).hexdigest() for row in X]
+
+
+def feature_hashes(features_dicts, features_list):
+    return hash_rows(quantize_features(features_dicts, features_list))
+
+
+def feature_hash(features_dict, features_list):
+    return feature_hashes([features_dict], features_list)[0]
+
+
+def stamp_scores(loans, features_dicts, probabilities, model_version, features_list, source=''):
+    """
+    Records which model and inputs produced each loan's score (model_version,
+    feature_hash, scored_at) and returns unsaved RiskScore rows for the loans
+    whose (model, inputs) pair changed. The caller saves the loans first, then
+    bulk_creates the returned rows, so re-viewing an unchanged loan adds no history.
+    """
+    from .models import RiskScore
+
+    now = timezone.now()
+    history = []
+    hashes = feature_hashes(features_dicts, features_list)
+    for loan, digest, probability in zip(loans, hashes, probabilities):
+        changed = (loan.model_version, loan.feature_hash) != (model_version, digest)
+        loan.model_version = model_version
+        loan.feature_hash = digest
+        loan.scored_at = now
+        if changed:
+            history.append(RiskScore(
+                loan=loan, model_version=model_version, feature_hash=digest,
+                probability=float(probability), source=source, created_at=now,
+            ))
+    return history
@@ -0,0 +1,236 @@
+import re
+
+from django.db import connection, DatabaseError
+from django.db.models import Case, When, Value, IntegerField, Q
+
+# Cap on how many ranked client matches a text search pulls back from the index.
+SEARCH_MAX_RESULTS = 500
+
+# Suggestions returned per keystroke by the client autocomplete endpoint.
+AUTOCOMPLETE_LIMIT = 20
+
+LOAN_PK_PATTERN = re.compile(r'^#?(\d{1,18})$')
+PHONE_PREFIX_PATTERN = re.compile(r'^\+?\d[\d\s-]{3,}$')
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+# =============================================
+# INDEX DDL
+# =============================================
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS core_client_search USING fts5("
+    "client_id, name, email, employment_type, "
+    "content='core_client', content_rowid='id', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS core_client_search_ai AFTER INSERT ON core_client BEGIN "
+    "INSERT INTO core_client_search(rowid, client_id, name, email, employment_type) "
+    "VALUES (new.id, new.client_id, new.name, new.email, new.employment_type); END",
+    "CREATE TRIGGER IF NOT EXISTS core_client_search_ad AFTER DELETE ON core_client BEGIN "
+    "INSERT INTO core_client_search(core_client_search, rowid, client_id, name, email, employment_type) "
+    "VALUES ('delete', old.id, old.client_id, old.name, old.email, old.employment_type); END",
+    "CREATE TRIGGER IF NOT EXISTS core_client_search_au AFTER UPDATE ON core_client BEGIN "
+    "INSERT INTO core_client_search(core_client_search, rowid, client_id, name, email, employment_type) "
+    "VALUES ('delete', old.id, old.client_id, old.name, old.email, old.employment_type); "
+    "INSERT INTO core_client_search(rowid, client_id, name, email, employment_type) "
+    "VALUES (new.id, new.client_id, new.name, new.email, new.employment_type); END",
+    "INSERT INTO core_client_search(core_client_search) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS core_client_search_ai",
+    "DROP TRIGGER IF EXISTS core_client_search_ad",
+    "DROP TRIGGER IF EXISTS core_client_search_au",
+    "DROP TABLE IF EXISTS core_client_search",
+]
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "ALTER TABLE core_client ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', coalesce(client_id, '') || ' ' || coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(email, '') || ' ' || coalesce(employment_type, '')), 'B')"
+    ") STORED",
+    "CREATE INDEX IF NOT EXISTS core_client_search_vector_idx ON core_client USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS core_client_name_trgm_idx ON core_client USING gin (name gin_trgm_ops)",
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS core_client_name_trgm_idx",
+    "DROP INDEX IF EXISTS core_client_search_vector_idx",
+    "ALTER TABLE core_client DROP COLUMN IF EXISTS search_vector",
+]
+
+# Installed by migration 0006. SQLite drops triggers whenever Django rebuilds
+# core_client for an ALTER, so migrations that alter Client re-run install_search_index().
+SEARCH_INDEX_SQL = {'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}
+SEARCH_INDEX_DROP_SQL = {'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRES_REVERSE}
+
+
+def install_search_index(schema_editor):
+    """(Re)creates the client search index for the schema editor's database vendor."""
+    for statement in SEARCH_INDEX_SQL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+# =============================================
+# INDEX BACKENDS (return ranked Client ids)
+# =============================================
+class LikeSearchBackend:
+    """Portable fallback: unindexed icontains scan, ranked by newest client."""
+    vendor = None
+
+    def client_ids(self, query, limit=SEARCH_MAX_RESULTS):
+        from .models import Client
+        return list(
+            Client.objects.filter(
+                Q(name__icontains=query) |
+                Q(client_id__icontains=query) |
+                Q(email__icontains=query) |
+                Q(employment_type__icontains=query)
+            ).order_by('-id').values_list('id', flat=True)[:limit]
+        )
+
+
+class SQLiteSearchBackend(LikeSearchBackend):
+    """FTS5 index `core_client_search`, kept in sync by triggers (migration 0006)."""
+    vendor = 'sqlite'
+
+    def client_ids(self, query, limit=SEARCH_MAX_RESULTS):
+        tokens = TOKEN_PATTERN.findall(query)
+        if not tokens:
+            return []
+        # Every token must match; each is treated as a prefix ("moi" -> "moi*")
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT rowid FROM core_client_search WHERE core_client_search MATCH %s "
+                    "ORDER BY rank LIMIT %s",
+                    [match, limit],
+                )
+                return [row[0] for row in cursor.fetchall()]
+        except DatabaseError:
+            # FTS5 unavailable in this SQLite build -> plain scan
+            return super().client_ids(query, limit)
+
+
+class PostgresSearchBackend(LikeSearchBackend):
+    """Stored tsvector + pg_trgm similarity on name (migration 0006)."""
+    vendor = 'postgresql'
+
+    def client_ids(self, query, limit=SEARCH_MAX_RESULTS):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT id FROM core_client "
+                "WHERE search_vector @@ websearch_to_tsquery('simple', %s) OR name %% %s "
+                "ORDER BY ts_rank(search_vector, websearch_to_tsquery('simple', %s)) "
+                "+ similarity(name, %s) DESC, id DESC LIMIT %s",
+                [query, query, query, query, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+SEARCH_BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend():
+    """Picks the index backend matching the active database vendor."""
+    return SEARCH_BACKENDS.get(connection.vendor, LikeSearchBackend)()
+
+
+# =============================================
+# PUBLIC HELPERS USED BY THE VIEWS
+# =============================================
+def _order_by_rank(queryset, field, ranked_ids):
+    """Filters to `ranked_ids` and keeps the backend's ranking order."""
+    if not ranked_ids:
+        return queryset.none()
+    ranking = Case(
+        *[When(**{field: pk}, then=Value(pos)) for pos, pk in enumerate(ranked_ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(**{f'{field}__in': ranked_ids}).annotate(search_rank=ranking).order_by('search_rank', '-id')
+
+
+def _phone_prefix(query):
+    if PHONE_PREFIX_PATTERN.match(query):
+        return re.sub(r'[\s-]', '', query)
+    return None
+
+
+def search_clients(queryset, query):
+    """Ranked client search. Exact client_id and phone prefixes hit their B-tree indexes directly."""
+    query = query.strip()
+    if not query:
+        return queryset
+
+    # 1. Exact borrower ID (unique index)
+    if queryset.filter(client_id=query).exists():
+        return queryset.filter(client_id=query)
+
+    # 2. Phone number prefix (indexed startswith)
+    phone = _phone_prefix(query)
+    if phone:
+        return queryset.filter(phone_number__startswith=phone).order_by('-id')
+
+    # 3. Full-text / trigram index
+    return _order_by_rank(queryset, 'id', get_search_backend().client_ids(query))
+
+
+def search_loans(queryset, query):
+    """Ranked loan search by loan number, loan ID, phone prefix or client text."""
+    query = query.strip()
+    if not query:
+        return queryset
+
+    # 1. Loan number ("123" / "#123") or phone prefix - both indexed equality/prefix lookups
+    pk_match = LOAN_PK_PATTERN.match(query)
+    phone = _phone_prefix(query)
+    if pk_match or phone:
+        from .models import Client
+        condition = Q()
+        if pk_match:
+            condition |= Q(id=int(pk_match.group(1)))
+        if phone:
+            phone_clients = Client.objects.filter(phone_number__startswith=phone).values('id')[:SEARCH_MAX_RESULTS]
+            condition |= Q(client_id__in=phone_clients)
+        return queryset.filter(condition).order_by('-id')
+
+    # 2. Exact loan / borrower IDs (unique indexes)
+    exact = queryset.filter(Q(loan_id=query) | Q(client__client_id=query))
+    if exact.exists():
+        return exact.order_by('-id')
+
+    # 3. Full-text / trigram index on the client
+    return _order_by_rank(queryset, 'client_id', get_search_backend().client_ids(query))
+
+
+def autocomplete_clients(query, limit=AUTOCOMPLETE_LIMIT):
+    """
+    Top `limit` clients for a partial client ID, name or phone number, as
+    (id, client_id, name) rows. Only ever touches indexes: exact client_id,
+    phone prefix, then the full-text / trigram backend asked for `limit` ids.
+    An empty query returns the newest clients.
+    """
+    from .models import Client
+
+    columns = ('id', 'client_id', 'name')
+    query = query.strip()
+    if not query:
+        return list(Client.objects.order_by('-id').values_list(*columns)[:limit])
+
+    exact = list(Client.objects.filter(client_id=query).values_list(*columns))
+    if exact:
+        return exact
+
+    phone = _phone_prefix(query)
+    if phone:
+        return list(Client.objects.filter(phone_number__startswith=phone).order_by('-id').values_list(*columns)[:limit])
+
+    ranked_ids = get_search_backend().client_ids(query, limit)
+    if not ranked_ids:
+        return []
+    rows = {row[0]: row for row in Client.objects.filter(id__in=ranked_ids).values_list(*columns)}
+    return [rows[pk] for pk in ranked_ids if pk in rows]
@@ -0,0 +1,153 @@
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+
+# Channel key -> what the UI shows, most severe first (also the order of CHANNEL_CHOICES)
+CHANNELS = {
+    'legal': {
+        'method': 'Immediate Legal Action',
+        'icon': 'bi-hammer',
+        'color': 'danger',
+        'action': 'Immediate legal notices & aggressive recovery attempts',
+    },
+    'settlement': {
+        'method': 'Settlement Offers',
+        'icon': 'bi-hand-thumbs-up-fill',
+        'color': 'warning',
+        'action': 'Settlement offers & repayment plans',
+    },
+    'reminders': {
+        'method': 'Automated Reminders',
+        'icon': 'bi-chat-dots-fill',
+        'color': 'success',
+        'action': 'Automated reminders & monitoring',
+    },
+    'closed': {
+        'method': 'Loan Closed',
+        'icon': 'bi-check-circle-fill',
+        'color': 'success',
+        'action': 'No further action required. Good job!',
+    },
+}
+CHANNEL_CHOICES = [(key, channel['method']) for key, channel in CHANNELS.items()]
+
+DEFAULT_STRATEGY = {
+    'legal_risk': 0.75,
+    'settlement_risk': 0.50,
+    'legal_dpd': 90,
+    'legal_discount': 30,
+    'settlement_discount': 15,
+}
+
+# Loan columns written by apply_to_loans() / assign_book()
+STRATEGY_FIELDS = ['recovery_channel', 'settlement_discount', 'settlement_amount', 'collection_priority']
+
+# Loans assigned and written back per round trip by assign_book()
+STRATEGY_CHUNK_SIZE = 5000
+
+
+def get_strategy_config():
+    return {**DEFAULT_STRATEGY, **getattr(settings, 'RECOVERY_STRATEGY', {})}
+
+
+def assign(risk, days_past_due, outstanding, closed=None, config=None):
+    """
+    Channel, settlement discount/amount and worklist priority for arrays of loans.
+
+    risk is the default probability (0-1), closed an optional boolean array for
+    loans already marked Paid. Returns a dict of arrays of the same length:
+    channel (str), discount_percent (int), settlement_amount and priority
+    (expected loss = risk x outstanding; 0 for closed loans).
+    """
+    config = config or get_strategy_config()
+    risk = np.asarray(risk, dtype=np.float64)
+    dpd = np.asarray(days_past_due, dtype=np.float64)
+    outstanding = np.asarray(outstanding, dtype=np.float64)
+    is_closed = outstanding <= 0
+    if closed is not None:
+        is_closed |= np.asarray(closed, dtype=bool)
+
+    conditions = [
+        is_closed,
+        (risk > config['legal_risk']) | (dpd > config['legal_dpd']),
+        risk >= config['settlement_risk'],
+    ]
+    channel = np.select(conditions, ['closed', 'legal', 'settlement'], default='reminders')
+    discount = np.select(
+        conditions, [0, config['legal_discount'], config['settlement_discount']], default=0,
+    ).astype(int)
+    return {
+        'channel': channel,
+        'discount_percent': discount,
+        'settlement_amount': np.where(discount > 0, np.round(outstanding * (100 - discount) / 100, 2), 0.0),
+        'priority': np.where(is_closed, 0.0, np.round(risk * outstanding, 2)),
+    }
+
+
+def loan_risk(loan):
+    """Default probability for a stored loan: risk_percentage when scored, else predicted_default_risk."""
+    if loan.risk_percentage is not None:
+        return loan.risk_percentage / 100.0
+    return loan.predicted_default_risk or 0.0
+
+
+def apply_to_loans(loans):
+    """Sets the strategy fields on Loan instances in one vectorised pass (no save)."""
+    if not loans:
+        return
+    result = assign(
+        [loan_risk(loan) for loan in loans],
+        [loan.days_past_due or 0 for loan in loans],
+        [float(loan.outstanding_amount or 0) for loan in loans],
+        closed=[loan.status == 'Paid' for loan in loans],
+    )
+    for i, loan in enumerate(loans):
+        loan.recovery_channel = str(result['channel'][i])
+        loan.settlement_discount = int(result['discount_percent'][i])
+        loan.settlement_amount = Decimal(str(result['settlement_amount'][i])).quantize(Decimal('0.01'))
+        loan.collection_priority = float(result['priority'][i])
+
+
+def assign_book(chunk_size=STRATEGY_CHUNK_SIZE):
+    """
+    Re-assigns every loan's strategy: keyset-chunked reads of just the inputs,
+    one np.select pass per chunk, and one executemany UPDATE per chunk for the
+    loans whose strategy actually changed (bulk_update's per-row CASE
+    expressions cost more than the assignment itself). Returns {channel: count}.
+    """
+    from django.db import connections, router, transaction
+    from .models import Loan
+
+    db = router.db_for_write(Loan)
+    connection = connections[db]
+    qn = connection.ops.quote_name
+    update_sql = "UPDATE {} SET {} WHERE {} = %s".format(
+        qn(Loan._meta.db_table), ', '.join(f"{qn(field)} = %s" for field in STRATEGY_FIELDS), qn('id'),
+    )
+
+    counts = {key: 0 for key in CHANNELS}
+    last_id = 0
+    columns = ('id', 'risk_percentage', 'predicted_default_risk', 'days_past_due', 'outstanding_amount', 'status',
+               *STRATEGY_FIELDS)
+    while True:
+        rows = list(Loan.objects.using(db).filter(id__gt=last_id).order_by('id').values_list(*columns)[:chunk_size])
+        if not rows:
+            return counts
+        last_id = rows[-1][0]
+        ids, risk_pct, predicted, dpd, outstanding, status, *current = zip(*rows)
+        risk = [p / 100.0 if p is not None else (d or 0.0) for p, d in zip(risk_pct, predicted)]
+        result = assign(risk, dpd, [float(o) for o in outstanding], closed=[s == 'Paid' for s in status])
+
+        new = zip(result['channel'].tolist(), result['discount_percent'].tolist(),
+                  result['settlement_amount'].tolist(), result['priority'].tolist())
+        changed = [
+            (channel, discount, Decimal(str(amount)).quantize(Decimal('0.01')), priority, pk)
+            for pk, (channel, discount, amount, priority), old in zip(ids, new, zip(*current))
+            if (channel, discount, float(amount), priority) != (old[0], old[1], float(old[2]), old[3])
+        ]
+        if changed:
+            with transaction.atomic(using=db), connection.cursor() as cursor:
+                cursor.executemany(update_sql, changed)
+        for channel, count in zip(*np.unique(result['channel'], return_counts=True)):
+            counts[str(channel)] += int(count)
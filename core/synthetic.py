@@ -0,0 +1,337 @@
+import csv
+import os
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.utils import timezone
+
+# Source books the distributions are learned from.
+PROFILE_SOURCES = ['synthetic_loans_1000.csv', 'loan-recovery (2).csv']
+
+# Loans generated (and written) per chunk; memory stays flat whatever the total.
+DEFAULT_CHUNK_SIZE = 10000
+
+# Cap on generated payment rows per loan so a 10M-loan book stays loadable.
+MAX_PAYMENTS_PER_LOAN = 12
+
+STREETS = ["Moi Avenue", "Kenyatta Avenue", "Waiyaki Way", "Ngong Road", "Thika Road", "Langata Road", "Tom Mboya St", "Jogoo Road"]
+CITIES = ["Nairobi", "Mombasa", "Kisumu", "Nakuru", "Eldoret", "Thika"]
+
+# Same column layout as synthetic_loans_1000.csv, so generated files go
+# straight into upload_portfolio, import_data.py or train_model.py.
+LOAN_CSV_COLUMNS = [
+    'Borrower_ID', 'Client_Name', 'Age', 'Gender', 'Employment_Type', 'Monthly_Income', 'Num_Dependents',
+    'Loan_ID', 'Loan_Amount', 'Loan_Tenure', 'Interest_Rate', 'Loan_Type', 'Collateral_Value',
+    'Outstanding_Loan_Amount', 'Monthly_EMI', 'Payment_History', 'Num_Missed_Payments', 'Days_Past_Due',
+    'Recovery_Status', 'Collection_Attempts', 'Collection_Method', 'Legal_Action_Taken',
+]
+
+CLIENT_COLUMNS = ['Age', 'Gender', 'Employment_Type', 'Monthly_Income', 'Num_Dependents']
+LOAN_COLUMNS = [
+    'Loan_Amount', 'Loan_Tenure', 'Interest_Rate', 'Loan_Type', 'Collateral_Value', 'Outstanding_Loan_Amount',
+    'Monthly_EMI', 'Payment_History', 'Num_Missed_Payments', 'Days_Past_Due', 'Recovery_Status',
+    'Collection_Attempts', 'Collection_Method', 'Legal_Action_Taken',
+]
+
+
+# =============================================
+# PROFILE (learned from the source CSVs)
+# =============================================
+class PortfolioProfile:
+    """
+    Smoothed bootstrap over the pooled source books. Each synthetic client and
+    loan starts from a randomly drawn source row, which keeps the categorical
+    mix and the joint shape of the numeric columns (e.g. DPD vs missed
+    payments, the signal the model learns from); continuous columns are then
+    jittered so no two generated rows are exact copies.
+    """
+
+    def __init__(self, frame, first_names, last_names):
+        self.size = len(frame)
+        self.columns = {col: frame[col].to_numpy() for col in frame.columns}
+        self.first_names = np.array(first_names)
+        self.last_names = np.array(last_names)
+
+    @classmethod
+    def from_csv(cls, paths=None):
+        paths = paths or [os.path.join(settings.BASE_DIR, name) for name in PROFILE_SOURCES]
+        frames = [pd.read_csv(path) for path in paths]
+        frame = pd.concat(frames, ignore_index=True)
+
+        names = frame['Client_Name'].dropna().str.split(' ', n=1) if 'Client_Name' in frame else pd.Series(dtype=object)
+        first_names = sorted({parts[0] for parts in names if len(parts) == 2}) or ['Client']
+        last_names = sorted({parts[1] for parts in names if len(parts) == 2}) or ['Borrower']
+
+        frame = frame[CLIENT_COLUMNS + LOAN_COLUMNS].copy()
+        frame['Collateral_Value'] = frame['Collateral_Value'].fillna(0)
+        frame['Collection_Method'] = frame['Collection_Method'].fillna('Calls')
+        # Ratios travel with the template row; amounts are re-scaled around them
+        frame['Collateral_Ratio'] = frame['Collateral_Value'] / frame['Loan_Amount']
+        frame['Outstanding_Ratio'] = frame['Outstanding_Loan_Amount'] / frame['Loan_Amount']
+        frame['EMI_Ratio'] = frame['Monthly_EMI'] / frame['Loan_Amount']
+        return cls(frame, first_names, last_names)
+
+    def sample(self, column, rows):
+        return self.columns[column][rows]
+
+
+_default_profile = None
+
+
+def get_default_profile():
+    global _default_profile
+    if _default_profile is None:
+        _default_profile = PortfolioProfile.from_csv()
+    return _default_profile
+
+
+# =============================================
+# GENERATION (one chunk at a time)
+# =============================================
+def _jitter(rng, values, sigma):
+    """Multiplicative log-normal noise around each value."""
+    return values * rng.lognormal(0.0, sigma, size=len(values))
+
+
+def generate_chunk(profile, rng, start, count, loans_per_client=1, prefix='SYN'):
+    """
+    Builds loans `start`..`start + count - 1` as a dict of numpy columns.
+    Loan i belongs to client i // loans_per_client; `start` and `count` must be
+    multiples of loans_per_client so clients never straddle two chunks.
+    """
+    loan_idx = np.arange(start, start + count)
+    client_idx = loan_idx // loans_per_client
+    first_of_client = loan_idx % loans_per_client == 0
+
+    # 1. Clients: one template row per client, broadcast to its loans
+    n_clients = int(first_of_client.sum())
+    client_rows = rng.integers(0, profile.size, size=n_clients)
+    per_loan = np.repeat(np.arange(n_clients), loans_per_client)[:count]
+
+    age = np.clip(profile.sample('Age', client_rows) + rng.integers(-3, 4, size=n_clients), 21, 64)
+    income = np.round(np.clip(_jitter(rng, profile.sample('Monthly_Income', client_rows).astype(float), 0.1), 10000, None), 2)
+    first = profile.first_names[rng.integers(0, len(profile.first_names), size=n_clients)]
+    last = profile.last_names[rng.integers(0, len(profile.last_names), size=n_clients)]
+
+    # 2. Loans: their own template row, amounts re-scaled, ratios preserved
+    rows = rng.integers(0, profile.size, size=count)
+    amount = np.round(np.clip(_jitter(rng, profile.sample('Loan_Amount', rows).astype(float), 0.15), 10000, 5_000_000), 0)
+    rate = np.round(np.clip(profile.sample('Interest_Rate', rows) + rng.normal(0, 0.5, size=count), 5.0, 20.0), 2)
+    dpd = profile.sample('Days_Past_Due', rows).astype(int)
+    dpd = np.where(dpd > 0, np.clip(dpd + rng.integers(-5, 6, size=count), 1, 180), 0)
+
+    chunk = {
+        'client_index': client_idx[first_of_client],
+        'client_id': np.array([f"{prefix}_BRW_{i}" for i in client_idx[first_of_client]]),
+        'name': np.char.add(np.char.add(first.astype(str), ' '), last.astype(str)),
+        'age': age.astype(int),
+        'gender': profile.sample('Gender', client_rows),
+        'employment_type': profile.sample('Employment_Type', client_rows),
+        'monthly_income': income,
+        'num_dependents': profile.sample('Num_Dependents', client_rows).astype(int),
+        'street_no': rng.integers(1, 501, size=n_clients),
+        'street': np.array(STREETS)[rng.integers(0, len(STREETS), size=n_clients)],
+        'city': np.array(CITIES)[rng.integers(0, len(CITIES), size=n_clients)],
+
+        'loan_index': loan_idx,
+        'loan_client': per_loan,
+        'loan_id': np.array([f"{prefix}_LN_{i}" for i in loan_idx]),
+        'amount': amount,
+        'tenure': profile.sample('Loan_Tenure', rows).astype(int),
+        'interest_rate': rate,
+        'loan_type': profile.sample('Loan_Type', rows),
+        'collateral_value': np.round(amount * profile.sample('Collateral_Ratio', rows), 2),
+        'outstanding_amount': np.round(np.minimum(amount, amount * profile.sample('Outstanding_Ratio', rows)), 2),
+        'monthly_emi': np.round(amount * profile.sample('EMI_Ratio', rows), 2),
+        'payment_history': profile.sample('Payment_History', rows),
+        'missed_payments': profile.sample('Num_Missed_Payments', rows).astype(int),
+        'days_past_due': dpd,
+        'recovery_status': profile.sample('Recovery_Status', rows),
+        'collection_attempts': profile.sample('Collection_Attempts', rows).astype(int),
+        'collection_method': profile.sample('Collection_Method', rows),
+        'legal_action_taken': profile.sample('Legal_Action_Taken', rows),
+    }
+    chunk['status'] = np.where(dpd > 90, 'Defaulted', 'Active')
+
+    # 3. Payments: the instalments already covered, most recent first
+    paid_share = 1 - chunk['outstanding_amount'] / amount
+    paid_months = np.rint(paid_share * chunk['tenure']).astype(int) - chunk['missed_payments']
+    payment_counts = np.clip(paid_months, 0, MAX_PAYMENTS_PER_LOAN)
+    payment_loans = np.repeat(np.arange(count), payment_counts)
+    payment_seq = np.arange(len(payment_loans)) - np.repeat(np.cumsum(payment_counts) - payment_counts, payment_counts)
+    chunk['payment_loan'] = payment_loans
+    chunk['payment_seq'] = payment_seq
+    chunk['payment_amount'] = np.round(_jitter(rng, chunk['monthly_emi'][payment_loans], 0.05), 2)
+    chunk['payment_days_ago'] = dpd[payment_loans] + 30 * (payment_seq + 1)
+
+    # 4. Collection logs (one per recorded attempt) and reminders (overdue loans)
+    log_counts = chunk['collection_attempts']
+    log_loans = np.repeat(np.arange(count), log_counts)
+    chunk['log_loan'] = log_loans
+    chunk['log_days_ago'] = np.arange(len(log_loans)) - np.repeat(np.cumsum(log_counts) - log_counts, log_counts)
+    chunk['log_days_ago'] = 7 * chunk['log_days_ago'] + rng.integers(0, 7, size=len(log_loans))
+    chunk['reminder_loan'] = np.flatnonzero((dpd > 0) & (chunk['status'] == 'Active'))
+    return chunk
+
+
+def iter_chunks(loans, seed=0, chunk_size=DEFAULT_CHUNK_SIZE, loans_per_client=1, prefix='SYN', profile=None):
+    """
+    Yields generated chunks covering `loans` loans. Each chunk draws from its
+    own RNG stream derived from (seed, chunk number), so output is identical
+    for a given seed and chunk size no matter how it is consumed.
+    """
+    profile = profile or get_default_profile()
+    chunk_size = max(loans_per_client, chunk_size - chunk_size % loans_per_client)
+    for number, start in enumerate(range(0, loans, chunk_size)):
+        rng = np.random.default_rng([seed, number])
+        yield generate_chunk(profile, rng, start, min(chunk_size, loans - start), loans_per_client, prefix)
+
+
+def _reminder_message(chunk, i):
+    return (
+        f"URGENT: Dear {chunk['name'][chunk['loan_client'][i]]}, your loan payment of "
+        f"KES {chunk['outstanding_amount'][i]:.2f} is overdue by {chunk['days_past_due'][i]} days. "
+        f"Please pay immediately."
+    )
+
+
+# =============================================
+# WRITERS
+# =============================================
+def write_csv(directory, loans, seed=0, chunk_size=DEFAULT_CHUNK_SIZE, loans_per_client=1, prefix='SYN', as_of=None):
+    """
+    Streams the book to `directory`: loans.csv (source CSV layout, client
+    columns included) plus payments.csv, collection_logs.csv and reminders.csv
+    keyed by Loan_ID. Returns row counts per file.
+    """
+    as_of = as_of or timezone.now()
+    os.makedirs(directory, exist_ok=True)
+    counts = {'loans': 0, 'payments': 0, 'collection_logs': 0, 'reminders': 0}
+
+    files = {name: open(os.path.join(directory, f'{name}.csv'), 'w', newline='', encoding='utf-8') for name in counts}
+    try:
+        writers = {name: csv.writer(f) for name, f in files.items()}
+        writers['loans'].writerow(LOAN_CSV_COLUMNS)
+        writers['payments'].writerow(['Loan_ID', 'Amount_Paid', 'Payment_Date', 'Reference_Number'])
+        writers['collection_logs'].writerow(['Loan_ID', 'Method', 'Legal_Action_Taken', 'Attempt_Date'])
+        writers['reminders'].writerow(['Loan_ID', 'Message', 'Scheduled_Date'])
+
+        for chunk in iter_chunks(loans, seed, chunk_size, loans_per_client, prefix):
+            c = chunk['loan_client']
+            writers['loans'].writerows(zip(
+                chunk['client_id'][c], chunk['name'][c], chunk['age'][c], chunk['gender'][c],
+                chunk['employment_type'][c], chunk['monthly_income'][c], chunk['num_dependents'][c],
+                chunk['loan_id'], chunk['amount'], chunk['tenure'], chunk['interest_rate'], chunk['loan_type'],
+                chunk['collateral_value'], chunk['outstanding_amount'], chunk['monthly_emi'],
+                chunk['payment_history'], chunk['missed_payments'], chunk['days_past_due'],
+                chunk['recovery_status'], chunk['collection_attempts'], chunk['collection_method'],
+                chunk['legal_action_taken'],
+            ))
+            p = chunk['payment_loan']
+            writers['payments'].writerows(zip(
+                chunk['loan_id'][p], chunk['payment_amount'],
+                [(as_of - timedelta(days=int(d))).date().isoformat() for d in chunk['payment_days_ago']],
+                [f"{prefix}P{i}-{s}" for i, s in zip(chunk['loan_index'][p], chunk['payment_seq'])],
+            ))
+            g = chunk['log_loan']
+            writers['collection_logs'].writerows(zip(
+                chunk['loan_id'][g], chunk['collection_method'][g], chunk['legal_action_taken'][g],
+                [(as_of - timedelta(days=int(d))).date().isoformat() for d in chunk['log_days_ago']],
+            ))
+            writers['reminders'].writerows(
+                (chunk['loan_id'][i], _reminder_message(chunk, i), as_of.date().isoformat())
+                for i in chunk['reminder_loan']
+            )
+            counts['loans'] += len(chunk['loan_id'])
+            counts['payments'] += len(p)
+            counts['collection_logs'] += len(g)
+            counts['reminders'] += len(chunk['reminder_loan'])
+    finally:
+        for f in files.values():
+            f.close()
+    return counts
+
+
+def write_database(loans, seed=0, chunk_size=DEFAULT_CHUNK_SIZE, loans_per_client=1, prefix='SYN', as_of=None,
+                   batch_size=1000):
+    """Bulk-inserts the book chunk by chunk. Returns row counts per table."""
+    from django.db import transaction
+    from .models import Client, Loan, Payment, CollectionLog, Reminder
+
+    as_of = as_of or timezone.now()
+    counts = {'clients': 0, 'loans': 0, 'payments': 0, 'collection_logs': 0, 'reminders': 0}
+
+    for chunk in iter_chunks(loans, seed, chunk_size, loans_per_client, prefix):
+        with transaction.atomic():
+            # 1. Clients
+            clients = [
+                Client(
+                    client_id=chunk['client_id'][i], name=chunk['name'][i], age=int(chunk['age'][i]),
+                    gender=chunk['gender'][i], employment_type=chunk['employment_type'][i],
+                    monthly_income=float(chunk['monthly_income'][i]), num_dependents=int(chunk['num_dependents'][i]),
+                    phone_number=f"07{chunk['client_index'][i] % 10 ** 8:08d}",
+                    email=f"{chunk['client_id'][i].lower()}@example.com",
+                    address=f"{chunk['street_no'][i]} {chunk['street'][i]}, {chunk['city'][i]}",
+                )
+                for i in range(len(chunk['client_id']))
+            ]
+            Client.objects.bulk_create(clients, batch_size=batch_size)
+            if clients and clients[0].pk is None:
+                by_id = Client.objects.in_bulk(list(chunk['client_id']), field_name='client_id')
+                clients = [by_id[c.client_id] for c in clients]
+
+            # 2. Loans
+            loan_objs = []
+            for i in range(len(chunk['loan_id'])):
+                loan = Loan(
+                    loan_id=chunk['loan_id'][i], client_id=clients[chunk['loan_client'][i]].pk,
+                    amount=float(chunk['amount'][i]), tenure=int(chunk['tenure'][i]),
+                    interest_rate=float(chunk['interest_rate'][i]), loan_type=chunk['loan_type'][i],
+                    collateral_value=float(chunk['collateral_value'][i]),
+                    outstanding_amount=float(chunk['outstanding_amount'][i]),
+                    monthly_emi=float(chunk['monthly_emi'][i]), payment_history=chunk['payment_history'][i],
+                    missed_payments=int(chunk['missed_payments'][i]), days_past_due=int(chunk['days_past_due'][i]),
+                    # Generated arrears are carried in, like an uploaded book's, for age_loans to roll forward
+                    opening_missed_payments=int(chunk['missed_payments'][i]),
+                    opening_days_past_due=int(chunk['days_past_due'][i]),
+                    status=chunk['status'][i], recovery_status=chunk['recovery_status'][i],
+                )
+                loan.refresh_risk_band()
+                loan_objs.append(loan)
+            Loan.objects.bulk_create(loan_objs, batch_size=batch_size)
+            if loan_objs and loan_objs[0].pk is None:
+                by_id = Loan.objects.in_bulk(list(chunk['loan_id']), field_name='loan_id')
+                loan_objs = [by_id[l.loan_id] for l in loan_objs]
+            loan_pks = [loan.pk for loan in loan_objs]
+
+            # 3. Payments, collection logs, reminders
+            Payment.objects.bulk_create([
+                Payment(
+                    loan_id=loan_pks[l], amount_paid=float(amount),
+                    payment_date=as_of - timedelta(days=int(days)),
+                    reference_number=f"{prefix}P{chunk['loan_index'][l]}-{seq}",
+                )
+                for l, seq, amount, days in zip(
+                    chunk['payment_loan'], chunk['payment_seq'], chunk['payment_amount'], chunk['payment_days_ago'])
+            ], batch_size=batch_size)
+            CollectionLog.objects.bulk_create([
+                CollectionLog(
+                    loan_id=loan_pks[l], method=chunk['collection_method'][l],
+                    legal_action_taken=chunk['legal_action_taken'][l],
+                    attempt_date=as_of - timedelta(days=int(days)), notes='Generated',
+                )
+                for l, days in zip(chunk['log_loan'], chunk['log_days_ago'])
+            ], batch_size=batch_size)
+            Reminder.objects.bulk_create([
+                Reminder(loan_id=loan_pks[i], message=_reminder_message(chunk, i), scheduled_date=as_of)
+                for i in chunk['reminder_loan']
+            ], batch_size=batch_size)
+
+        counts['clients'] += len(clients)
+        counts['loans'] += len(loan_objs)
+        counts['payments'] += len(chunk['payment_loan'])
+        counts['collection_logs'] += len(chunk['log_loan'])
+        counts['reminders'] += len(chunk['reminder_loan'])
+    return counts
@@ -1,3 +1,1761 @@
-from django.test import TestCase
+import contextlib
+import csv
+import io
+import os
+from decimal import Decimal
 
-# Create your tests here.
+import numpy as np
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse, resolve, get_resolver
+
+from .models import User, Client, Loan, Payment, Reminder, CollectionLog, RiskScore, Installment
+
+# Portfolio copies of synthetic_loans_1000.csv to seed. CI uses 1 (1,000 loans);
+# run `PERF_SEED_MULTIPLIER=100 python manage.py test core` for the 100k-loan profile.
+SEED_MULTIPLIER = int(os.getenv('PERF_SEED_MULTIPLIER', '1'))
+SEED_CSV = os.path.join(settings.BASE_DIR, 'synthetic_loans_1000.csv')
+
+# Upper bound on queries per URL name. Includes the session + user lookups that
+# every authenticated request costs. None of these may grow with the row count.
+QUERY_BUDGETS = {
+    'landing_page': 2,
+    'dashboard': 12,
+    'loan_list': 8,
+    'collection_worklist': 6,
+    'settings': 4,
+    'analytics': 4,
+    'create_loan': 5,
+    'create_client': 4,
+    'loan_detail': 10,
+    'trigger_reminders': 6,
+    'add_payment': 5,
+    'generate_settlement': 5,
+    'client_list': 6,
+    'client_autocomplete': 5,
+    'delete_client': 5,
+    'log_interaction': 5,
+    'model_performance': 5,
+    'clearance_certificate': 5,
+    'reports': 9,
+    'upload_portfolio': 4,
+    'about': 2,
+    'contact': 2,
+    'privacy': 2,
+    'terms': 2,
+    'metrics': 3,
+    None: 2,  # unnamed .well-known DevTools route
+}
+
+# Writes that are batched rather than per row still grow by one query per batch.
+ROWS_PER_BATCH_QUERY = 100
+
+
+def seed_portfolio(multiplier=SEED_MULTIPLIER):
+    """Bulk-inserts clients, loans, payments, logs and reminders cloned from the synthetic CSV."""
+    with open(SEED_CSV, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+
+    clients, loans = [], []
+    for copy in range(multiplier):
+        for row in rows:
+            client_id = f"{row['Borrower_ID']}_{copy}"
+            clients.append(Client(
+                client_id=client_id,
+                name=row['Client_Name'],
+                age=int(row['Age']),
+                gender=row['Gender'],
+                employment_type=row['Employment_Type'],
+                monthly_income=Decimal(row['Monthly_Income']),
+                num_dependents=int(row['Num_Dependents']),
+                phone_number=f"07{copy:02d}{len(clients):06d}",
+                email=f"{client_id.lower()}@example.com",
+                address="Ngong Road, Nairobi",
+            ))
+    Client.objects.bulk_create(clients, batch_size=500)
+    client_pks = Client.objects.in_bulk([c.client_id for c in clients], field_name='client_id')
+
+    for copy in range(multiplier):
+        for row in rows:
+            dpd = int(row['Days_Past_Due'])
+            outstanding = Decimal(row['Outstanding_Loan_Amount']).quantize(Decimal('0.01'))
+            loan = Loan(
+                loan_id=f"{row['Loan_ID']}_{copy}",
+                client_id=client_pks[f"{row['Borrower_ID']}_{copy}"].pk,
+                amount=Decimal(row['Loan_Amount']),
+                tenure=int(row['Loan_Tenure']),
+                interest_rate=Decimal(row['Interest_Rate']),
+                loan_type=row['Loan_Type'],
+                collateral_value=Decimal(row['Collateral_Value'] or 0).quantize(Decimal('0.01')),
+                outstanding_amount=outstanding,
+                monthly_emi=Decimal(row['Monthly_EMI']).quantize(Decimal('0.01')),
+                payment_history=row['Payment_History'],
+                missed_payments=int(row['Num_Missed_Payments']),
+                days_past_due=dpd,
+                status='Defaulted' if dpd > 90 else 'Active',
+                recovery_status=row['Recovery_Status'],
+                risk_percentage=min(dpd, 100) * 0.9,
+            )
+            loan.refresh_risk_band()
+            loans.append(loan)
+    Loan.objects.bulk_create(loans, batch_size=500)
+
+    loan_pks = list(Loan.objects.values_list('id', flat=True))
+    Payment.objects.bulk_create(
+        [Payment(loan_id=pk, amount_paid=Decimal('1000.00'), reference_number=f"MP{pk}{n}") for pk in loan_pks for n in range(2)],
+        batch_size=500,
+    )
+    CollectionLog.objects.bulk_create(
+        [CollectionLog(loan_id=pk, method='Calls', notes='Seeded call') for pk in loan_pks],
+        batch_size=500,
+    )
+    Reminder.objects.bulk_create(
+        [Reminder(loan_id=pk, message='Seeded reminder', scheduled_date='2026-01-01T00:00:00Z') for pk in loan_pks],
+        batch_size=500,
+    )
+    return len(loans)
+
+
+class QueryBudgetTests(TestCase):
+    """Every URL in core/urls.py must stay under a fixed query budget, however big the book is."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.loan_count = seed_portfolio()
+        cls.user = User.objects.create_superuser('perf', 'perf@example.com', 'perf-pass')
+
+        # One loan with a long history, one fully paid loan, one client to delete
+        cls.loan = Loan.objects.filter(status='Active').select_related('client').first()
+        cls.loan.risk_percentage = 80.0
+        cls.loan.predicted_default_risk = 0.8
+        cls.loan.save()
+        Payment.objects.bulk_create([Payment(loan=cls.loan, amount_paid=Decimal('10.00')) for _ in range(50)])
+        CollectionLog.objects.bulk_create([CollectionLog(loan=cls.loan, method='Emails') for _ in range(50)])
+        Reminder.objects.bulk_create([Reminder(loan=cls.loan, message='x', scheduled_date='2026-01-01T00:00:00Z') for _ in range(50)])
+        Loan.objects.filter(client=cls.loan.client).exclude(pk=cls.loan.pk).delete()
+        Loan.objects.bulk_create([
+            Loan(loan_id=f"LN_OTHER_{n}", client=cls.loan.client, amount=1000, tenure=12, interest_rate=10,
+                 outstanding_amount=1000, monthly_emi=100)
+            for n in range(20)
+        ])
+
+        cls.paid_loan = Loan.objects.exclude(pk=cls.loan.pk).first()
+        cls.paid_loan.status = 'Paid'
+        cls.paid_loan.outstanding_amount = 0
+        cls.paid_loan.save()
+
+        cls.doomed_client = Client.objects.exclude(pk=cls.loan.client_id).last()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def assertMaxQueries(self, budget, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as ctx, contextlib.redirect_stdout(io.StringIO()):
+            response = func(*args, **kwargs)
+        executed = len(ctx.captured_queries)
+        self.assertLessEqual(
+            executed, budget,
+            f"{executed} queries (budget {budget}):\n" + "\n".join(q['sql'][:200] for q in ctx.captured_queries),
+        )
+        return response
+
+    def url_for(self, name):
+        loan_routes = {'loan_detail', 'add_payment', 'generate_settlement', 'log_interaction'}
+        if name in loan_routes:
+            return reverse(name, args=[self.loan.pk])
+        if name == 'clearance_certificate':
+            return reverse(name, args=[self.paid_loan.pk])
+        if name == 'delete_client':
+            return reverse(name, args=[self.doomed_client.pk])
+        if name is None:
+            return '/.well-known/appspecific/com.chrome.devtools.json'
+        return reverse(name)
+
+    def test_every_url_has_a_budget(self):
+        names = {pattern.name for pattern in get_resolver('core.urls').url_patterns}
+        self.assertEqual(names - set(QUERY_BUDGETS), set())
+
+    def test_get_requests_stay_within_budget(self):
+        for name, budget in QUERY_BUDGETS.items():
+            if name == 'trigger_reminders':
+                continue  # a write job; covered below
+            with self.subTest(url=name):
+                response = self.assertMaxQueries(budget, self.client.get, self.url_for(name))
+                self.assertLess(response.status_code, 500)
+
+    def test_search_and_filters_stay_within_budget(self):
+        for url in [
+            reverse('dashboard') + '?q=Young',
+            reverse('dashboard') + f'?q={self.loan.pk}',
+            reverse('loan_list') + '?q=Martin&status=Active&risk=high',
+            reverse('loan_list') + '?cursor=',
+            reverse('collection_worklist') + '?channel=legal&page=2',
+            reverse('client_list') + '?q=07',
+            reverse('client_autocomplete') + '?q=Mar',
+            reverse('client_autocomplete') + '?q=07',
+            reverse('reports') + '?period=weekly&export=1',
+        ]:
+            with self.subTest(url=url):
+                budget = QUERY_BUDGETS[resolve(url.split('?')[0]).url_name]
+                self.assertMaxQueries(budget, self.client.get, url)
+
+    def test_post_requests_stay_within_budget(self):
+        self.assertMaxQueries(
+            QUERY_BUDGETS['add_payment'] + 2, self.client.post,
+            self.url_for('add_payment'), {'amount_paid': '10.00', 'reference_number': 'T1'},
+        )
+        self.assertMaxQueries(
+            QUERY_BUDGETS['log_interaction'] + 2, self.client.post,
+            self.url_for('log_interaction'), {'channel': 'Calls', 'notes': 'Promised to pay'},
+        )
+        self.assertMaxQueries(
+            QUERY_BUDGETS['create_loan'] + 4, self.client.post, reverse('create_loan'),
+            {'loan_id': 'LN_NEW', 'client': self.loan.client_id, 'amount': '50000', 'tenure': 12,
+             'interest_rate': '12.0', 'collateral_value': '0'},
+        )
+        self.assertMaxQueries(
+            QUERY_BUDGETS['settings'] + 2, self.client.post, reverse('settings'),
+            {'theme': 'light', 'items_per_page': 25, 'pagination': 'cursor'},
+        )
+        # Cascade delete: one query per related table, not per row (plus the KPI aggregate and counter update)
+        self.assertMaxQueries(QUERY_BUDGETS['delete_client'] + 10, self.client.post, self.url_for('delete_client'))
+
+    def test_reminder_job_does_not_query_per_loan(self):
+        overdue = Loan.objects.filter(status='Active', days_past_due__gt=0).count()
+        self.assertGreater(overdue, 0)
+        self.assertMaxQueries(
+            QUERY_BUDGETS['trigger_reminders'] + overdue // ROWS_PER_BATCH_QUERY,
+            self.client.get, reverse('trigger_reminders'),
+        )
+        self.assertEqual(Reminder.objects.filter(message__startswith='URGENT').count(), overdue)
+
+    def test_portfolio_upload_does_not_query_per_row(self):
+        rows = 300
+        lines = ["Borrower_ID,Borrower_Name,Age,Monthly_Income,Loan_ID,Loan_Amount,Loan_Tenure,"
+                 "Interest_Rate,Monthly_EMI,Num_Missed_Payments,Days_Past_Due"]
+        for n in range(rows):
+            # Every third row re-uses an existing client
+            borrower = self.loan.client.client_id if n % 3 == 0 else f"UP_{n}"
+            lines.append(f"{borrower},Upload {n},35,80000,UPLN_{n},250000,24,12.5,12000,0,0")
+        upload = SimpleUploadedFile('portfolio.csv', "\n".join(lines).encode(), content_type='text/csv')
+        # Loan rows are wide: the backend's bind-parameter limit decides how many go in one INSERT
+        loan_fields = [f for f in Loan._meta.concrete_fields if not f.primary_key]
+        loan_inserts = -(-rows // connection.ops.bulk_batch_size(loan_fields, [None] * rows))
+
+        self.assertMaxQueries(
+            QUERY_BUDGETS['upload_portfolio'] + 5 + loan_inserts + rows // ROWS_PER_BATCH_QUERY,
+            self.client.post, reverse('upload_portfolio'), {'csv_file': upload},
+        )
+        self.assertEqual(Loan.objects.filter(loan_id__startswith='UPLN_').count(), rows)
+        self.assertEqual(RiskScore.objects.filter(loan__loan_id__startswith='UPLN_', source='upload_portfolio').count(), rows)
+
+    def test_score_update_script_does_not_query_per_loan(self):
+        import update_scores
+
+        # Loans + RiskScore history are both written in bulk
+        self.assertMaxQueries(
+            6 + 2 * (self.loan_count // ROWS_PER_BATCH_QUERY),
+            update_scores.update_all_risk_scores,
+        )
+
+
+class SyntheticPortfolioTests(TestCase):
+    """The generator must be reproducible and write a consistent book in bulk."""
+
+    def test_same_seed_generates_the_same_book(self):
+        from .synthetic import iter_chunks
+
+        first = list(iter_chunks(500, seed=3, chunk_size=200, loans_per_client=2))
+        second = list(iter_chunks(500, seed=3, chunk_size=200, loans_per_client=2))
+        other = list(iter_chunks(500, seed=4, chunk_size=200, loans_per_client=2))
+        self.assertEqual([len(c['loan_id']) for c in first], [200, 200, 100])
+        for a, b in zip(first, second):
+            self.assertEqual(a['loan_id'].tolist(), b['loan_id'].tolist())
+            self.assertEqual(a['amount'].tolist(), b['amount'].tolist())
+            self.assertEqual(a['payment_amount'].tolist(), b['payment_amount'].tolist())
+        self.assertNotEqual(first[0]['amount'].tolist(), other[0]['amount'].tolist())
+
+    def test_write_database_uses_batched_inserts(self):
+        from .synthetic import write_database
+
+        with CaptureQueriesContext(connection) as ctx:
+            counts = write_database(300, seed=1, chunk_size=150, loans_per_client=3, batch_size=1000)
+        self.assertEqual(Loan.objects.count(), counts['loans'])
+        self.assertEqual(Client.objects.count(), counts['clients'])
+        self.assertEqual(counts['clients'], 100)
+        self.assertEqual(Payment.objects.count(), counts['payments'])
+        self.assertEqual(CollectionLog.objects.count(), counts['collection_logs'])
+        self.assertEqual(Reminder.objects.count(), counts['reminders'])
+        self.assertFalse(Loan.objects.filter(status='Defaulted', days_past_due__lte=90).exists())
+        # Per chunk: savepoint pair + one insert per table, plus one query per batch of rows
+        chunks = 2
+        self.assertLessEqual(
+            len(ctx.captured_queries),
+            chunks * 7 + sum(counts.values()) // ROWS_PER_BATCH_QUERY,
+        )
+
+
+class TrainingPipelineTests(TestCase):
+    """core.training must reproduce the original labelling rule and never evaluate on training rows."""
+
+    def test_vectorised_labels_match_row_rule(self):
+        from .training import SEGMENT_MAP, add_engineered_features, build_labels, fit_segments, load_csv
+
+        df = add_engineered_features(load_csv([SEED_CSV]))
+        _, _, segments = fit_segments(df)
+
+        def determine_actual_risk(row, segment):
+            if row['Days_Past_Due'] > 15 or row['Num_Missed_Payments'] >= 1:
+                return 1
+            if SEGMENT_MAP[segment] in ['High Loan, Higher Default Risk', 'Moderate Income, High Loan Burden']:
+                if row['DTI_Ratio'] > 0.40:
+                    return 1
+            return 0
+
+        expected = [determine_actual_risk(row, seg) for (_, row), seg in zip(df.iterrows(), segments)]
+        self.assertEqual(build_labels(df, segments).tolist(), expected)
+
+    def test_database_loader_reads_every_loan_in_chunks(self):
+        from .synthetic import write_database
+        from .training import RAW_COLUMNS, load_database
+
+        write_database(230, seed=5, chunk_size=230)
+        with CaptureQueriesContext(connection) as ctx:
+            df = load_database(chunk_size=50)
+        self.assertEqual(list(df.columns), RAW_COLUMNS)
+        self.assertEqual(len(df), 230)
+        self.assertEqual(len(ctx.captured_queries), 1 + 5)  # count + ceil(230 / 50) keyset pages
+        self.assertAlmostEqual(df['Loan_Amount'].sum(), float(sum(Loan.objects.values_list('amount', flat=True))), places=0)
+
+    def test_train_reports_held_out_metrics(self):
+        from .training import FEATURES_LIST, load_csv, train
+
+        model_data, report = train(load_csv([SEED_CSV]), n_candidates=3, cv=2, log=lambda message: None)
+        self.assertEqual(report['train_rows'] + report['test_rows'], 1000)
+        self.assertEqual(report['test_rows'], 200)
+        self.assertEqual(model_data['features_list'], FEATURES_LIST)
+        self.assertEqual(model_data['classifier'].n_features_in_, len(FEATURES_LIST))
+        for key in ('precision', 'recall', 'f1', 'roc_auc'):
+            self.assertIsNotNone(report['holdout'][key])
+        self.assertGreater(report['total_seconds'], 0)
+
+        # Compact serving model, profiled alongside the forest
+        self.assertEqual(set(report['serving_comparison']), {'forest', 'compact'})
+        for profile in report['serving_comparison'].values():
+            for key in ('roc_auc', 'f1', 'p50_ms', 'p99_ms', 'rows_per_sec', 'bytes'):
+                self.assertIn(key, profile)
+        self.assertIn('compact', model_data['serving_models'])
+        self.assertLess(report['serving_comparison']['compact']['bytes'], report['serving_comparison']['forest']['bytes'])
+        self.assertGreater(report['serving_comparison']['compact']['roc_auc'], 0.95)
+
+    def test_serving_model_follows_latency_budget(self):
+        from .ml_utils import LoanMLSystem
+
+        system = LoanMLSystem.__new__(LoanMLSystem)
+        system.serving_models = {'forest': object(), 'compact': object()}
+        system.model_profiles = {
+            'forest': {'roc_auc': 0.99, 'p99_ms': 15.0},
+            'compact': {'roc_auc': 0.98, 'p99_ms': 4.0},
+        }
+        self.assertEqual(system.select_model(None), 'forest')
+        self.assertEqual(system.select_model(20), 'forest')
+        self.assertEqual(system.select_model(5), 'compact')
+        self.assertEqual(system.select_model(1), 'compact')  # nothing fits: fastest wins
+        system.model_profiles = {}
+        self.assertEqual(system.select_model(5), 'forest')  # artifact trained before profiles existed
+
+
+class ForestEngineTests(TestCase):
+    """The flattened forest must return exactly what sklearn's predict_proba returns."""
+
+    @classmethod
+    def setUpTestData(cls):
+        from .training import FEATURES_LIST, add_engineered_features, load_csv
+
+        cls.features = add_engineered_features(load_csv([SEED_CSV]).fillna(0))[FEATURES_LIST]
+
+    def test_matches_shipped_model(self):
+        from .forest_engine import FlatForest
+        from .ml_utils import ml_system
+
+        engine = FlatForest.from_classifier(ml_system.classifier)
+        expected = ml_system.classifier.predict_proba(self.features)
+        np.testing.assert_array_equal(engine.predict_proba(self.features.to_numpy()), expected)
+        for i in (0, 17, 999):
+            np.testing.assert_array_equal(engine.predict_proba(self.features.to_numpy()[i]), expected[i:i + 1])
+
+    def test_matches_other_tree_ensembles(self):
+        from sklearn.ensemble import ExtraTreesClassifier, HistGradientBoostingClassifier, RandomForestClassifier
+        from sklearn.tree import DecisionTreeClassifier
+        from .forest_engine import FlatForest
+
+        X = self.features.to_numpy()
+        y = (self.features['Days_Past_Due'] > 15).astype(int) ^ (np.arange(len(X)) % 7 == 0)
+        for model in (
+            RandomForestClassifier(n_estimators=25, class_weight='balanced', random_state=0),
+            ExtraTreesClassifier(n_estimators=25, min_samples_leaf=3, random_state=0),
+            DecisionTreeClassifier(random_state=0),
+        ):
+            with self.subTest(model=type(model).__name__):
+                model.fit(X, y)
+                np.testing.assert_array_equal(FlatForest.from_classifier(model).predict_proba(X), model.predict_proba(X))
+        self.assertFalse(FlatForest.supports(HistGradientBoostingClassifier().fit(X[:200], y[:200])))
+
+    def test_ml_system_fast_path_matches_sklearn(self):
+        from .forest_engine import FlatForest
+        from .ml_utils import ml_system
+
+        rows = self.features.head(50).to_dict('records')
+        previous_cache, ml_system.score_cache = ml_system.score_cache, None
+        self.addCleanup(setattr, ml_system, 'score_cache', previous_cache)
+        expected = ml_system.predict_proba(rows)
+        previous, ml_system.fast_engine = ml_system.fast_engine, FlatForest.from_classifier(ml_system.serving_model)
+        try:
+            np.testing.assert_array_equal(ml_system.predict_proba(rows), expected)
+            self.assertEqual(ml_system.predict_proba(rows[:1])[0], expected[0])
+            with self.assertRaises(KeyError):
+                ml_system.predict_proba([{'Age': 30}])
+        finally:
+            ml_system.fast_engine = previous
+
+    def test_contributions_add_up_to_the_prediction(self):
+        from .forest_engine import FlatForest
+        from .ml_utils import EXPLANATION_TOP_K, FEATURE_LABELS, ml_system
+
+        X = self.features.to_numpy()
+        bias, contributions = FlatForest.from_classifier(ml_system.classifier).contributions(X)
+        self.assertEqual(contributions.shape, X.shape)
+        np.testing.assert_allclose(bias + contributions.sum(axis=1), ml_system.classifier.predict_proba(X)[:, 1], atol=1e-9)
+
+        rows = self.features.head(20).to_dict('records')
+        explanations = ml_system.explain_batch(rows)
+        self.assertEqual(len(explanations), 20)
+        self.assertTrue(all(1 <= len(reasons) <= EXPLANATION_TOP_K for reasons in explanations))
+        self.assertEqual(ml_system.explain_prediction(rows[3]), explanations[3])
+        top = int(np.argmax(np.abs(contributions[3])))
+        self.assertTrue(explanations[3][0].startswith(FEATURE_LABELS[self.features.columns[top]]))
+
+
+class ScoreCacheTests(TestCase):
+    """Request-sized batches are memoized per model version; the cache stays bounded and reports hits/misses."""
+
+    @classmethod
+    def setUpTestData(cls):
+        from .training import FEATURES_LIST, add_engineered_features, load_csv
+
+        cls.rows = add_engineered_features(load_csv([SEED_CSV]).fillna(0))[FEATURES_LIST].head(40).to_dict('records')
+
+    def setUp(self):
+        from .metrics import registry
+
+        registry.reset()
+        self.addCleanup(registry.reset)
+
+    def counter(self, name, **labels):
+        from .metrics import registry
+
+        return registry.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def test_hits_return_the_computed_scores(self):
+        from .ml_utils import ml_system
+        from .score_cache import ScoreCache
+
+        previous, ml_system.score_cache = ml_system.score_cache, ScoreCache(max_entries=30)
+        self.addCleanup(setattr, ml_system, 'score_cache', previous)
+
+        first = ml_system.predict_proba(self.rows[:20])
+        self.assertEqual(self.counter('intellidebt_score_cache_misses_total'), 20)
+        np.testing.assert_array_equal(ml_system.predict_proba(self.rows[:20]), first)
+        self.assertEqual(self.counter('intellidebt_score_cache_hits_total', tier='local'), 20)
+
+        ml_system.predict_proba(self.rows[20:40])
+        self.assertEqual(len(ml_system.score_cache), 30)
+        self.assertEqual(self.counter('intellidebt_score_cache_evictions_total'), 10)
+        with self.assertRaises(KeyError):
+            ml_system.predict_proba([{'Age': 30}])
+
+    def test_entries_expire_and_are_shared_through_the_django_cache(self):
+        import time
+        from django.core.cache import cache
+        from .score_cache import ScoreCache
+
+        cache.clear()
+        self.addCleanup(cache.clear)
+        worker_a = ScoreCache(max_entries=10, ttl=60, shared=cache)
+        worker_b = ScoreCache(max_entries=10, ttl=60, shared=cache)
+        worker_a.set_many({'v1:abc': 0.25})
+        self.assertEqual(worker_b.get_many(['v1:abc', 'v2:abc']), {'v1:abc': 0.25})
+        self.assertEqual(self.counter('intellidebt_score_cache_hits_total', tier='shared'), 1)
+        self.assertEqual(self.counter('intellidebt_score_cache_misses_total'), 1)
+
+        expiring = ScoreCache(max_entries=10, ttl=0.01)
+        expiring.set_many({'v1:abc': 0.25})
+        time.sleep(0.02)
+        self.assertEqual(expiring.get_many(['v1:abc']), {})
+
+    def test_reload_clears_the_local_cache(self):
+        import shutil
+        import tempfile
+        import joblib
+        from django.test import override_settings
+        from .ml_utils import LoanMLSystem
+        from .model_registry import ModelRegistry
+
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        with override_settings(MODEL_REGISTRY_DIR=root, MODEL_RELOAD_INTERVAL=0), \
+                contextlib.redirect_stdout(io.StringIO()):
+            system = LoanMLSystem()
+            system.predict_proba(self.rows[:5])
+            self.assertEqual(len(system.score_cache), 5)
+
+            registry = ModelRegistry(root)
+            registry.publish(joblib.load(os.path.join(settings.BASE_DIR, 'loan_ml_model.joblib')), version='v2')
+            registry.activate('v2')
+            system.predict_proba(self.rows[:5])
+        self.assertEqual(system.model_version, 'v2')
+        self.assertEqual(len(system.score_cache), 5)
+        self.assertTrue(all(key.startswith('v2:') for key in system.score_cache.entries))
+
+
+class ModelRegistryTests(TestCase):
+    """Versions are checksummed, ACTIVE swaps without a restart, and shadow scores stay off the request path."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        import joblib
+
+        cls.model_data = joblib.load(os.path.join(settings.BASE_DIR, 'loan_ml_model.joblib'))
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        overrides = override_settings(MODEL_REGISTRY_DIR=root, MODEL_RELOAD_INTERVAL=0)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def publish(self, version, **changes):
+        from .model_registry import ModelRegistry
+
+        registry = ModelRegistry(settings.MODEL_REGISTRY_DIR)
+        registry.publish({**self.model_data, **changes}, version=version)
+        return registry
+
+    def test_publish_writes_metadata_and_rejects_tampered_artifacts(self):
+        from .model_registry import ModelRegistryError
+
+        registry = self.publish('v1', custom_threshold=0.33)
+        meta = registry.metadata('v1')
+        self.assertEqual(meta['custom_threshold'], 0.33)
+        self.assertEqual(meta['features_list'], self.model_data['features_list'])
+        self.assertEqual(len(meta['sha256']), 64)
+        self.assertEqual(registry.load('v1')[0]['custom_threshold'], 0.33)
+        with self.assertRaises(ModelRegistryError):
+            registry.publish(self.model_data, version='v1')
+
+        with open(os.path.join(registry.version_dir('v1'), 'model.joblib'), 'ab') as f:
+            f.write(b'corrupt')
+        with self.assertRaises(ModelRegistryError):
+            registry.load('v1')
+        with self.assertRaises(ModelRegistryError):
+            registry.activate('missing')
+
+    def test_workers_pick_up_a_new_active_version_without_restart(self):
+        from .ml_utils import LEGACY_VERSION, LoanMLSystem
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            system = LoanMLSystem()
+            self.assertEqual(system.model_version, LEGACY_VERSION)
+            self.assertFalse(system.refresh_if_changed())
+
+            self.publish('v2', custom_threshold=0.33).activate('v2')
+            self.assertTrue(system.refresh_if_changed())
+        self.assertEqual(system.model_version, 'v2')
+        self.assertEqual(system.custom_threshold, 0.33)
+        self.assertFalse(system.refresh_if_changed())
+
+    def test_shadow_version_scores_in_the_background(self):
+        from .ml_utils import LoanMLSystem
+        from .model_registry import shadow_summary
+        from .models import ShadowScore
+        from .training import FEATURES_LIST, add_engineered_features, load_csv
+
+        registry = self.publish('v1')
+        registry.activate('v1')
+        registry.publish(self.model_data, version='v2')
+        with contextlib.redirect_stdout(io.StringIO()):
+            system = LoanMLSystem()
+        self.assertIsNone(system.shadow)
+
+        registry.set_shadow('v2')
+        with contextlib.redirect_stdout(io.StringIO()):
+            system.refresh_if_changed()
+        self.assertEqual((system.shadow.version, system.shadow.active_version), ('v2', 'v1'))
+        system.shadow.start_thread = False  # drained inline below instead of by the worker thread
+
+        client = Client.objects.create(client_id='SH1', name='Shadow', monthly_income=50000)
+        loan = Loan.objects.create(loan_id='SHL1', client=client, amount=1000, tenure=12, interest_rate=10,
+                                   outstanding_amount=1000, monthly_emi=100)
+        rows = add_engineered_features(load_csv([SEED_CSV]).fillna(0))[FEATURES_LIST].head(3).to_dict('records')
+        scores = system.predict_proba(rows, loan_ids=[loan.pk, None, None])
+        self.assertEqual(ShadowScore.objects.count(), 0)  # nothing written on the request path
+
+        system.shadow.run_pending()
+        stored = list(ShadowScore.objects.order_by('id'))
+        self.assertEqual(len(stored), 3)
+        self.assertEqual(stored[0].loan_id, loan.pk)
+        self.assertAlmostEqual(stored[1].primary_score, scores[1])
+        summary = shadow_summary('v2')
+        self.assertEqual(summary['scored'], 3)
+        self.assertEqual(summary['decision_agreement'], 1.0)  # same artifact, same scores
+
+        registry.set_shadow(None)
+        with contextlib.redirect_stdout(io.StringIO()):
+            system.refresh_if_changed()
+        self.assertIsNone(system.shadow)
+
+
+class ScoreProvenanceTests(TestCase):
+    """Each score records the model version and a hash of its inputs; history is only appended on change."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('prov', 'prov@example.com', 'prov-pass')
+        self.client.force_login(self.user)
+        borrower = Client.objects.create(client_id='PV1', name='Provenance', age=40, monthly_income=50000)
+        self.loan = Loan.objects.create(loan_id='PVL1', client=borrower, amount=100000, tenure=12, interest_rate=12,
+                                        collateral_value=50000, outstanding_amount=80000, monthly_emi=9000,
+                                        missed_payments=2, days_past_due=40)
+
+    def test_feature_hash_ignores_float_noise_but_not_real_changes(self):
+        from .scoring import feature_hash
+
+        features = ['Loan_Amount', 'Interest_Rate']
+        base = feature_hash({'Loan_Amount': Decimal('1000.10'), 'Interest_Rate': 12}, features)
+        self.assertEqual(len(base), 16)
+        self.assertEqual(base, feature_hash({'Loan_Amount': 1000.1 + 1e-9, 'Interest_Rate': 12.0}, features))
+        self.assertNotEqual(base, feature_hash({'Loan_Amount': 1000.2, 'Interest_Rate': 12}, features))
+
+    def test_viewing_a_loan_stamps_it_once(self):
+        from .ml_utils import ml_system
+
+        url = reverse('loan_detail', args=[self.loan.pk])
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.client.get(url)
+            self.client.get(url)
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.model_version, ml_system.model_version)
+        self.assertEqual(len(self.loan.feature_hash), 16)
+        history = list(self.loan.risk_scores.all())
+        self.assertEqual(len(history), 1)
+        self.assertEqual((history[0].source, history[0].feature_hash), ('loan_detail', self.loan.feature_hash))
+        self.assertAlmostEqual(history[0].probability * 100, self.loan.risk_percentage, places=1)
+        self.assertFalse(Loan.objects.stale_for(ml_system.model_version).filter(pk=self.loan.pk).exists())
+        self.assertTrue(Loan.objects.stale_for('v-next').filter(pk=self.loan.pk).exists())
+
+        with self.assertRaises(ValueError):
+            history[0].save()
+        self.assertEqual(RiskScore.objects.count(), 1)
+
+    def test_score_script_only_rescores_changed_loans(self):
+        import update_scores
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            update_scores.update_all_risk_scores()
+            self.assertEqual(RiskScore.objects.count(), 1)
+            # Same model, same inputs: nothing to write
+            with CaptureQueriesContext(connection) as ctx:
+                update_scores.update_all_risk_scores()
+            self.assertFalse([q for q in ctx.captured_queries if not q['sql'].startswith('SELECT')])
+
+            # Loan viewed after the batch run hashes the same inputs, so no new history either
+            self.client.get(reverse('loan_detail', args=[self.loan.pk]))
+            self.assertEqual(RiskScore.objects.count(), 1)
+
+            Loan.objects.filter(pk=self.loan.pk).update(days_past_due=60)
+            update_scores.update_all_risk_scores()
+        self.assertEqual(RiskScore.objects.count(), 2)
+
+
+    def test_new_loan_is_not_rescored_by_its_first_view_or_batch_run(self):
+        import update_scores
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.client.post(reverse('create_loan'), {
+                'loan_id': 'PVL_NEW', 'client': self.loan.client.pk, 'amount': '12000', 'tenure': 12,
+                'interest_rate': '12', 'collateral_value': '5000', 'amortization_method': 'reducing',
+            })
+            loan = Loan.objects.get(loan_id='PVL_NEW')
+            self.assertEqual(list(loan.risk_scores.values_list('source', flat=True)), ['create_loan'])
+
+            # Scored from the stored (reducing-balance) EMI, so later paths hash the same inputs
+            self.client.get(reverse('loan_detail', args=[loan.pk]))
+            update_scores.update_all_risk_scores()
+        self.assertEqual(loan.risk_scores.count(), 1)
+
+
+class RecoveryStrategyTests(TestCase):
+    """One vectorised rule set decides channel, settlement offer and worklist order for every loan."""
+
+    def test_assign_applies_the_configured_thresholds(self):
+        from .strategy import assign
+
+        result = assign(
+            risk=[0.90, 0.75, 0.50, 0.49, 0.10, 0.90],
+            days_past_due=[0, 0, 0, 0, 120, 0],
+            outstanding=[1000, 1000, 1000, 1000, 1000, 0],
+        )
+        self.assertEqual(list(result['channel']), ['legal', 'settlement', 'settlement', 'reminders', 'legal', 'closed'])
+        self.assertEqual(list(result['discount_percent']), [30, 15, 15, 0, 30, 0])
+        self.assertEqual(list(result['settlement_amount']), [700.0, 850.0, 850.0, 0.0, 700.0, 0.0])
+        self.assertEqual(list(result['priority']), [900.0, 750.0, 500.0, 490.0, 100.0, 0.0])
+
+        with self.settings(RECOVERY_STRATEGY={'settlement_risk': 0.4, 'settlement_discount': 10}):
+            result = assign([0.45], [0], [1000])
+        self.assertEqual((result['channel'][0], result['discount_percent'][0]), ('settlement', 10))
+
+    def test_book_assignment_feeds_the_worklist(self):
+        from .ml_utils import ml_system
+        from .strategy import assign_book
+
+        user = User.objects.create_superuser('collector', 'c@example.com', 'pass')
+        borrower = Client.objects.create(client_id='ST1', name='Strategy')
+        risks = [(None, 0.2), (80.0, 0), (60.0, 0), (30.0, 0), (95.0, 0)]
+        for n, (pct, predicted) in enumerate(risks):
+            Loan.objects.create(loan_id=f'STL{n}', client=borrower, amount=1000, tenure=12, interest_rate=10,
+                                outstanding_amount=1000 * (n + 1), monthly_emi=100,
+                                risk_percentage=pct, predicted_default_risk=predicted)
+        Loan.objects.filter(loan_id='STL4').update(status='Paid', outstanding_amount=0)
+        Loan.objects.update(recovery_channel='reminders', collection_priority=0)  # stale values
+
+        counts = assign_book(chunk_size=2)
+        self.assertEqual(counts, {'legal': 1, 'settlement': 1, 'reminders': 2, 'closed': 1})
+        loan = Loan.objects.get(loan_id='STL2')
+        self.assertEqual((loan.recovery_channel, loan.settlement_discount, loan.settlement_amount), ('settlement', 15, Decimal('2550.00')))
+
+        self.client.force_login(user)
+        response = self.client.get(reverse('collection_worklist'))
+        # Expected loss: 0.6 x 3000 > 0.8 x 2000 > 0.3 x 4000 > 0.2 x 1000
+        self.assertEqual([l.loan_id for l in response.context['page_obj']], ['STL2', 'STL1', 'STL3', 'STL0'])
+        response = self.client.get(reverse('collection_worklist') + '?channel=legal')
+        self.assertEqual([l.loan_id for l in response.context['page_obj']], ['STL1'])
+
+        # Single-loan paths use the same rules
+        self.assertEqual(ml_system.recommend_channel(0.8, 0)['method'], 'Immediate Legal Action')
+        self.assertEqual(ml_system.recommend_channel(0.8, 0, outstanding_amount=0)['method'], 'Loan Closed')
+        response = self.client.get(reverse('generate_settlement', args=[loan.pk]))
+        self.assertEqual(response.context['discount_percent'], 15)
+        self.assertEqual(response.context['settlement_amount'], Decimal('2550.00'))
+    def test_backfill_migration_matches_assign(self):
+        import importlib
+        from django.apps import apps
+        from django.test import override_settings
+        from .strategy import STRATEGY_FIELDS, apply_to_loans
+
+        borrower = Client.objects.create(client_id='RS_BF', name='Backfill', monthly_income=50000)
+        # (risk_percentage, predicted_default_risk, dpd, outstanding, status)
+        cases = [(90.0, 0.0, 0, 1000, 'Active'), (75.0, 0.9, 0, 1000, 'Active'), (None, 0.6, 0, 1234.56, 'Active'),
+                 (10.0, 0.0, 120, 1000, 'Defaulted'), (None, 0.0, 0, 1000, 'Active'), (95.0, 0.0, 0, 0, 'Active'),
+                 (95.0, 0.0, 0, 500, 'Paid'), (49.0, 0.0, 0, 777.77, 'Active'), (None, 0.8, 0, 333.33, 'Active')]
+        for n, (pct, predicted, dpd, outstanding, status) in enumerate(cases):
+            Loan.objects.create(loan_id=f'RS_BF{n}', client=borrower, amount=2000, tenure=12, interest_rate=10,
+                                risk_percentage=pct, predicted_default_risk=predicted, days_past_due=dpd,
+                                outstanding_amount=outstanding, monthly_emi=100, status=status)
+        loans = list(Loan.objects.filter(client=borrower).order_by('id'))
+        apply_to_loans(loans)
+        expected = [tuple(getattr(loan, field) for field in STRATEGY_FIELDS) for loan in loans]
+
+        Loan.objects.update(recovery_channel='reminders', settlement_discount=0, settlement_amount=0, collection_priority=0)
+        migration = importlib.import_module('core.migrations.0010_recovery_strategy')
+        # Settings changed since 0010 must not change what it writes
+        with override_settings(RECOVERY_STRATEGY={'legal_risk': 0.1, 'settlement_risk': 0.05}):
+            migration.backfill_strategies(apps, connection.schema_editor())
+        stored = list(Loan.objects.filter(client=borrower).order_by('id').values_list(*STRATEGY_FIELDS))
+        self.assertEqual([(c, d, a) for c, d, a, _ in stored], [(c, d, a) for c, d, a, _ in expected])
+        for (*_, priority), (*_, expected_priority) in zip(stored, expected):
+            self.assertAlmostEqual(priority, expected_priority, places=2)
+
+
+class ClientAutocompleteTests(TestCase):
+    """The loan form must not render every client; the picker pulls top matches from an indexed search."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('picker', 'p@example.com', 'pass')
+        Client.objects.bulk_create([
+            Client(client_id=f'AC{n:03d}', name=f'Borrower {n}', phone_number=f'0722{n:06d}') for n in range(60)
+        ])
+        cls.wanjiru = Client.objects.create(client_id='AC_W1', name='Wanjiru Kamau', phone_number='0799000111')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def suggest(self, q):
+        response = self.client.get(reverse('client_autocomplete'), {'q': q})
+        return [row['text'] for row in response.json()['results']]
+
+    def test_matches_name_prefix_id_and_phone(self):
+        from .search import AUTOCOMPLETE_LIMIT
+
+        self.assertEqual(self.suggest('wanj'), ['Wanjiru Kamau (AC_W1)'])
+        self.assertEqual(self.suggest('AC_W1'), ['Wanjiru Kamau (AC_W1)'])
+        self.assertEqual(self.suggest('0799'), ['Wanjiru Kamau (AC_W1)'])
+        self.assertEqual(len(self.suggest('Borrower')), AUTOCOMPLETE_LIMIT)
+        self.assertEqual(len(self.suggest('')), AUTOCOMPLETE_LIMIT)
+
+    def test_loan_form_renders_only_the_selected_client(self):
+        response = self.client.get(reverse('create_loan'))
+        self.assertNotContains(response, 'Borrower 1 (AC001)')
+        self.assertContains(response, reverse('client_autocomplete'))
+
+        # Invalid submission re-renders with just the chosen client; unknown ids are rejected
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = self.client.post(reverse('create_loan'), {'loan_id': '', 'client': self.wanjiru.pk, 'amount': '1000'})
+            self.assertContains(response, 'Wanjiru Kamau (AC_W1)')
+            self.assertNotContains(response, 'Borrower 1 (AC001)')
+            response = self.client.post(reverse('create_loan'), {
+                'loan_id': 'LN_AC', 'client': 999999, 'amount': '1000', 'tenure': 12, 'interest_rate': '10', 'collateral_value': '0',
+            })
+        self.assertIn('client', response.context['form'].errors)
+
+
+class ClientSearchTests(TestCase):
+    """The client search index follows writes through its triggers; IDs and phone prefixes skip it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.kamau = Client.objects.create(client_id='SR001', name='Wanjiru Kamau', email='wanjiru.kamau@example.com',
+                                          phone_number='0711222333')
+        cls.otieno = Client.objects.create(client_id='SR002', name='Wanjiru Otieno', email='otieno@example.com',
+                                           employment_type='Self-Employed', phone_number='0799888777')
+        cls.akinyi = Client.objects.create(client_id='SR003', name='Akinyi Odhiambo', phone_number='0711999000')
+        cls.loan = Loan.objects.create(loan_id='SR_LOAN', client=cls.akinyi, amount=1000, tenure=12,
+                                       interest_rate=10, outstanding_amount=1000, monthly_emi=100)
+
+    def setUp(self):
+        from .search import get_search_backend
+        self.backend = get_search_backend()
+
+    def names(self, queryset):
+        return [client.name for client in queryset]
+
+    def test_index_follows_insert_rename_and_delete(self):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest("No search index on this database vendor")
+
+        client = Client.objects.create(client_id='SR_NEW', name='Chebet Langat')
+        self.assertEqual(self.backend.client_ids('chebet'), [client.pk])
+
+        client.name = 'Nafula Wekesa'
+        client.save()
+        self.assertEqual(self.backend.client_ids('chebet'), [])
+        self.assertEqual(self.backend.client_ids('nafula'), [client.pk])
+        Client.objects.filter(pk=client.pk).update(name='Moraa Nyamweya')
+        self.assertEqual(self.backend.client_ids('nafula'), [])
+        self.assertEqual(self.backend.client_ids('moraa'), [client.pk])
+
+        client.delete()
+        self.assertEqual(self.backend.client_ids('moraa'), [])
+        if connection.vendor == 'sqlite':
+            # The FTS5 index itself (not the LIKE fallback) holds exactly the live clients
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT rowid FROM core_client_search WHERE core_client_search MATCH 'wanjiru'")
+                self.assertEqual(sorted(row[0] for row in cursor.fetchall()), [self.kamau.pk, self.otieno.pk])
+
+    def test_results_are_ranked(self):
+        from .search import search_clients, search_loans
+
+        # Both names match; Kamau also matches in the email, so ranks first
+        self.assertEqual(self.names(search_clients(Client.objects.all(), 'wanjiru')), ['Wanjiru Kamau', 'Wanjiru Otieno'])
+        # Prefix matching on every token
+        self.assertEqual(self.names(search_clients(Client.objects.all(), 'wanj otie')), ['Wanjiru Otieno'])
+        self.assertEqual(self.names(search_clients(Client.objects.all(), 'self-employed')), ['Wanjiru Otieno'])
+        self.assertEqual(list(search_clients(Client.objects.all(), 'nobody')), [])
+        self.assertEqual(list(search_loans(Loan.objects.all(), 'akinyi')), [self.loan])
+
+    def test_exact_ids_and_phone_prefixes_skip_the_index(self):
+        from django.db.models import Q
+        from .search import search_clients, search_loans
+
+        def run(fn, *args):
+            with CaptureQueriesContext(connection) as ctx:
+                result = list(fn(*args))
+            self.assertFalse([q for q in ctx.captured_queries if 'core_client_search' in q['sql'] or 'search_vector' in q['sql']])
+            return result
+
+        # A client ID wins even when names in the index would match other clients
+        Client.objects.create(client_id='SR_X', name='SR001 Namesake')
+        self.assertEqual(run(search_clients, Client.objects.all(), 'SR001'), [self.kamau])
+        self.assertEqual(run(search_clients, Client.objects.all(), '0711'), [self.akinyi, self.kamau])
+        self.assertEqual(run(search_clients, Client.objects.all(), '0711-222'), [self.kamau])
+        self.assertEqual(run(search_clients, Client.objects.filter(~Q(pk=self.akinyi.pk)), '0711'), [self.kamau])
+
+        self.assertEqual(run(search_loans, Loan.objects.all(), f'#{self.loan.pk}'), [self.loan])
+        self.assertEqual(run(search_loans, Loan.objects.all(), 'SR_LOAN'), [self.loan])
+        self.assertEqual(run(search_loans, Loan.objects.all(), 'SR003'), [self.loan])
+        self.assertEqual(run(search_loans, Loan.objects.all(), '0711 999'), [self.loan])
+
+
+class RiskBandTests(TestCase):
+    """Loans carry a stored risk band that filters and counts on /loans/ and re-bands in one UPDATE."""
+
+    # (risk_percentage, status, outstanding) -> band under the default 40 / 70 thresholds
+    CASES = [
+        (None, 'Active', 1000, 'pending'),
+        (0.0, 'Active', 1000, 'low'),
+        (39.9, 'Active', 1000, 'low'),
+        (40.0, 'Active', 1000, 'medium'),
+        (69.9, 'Defaulted', 1000, 'medium'),
+        (70.0, 'Active', 1000, 'high'),
+        (95.0, 'Paid', 1000, 'closed'),
+        (95.0, 'Active', 0, 'closed'),
+        (None, 'Active', 0, 'closed'),
+    ]
+
+    def setUp(self):
+        self.borrower = Client.objects.create(client_id='RB1', name='Band', monthly_income=50000)
+        self.loans = [
+            Loan.objects.create(loan_id=f'RB{n}', client=self.borrower, amount=1000, tenure=12, interest_rate=10,
+                                outstanding_amount=outstanding, monthly_emi=100, status=status, risk_percentage=risk)
+            for n, (risk, status, outstanding, _) in enumerate(self.CASES)
+        ]
+
+    def test_compute_risk_band(self):
+        from django.test import override_settings
+        from .models import compute_risk_band
+
+        for risk, status, outstanding, band in self.CASES:
+            self.assertEqual(compute_risk_band(risk, status, outstanding), band, (risk, status, outstanding))
+        with override_settings(RISK_BAND_THRESHOLDS={'medium': 20, 'high': 50}):
+            self.assertEqual(compute_risk_band(39.9, 'Active', 1000), 'medium')
+            self.assertEqual(compute_risk_band(50.0, 'Active', 1000), 'high')
+        # Saving a loan stores its band
+        self.assertEqual([loan.risk_band for loan in self.loans], [band for *_, band in self.CASES])
+
+    def test_rebuild_matches_compute_and_follows_thresholds(self):
+        from django.core.management import call_command
+        from django.test import override_settings
+        from .models import compute_risk_band
+
+        Loan.objects.update(risk_band='pending')
+        self.assertEqual(Loan.objects.rebuild_risk_bands(), len(self.CASES))
+        stored = dict(Loan.objects.values_list('loan_id', 'risk_band'))
+        self.assertEqual([stored[loan.loan_id] for loan in self.loans], [band for *_, band in self.CASES])
+
+        out = io.StringIO()
+        with override_settings(RISK_BAND_THRESHOLDS={'medium': 20, 'high': 50}):
+            call_command('rebuild_risk_bands', stdout=out)
+            for loan in Loan.objects.all():
+                self.assertEqual(loan.risk_band,
+                                 compute_risk_band(loan.risk_percentage, loan.status, loan.outstanding_amount))
+        self.assertIn(f'Re-banded {len(self.CASES)} loans (medium >= 20%, high >= 50%)', out.getvalue())
+
+    def test_backfill_migration_uses_frozen_thresholds(self):
+        import importlib
+        from django.apps import apps
+        from django.test import override_settings
+
+        migration = importlib.import_module('core.migrations.0007_loan_risk_band')
+        Loan.objects.update(risk_band='pending')
+        # Thresholds changed since 0007 must not change what it writes
+        with override_settings(RISK_BAND_THRESHOLDS={'medium': 1, 'high': 2}):
+            migration.backfill_risk_bands(apps, connection.schema_editor())
+        stored = dict(Loan.objects.values_list('loan_id', 'risk_band'))
+        self.assertEqual([stored[loan.loan_id] for loan in self.loans], [band for *_, band in self.CASES])
+
+    def test_loan_list_risk_filter_and_band_counts(self):
+        user = User.objects.create_superuser('bands', 'bands@example.com', 'pass')
+        self.client.force_login(user)
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = self.client.get(reverse('loan_list'), {'risk': 'closed'})
+        self.assertEqual(response.context['band_counts'], {'pending': 1, 'low': 2, 'medium': 2, 'high': 1, 'closed': 3})
+        self.assertEqual(sorted(loan.loan_id for loan in response.context['page_obj']), ['RB6', 'RB7', 'RB8'])
+
+        # Counts follow the status filter; an unknown band is ignored rather than emptying the list
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = self.client.get(reverse('loan_list'), {'status': 'Defaulted', 'risk': 'bogus'})
+        self.assertEqual(response.context['band_counts'], {'medium': 1})
+        self.assertEqual([loan.loan_id for loan in response.context['page_obj']], ['RB4'])
+
+
+class LoanAgingTests(TestCase):
+    """DPD, missed instalments and defaults roll forward from the repayment schedule and payments."""
+
+    def test_age_follows_the_schedule(self):
+        from datetime import date
+        from .aging import age
+
+        result = age(
+            created=['2024-01-31', '2024-01-15', '2024-01-15', '2024-01-15', '2023-01-15', '2024-06-01'],
+            tenure=[12, 12, 12, 12, 6, 12],
+            monthly_emi=[100, 100, 100, 100, 100, 100],
+            paid=[0, 300, 199.99, 0, 0, 0],
+            as_of=date(2024, 4, 20),
+        )
+        # Jan 31 + 1 month falls due on Feb 29; three instalments due by Apr 20
+        self.assertEqual(list(result['due']), [2, 3, 3, 3, 6, 0])
+        self.assertEqual(list(result['missed']), [2, 0, 1, 3, 6, 0])
+        self.assertEqual(list(result['days_past_due']), [51, 0, 5, 65, 430, 0])
+
+    def test_age_book_updates_open_loans_in_chunks(self):
+        from datetime import date, datetime, timezone as dt_timezone
+        from .aging import age_book
+
+        borrower = Client.objects.create(client_id='AG1', name='Aging')
+        terms = {'client': borrower, 'amount': 1200, 'tenure': 12, 'interest_rate': 10, 'monthly_emi': 100,
+                 'outstanding_amount': 1200, 'risk_percentage': 20.0}
+        for n in range(5):
+            Loan.objects.create(loan_id=f'AG{n}', **terms)
+        Loan.objects.filter(loan_id='AG4').update(status='Paid', outstanding_amount=0, days_past_due=7)
+        Loan.objects.update(created_at=datetime(2024, 1, 10, tzinfo=dt_timezone.utc))
+        Loan.objects.filter(loan_id='AG3').update(created_at=datetime(2024, 6, 1, tzinfo=dt_timezone.utc),
+                                                  days_past_due=40, missed_payments=1)
+        Payment.objects.create(loan=Loan.objects.get(loan_id='AG0'), amount_paid=300, reference_number='AGP0')
+        Payment.objects.create(loan=Loan.objects.get(loan_id='AG1'), amount_paid=100, reference_number='AGP1')
+
+        with CaptureQueriesContext(connection) as ctx:
+            counts = age_book(as_of=date(2024, 6, 20), chunk_size=2)
+        self.assertEqual(counts, {'aged': 3, 'updated': 3, 'defaulted': 2})
+        self.assertLessEqual(len(ctx), 3 * 4 + 1)  # per chunk: loans, payment totals, UPDATE (+ savepoint)
+
+        loans = {l.loan_id: l for l in Loan.objects.all()}
+        self.assertEqual((loans['AG0'].missed_payments, loans['AG0'].days_past_due, loans['AG0'].status), (2, 41, 'Active'))
+        self.assertEqual((loans['AG1'].missed_payments, loans['AG1'].days_past_due, loans['AG1'].status), (4, 102, 'Defaulted'))
+        self.assertEqual(loans['AG1'].recovery_channel, 'legal')
+        self.assertEqual((loans['AG2'].missed_payments, loans['AG2'].days_past_due, loans['AG2'].status), (5, 131, 'Defaulted'))
+        # No instalment due yet / closed: left as stored
+        self.assertEqual((loans['AG3'].missed_payments, loans['AG3'].days_past_due), (1, 40))
+        self.assertEqual(loans['AG4'].days_past_due, 7)
+
+        # A second run with nothing new to record writes nothing
+        self.assertEqual(age_book(as_of=date(2024, 6, 20))['updated'], 0)
+
+    def test_imported_arrears_roll_forward_instead_of_resetting(self):
+        from datetime import date, datetime, timezone as dt_timezone
+        from .aging import age, age_book
+
+        # 120 DPD / 6 missed on import (Sep 1): by Oct 19 that is 168 DPD and 7 missed, not 18 / 1
+        result = age(['2026-09-01'], [12], [100.0], [0.0], '2026-10-19', opening_missed=[6], opening_dpd=[120])
+        self.assertEqual((list(result['missed']), list(result['days_past_due'])), ([7], [168]))
+        self.assertEqual(list(age(['2026-09-01'], [12], [100.0], [0.0], '2026-10-19')['days_past_due']), [18])
+        # Payments clear the oldest arrears first
+        result = age(['2026-09-01'], [12], [100.0], [200.0], '2026-10-19', opening_missed=[6], opening_dpd=[120])
+        self.assertEqual((list(result['missed']), list(result['days_past_due'])), ([5], [107]))
+
+        user = User.objects.create_superuser('aging', 'ag@example.com', 'pass')
+        self.client.force_login(user)
+        csv_text = ("Borrower_ID,Borrower_Name,Age,Monthly_Income,Loan_ID,Loan_Amount,Loan_Tenure,"
+                    "Interest_Rate,Monthly_EMI,Num_Missed_Payments,Days_Past_Due\n"
+                    "AGI1,Imported,40,50000,AGIL1,1200,12,10,100,6,120\n")
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.client.post(reverse('upload_portfolio'),
+                             {'csv_file': SimpleUploadedFile('import.csv', csv_text.encode(), content_type='text/csv')})
+        loan = Loan.objects.get(loan_id='AGIL1')
+        self.assertEqual((loan.opening_missed_payments, loan.opening_days_past_due, loan.status), (6, 120, 'Defaulted'))
+
+        Loan.objects.filter(pk=loan.pk).update(created_at=datetime(2026, 9, 1, tzinfo=dt_timezone.utc))
+        age_book(as_of=date(2026, 9, 1))
+        loan.refresh_from_db()
+        self.assertEqual((loan.missed_payments, loan.days_past_due), (6, 120))  # nothing lost on the first run
+        age_book(as_of=date(2026, 10, 19))
+        loan.refresh_from_db()
+        self.assertEqual((loan.missed_payments, loan.days_past_due, loan.status), (7, 168, 'Defaulted'))
+
+    def test_generated_book_keeps_its_arrears(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .aging import age_book
+        from .synthetic import write_database
+
+        write_database(300, seed=1)
+        before = {pk: (dpd, missed) for pk, dpd, missed in Loan.objects.filter(days_past_due__gt=0)
+                  .values_list('id', 'days_past_due', 'missed_payments')}
+        self.assertGreater(len(before), 0)
+
+        # Forty days on, every overdue loan is further behind, not cleared by payments made before it was created
+        age_book(as_of=timezone.localdate() + timedelta(days=40))
+        after = dict((pk, (dpd, missed)) for pk, dpd, missed in Loan.objects.filter(id__in=before)
+                     .values_list('id', 'days_past_due', 'missed_payments'))
+        for pk, (dpd, missed) in before.items():
+            self.assertGreaterEqual(after[pk][0], dpd + 40)
+            self.assertGreaterEqual(after[pk][1], max(missed, 1))
+
+
+class AmortizationTests(TestCase):
+    """Flat and reducing-balance schedules are built in one NumPy pass and only regenerated when terms change."""
+
+    def test_schedules_add_up_for_both_methods(self):
+        from .amortization import build_schedules, installment_amount
+
+        schedule = build_schedules([1200, 10000, 500], [12, 12, 0], [12, 6, 3],
+                                   ['2024-01-31', '2024-01-15', '2024-03-01'], ['flat', 'reducing', 'reducing'])
+        self.assertEqual(list(np.bincount(schedule['loan'])), [12, 6, 3])
+        self.assertEqual(list(np.bincount(schedule['loan'], weights=schedule['principal']).round(2)), [1200, 10000, 500])
+        self.assertEqual(str(schedule['due_date'][0]), '2024-02-29')  # Jan 31 + 1 month
+        self.assertEqual(list(schedule['amount'][:12]), [112.0] * 12)  # flat: 100 principal + 12 interest
+        reducing = schedule['loan'] == 1
+        self.assertEqual(list(schedule['interest'][reducing]), [100.0, 83.75, 67.33, 50.75, 34.0, 17.08])
+        self.assertTrue(np.all(np.abs(schedule['amount'][reducing] - 1725.48) <= 0.011))
+        self.assertEqual(schedule['balance'][reducing][-1], 0.0)
+        self.assertAlmostEqual(float(installment_amount(10000, 12, 6, 'reducing')), 1725.48, places=2)
+        self.assertEqual(float(installment_amount(1200, 12, 12)), 112.0)
+
+    def test_create_loan_stores_its_schedule_and_sync_only_rebuilds_changed_terms(self):
+        from .amortization import sync_schedules
+
+        user = User.objects.create_superuser('amort', 'a@example.com', 'pass')
+        borrower = Client.objects.create(client_id='AM1', name='Schedule', monthly_income=50000)
+        self.client.force_login(user)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.client.post(reverse('create_loan'), {
+                'loan_id': 'AML1', 'client': borrower.pk, 'amount': '12000', 'tenure': 12, 'interest_rate': '12',
+                'amortization_method': 'reducing', 'collateral_value': '0',
+            })
+        loan = Loan.objects.get(loan_id='AML1')
+        self.assertEqual(loan.monthly_emi, Decimal('1066.19'))
+        self.assertEqual(loan.installments.count(), 12)
+        self.assertEqual(loan.installments.last().balance, Decimal('0.00'))
+        Loan.objects.create(loan_id='AML2', client=borrower, amount=600, tenure=6, interest_rate=10,
+                            outstanding_amount=600, monthly_emi=105)
+
+        # Only the loan without a schedule is built; a second pass has nothing to do
+        self.assertEqual(sync_schedules(chunk_size=1), {'loans': 2, 'regenerated': 1, 'installments': 6})
+        self.assertEqual(sync_schedules()['regenerated'], 0)
+
+        Loan.objects.filter(loan_id='AML1').update(tenure=6)
+        self.assertEqual(sync_schedules(), {'loans': 2, 'regenerated': 1, 'installments': 6})
+        self.assertEqual(Installment.objects.filter(loan=loan).count(), 6)
+        self.assertEqual(sum(i.principal for i in loan.installments.all()), Decimal('12000.00'))
+
+
+class CashFlowForecastTests(TestCase):
+    """Monte Carlo collections projection: contractual payments shrink with default risk, bands bracket the mean."""
+
+    def test_simulation_follows_schedule_defaults_and_recovery_lag(self):
+        from .forecast import simulate_chunk
+
+        rng = np.random.default_rng(0)
+        cash = simulate_chunk([1000, 250], [100, 100], [0.0, 0.0], np.ones(2), 4, 0.5, 2, rng)
+        self.assertEqual(cash.tolist(), [[200, 200, 150, 100]] * 2)  # the 250 loan repays in three months
+        cash = simulate_chunk([1000], [100], [1.0], np.ones(3), 4, 0.5, 2, rng)
+        self.assertEqual(cash.tolist(), [[0, 0, 500, 0]] * 3)  # defaults at once, half recovered two months on
+
+    def test_book_forecast_is_banded_and_stored_by_the_command(self):
+        from datetime import date
+        from django.core.management import call_command
+        from .forecast import compute_forecast, get_forecast
+        from .ml_utils import ml_system
+        from .models import CashFlowForecast
+
+        borrower = Client.objects.create(client_id='FC1', name='Forecast')
+        for n, pct in enumerate([5.0, 50.0, 90.0, None]):
+            Loan.objects.create(loan_id=f'FCL{n}', client=borrower, amount=12000, tenure=12, interest_rate=10,
+                                outstanding_amount=12000, monthly_emi=1000, risk_percentage=pct)
+        Loan.objects.create(loan_id='FCL_PAID', client=borrower, amount=1000, tenure=12, interest_rate=10,
+                            outstanding_amount=0, monthly_emi=100, status='Paid')
+
+        # Nothing is simulated on read: no forecast until one has been computed
+        self.assertIsNone(get_forecast('v1'))
+        compute_forecast('v1', as_of=date(2026, 10, 19))
+        forecast = get_forecast('v1')
+        self.assertEqual((forecast['loans'], len(forecast['months'])), (4, 12))
+        self.assertEqual((forecast['as_of'], forecast['months'][0]['month']), (date(2026, 10, 19), 'Nov 2026'))
+        self.assertIsNotNone(forecast['computed_at'])
+        first = forecast['months'][0]
+        self.assertEqual(first['scheduled'], 4000.0)
+        self.assertLess(first['expected'], first['scheduled'])
+        self.assertLessEqual(first['p5'], first['expected'])
+        self.assertLessEqual(first['expected'], first['p95'])
+        total = forecast['total']
+        self.assertLess(total['p5'], total['p95'])
+        self.assertLess(total['expected'], total['scheduled'])
+
+        # Reads are one query and ignore book changes until the next run; other model versions have none
+        Loan.objects.filter(loan_id='FCL2').update(risk_percentage=10.0)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(get_forecast('v1'), forecast)
+        self.assertEqual(len(ctx), 1)
+        self.assertIsNone(get_forecast('v2'))
+
+        # Re-running the same day replaces that day's row; a later day becomes the latest
+        compute_forecast('v1', as_of=date(2026, 10, 19))
+        self.assertEqual(CashFlowForecast.objects.count(), 1)
+        self.assertGreater(get_forecast('v1')['total']['expected'], total['expected'])
+        compute_forecast('v1', as_of=date(2026, 10, 20))
+        self.assertEqual(get_forecast('v1')['as_of'], date(2026, 10, 20))
+
+        # A different config has no stored forecast yet
+        with self.settings(CASHFLOW_FORECAST={'scenarios': 50}):
+            self.assertIsNone(get_forecast('v1'))
+
+        # The command stores the active model's forecast, which the reports page only reads
+        out = io.StringIO()
+        call_command('forecast_collections', stdout=out)
+        self.assertIn('✅ Forecast', out.getvalue())
+        self.assertTrue(CashFlowForecast.objects.filter(model_version=ml_system.model_version or '').exists())
+        user = User.objects.create_superuser('forecast', 'fc@example.com', 'pass')
+        self.client.force_login(user)
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = self.client.get(reverse('reports'))
+        self.assertContains(response, 'Projected Collections (next 12 months)')
+        self.assertContains(response, 'computed')
+        CashFlowForecast.objects.all().delete()
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = self.client.get(reverse('reports'))
+        self.assertContains(response, 'manage.py forecast_collections')
+        self.assertFalse(CashFlowForecast.objects.exists())
+
+
+class CohortAnalyticsTests(TestCase):
+    """Daily snapshots feed roll-rate matrices and vintage curves without scanning loan history per request."""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def test_snapshots_roll_rates_vintages_and_report(self):
+        from datetime import date, datetime, timezone as dt_timezone
+        from .cohorts import cohort_report, take_snapshot
+        from .models import LoanSnapshot
+
+        borrower = Client.objects.create(client_id='CO1', name='Cohort')
+        for n in range(4):
+            Loan.objects.create(loan_id=f'COL{n}', client=borrower, amount=1000, tenure=12, interest_rate=10,
+                                outstanding_amount=1000, monthly_emi=100)
+        Loan.objects.update(created_at=datetime(2024, 1, 20, tzinfo=dt_timezone.utc))
+
+        self.assertEqual(take_snapshot(date(2024, 2, 29), chunk_size=2), 4)
+        Loan.objects.filter(loan_id='COL0').update(days_past_due=35)
+        Loan.objects.filter(loan_id='COL1').update(days_past_due=95)
+        Loan.objects.filter(loan_id='COL2').update(status='Paid', outstanding_amount=0)
+        self.assertEqual(take_snapshot(date(2024, 3, 31)), 4)
+        self.assertEqual(take_snapshot(date(2024, 3, 31)), 4)  # re-running a day replaces it
+        self.assertEqual(LoanSnapshot.objects.count(), 8)
+        snapshot = LoanSnapshot.objects.get(loan__loan_id='COL1', snapshot_date=date(2024, 3, 31))
+        self.assertEqual((snapshot.bucket, snapshot.vintage), ('90', date(2024, 1, 1)))
+
+        report = cohort_report()
+        rolls = report['roll_rates']
+        self.assertEqual((rolls['from_date'], rolls['to_date']), (date(2024, 2, 29), date(2024, 3, 31)))
+        self.assertEqual(rolls['rows'][0]['loans'], 4)
+        self.assertEqual(rolls['rows'][0]['rates'], [25.0, 25.0, 0.0, 25.0, 25.0])  # current -> current/30/60/90+/closed
+        self.assertEqual(report['vintages'], {'2024-01': [(1, 0.0), (2, 50.0)]})
+
+        # Served from the cache: only the latest-snapshot lookup hits the database
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(cohort_report(), report)
+        self.assertEqual(len(ctx), 1)
+
+        user = User.objects.create_superuser('cohort', 'co@example.com', 'pass')
+        self.client.force_login(user)
+        response = self.client.get(reverse('reports'))
+        self.assertContains(response, 'Roll Rates')
+        self.assertIn('vintage_chart', response.context)
+
+
+class PortfolioKPITests(TestCase):
+    """Dashboard KPIs come from one live row kept current by writes, with trends from stored snapshots."""
+
+    def setUp(self):
+        self.borrower = Client.objects.create(client_id='PK1', name='Portfolio', monthly_income=50000)
+        for n, status in enumerate(['Active', 'Active', 'Defaulted', 'Paid']):
+            Loan.objects.create(loan_id=f'PK{n}', client=self.borrower, amount=1000, tenure=12, interest_rate=10,
+                                outstanding_amount=0 if status == 'Paid' else 800, monthly_emi=100, status=status,
+                                days_past_due=10 if n == 1 else 0)
+        self.other = Client.objects.create(client_id='PK2C', name='Other', monthly_income=50000)
+        Loan.objects.create(loan_id='PK4', client=self.other, amount=1000, tenure=12, interest_rate=10,
+                            outstanding_amount=800, monthly_emi=100)
+
+    def test_live_totals_follow_writes_and_snapshot_corrects_drift(self):
+        from .models import PortfolioSnapshot
+        from .portfolio import compute_kpis, live_kpis, take_portfolio_snapshot
+
+        expected = {'total_loans': 5, 'active_loans': 3, 'defaulted_loans': 1, 'paid_loans': 1, 'overdue_loans': 1,
+                    'total_disbursed': Decimal('5000.00'), 'total_outstanding': Decimal('3200.00')}
+        self.assertEqual(compute_kpis(), expected)
+        self.assertEqual(live_kpis(), expected)  # bootstrapped on first read
+
+        user = User.objects.create_superuser('kpi', 'kpi@example.com', 'pass')
+        self.client.force_login(user)
+        self.client.post(reverse('create_loan'), {'loan_id': 'PK_NEW', 'client': self.borrower.pk, 'amount': '5000',
+                                                  'tenure': 10, 'interest_rate': '12.0', 'collateral_value': '0'})
+        self.client.post(reverse('add_payment', args=[Loan.objects.get(loan_id='PK0').pk]),
+                         {'amount_paid': '800.00', 'reference_number': 'PKP0'})
+        self.client.post(reverse('delete_client', args=[self.other.pk]))
+        self.assertEqual(live_kpis(), compute_kpis())
+        self.assertEqual((live_kpis()['total_loans'], live_kpis()['paid_loans']), (5, 2))
+
+        # A write that bypasses the counters drifts until the scheduled snapshot re-bases them
+        Loan.objects.filter(loan_id='PK1').update(status='Defaulted')
+        self.assertNotEqual(live_kpis(), compute_kpis())
+        snapshot, drift = take_portfolio_snapshot()
+        self.assertEqual(drift, {'active_loans': -1, 'defaulted_loans': 1, 'overdue_loans': -1})
+        self.assertEqual(live_kpis(), compute_kpis())
+        self.assertEqual(PortfolioSnapshot.objects.latest().pk, snapshot.pk)
+
+    def test_aging_moves_status_counters(self):
+        from datetime import date, datetime, timezone as dt_timezone
+        from .aging import age_book
+        from .portfolio import compute_kpis, live_kpis
+
+        Loan.objects.update(created_at=datetime(2024, 1, 10, tzinfo=dt_timezone.utc))
+        live_kpis()
+        self.assertEqual(age_book(as_of=date(2024, 9, 20))['defaulted'], 3)
+        self.assertEqual(live_kpis(), compute_kpis())
+
+    def test_dashboard_reads_totals_and_trends(self):
+        from .models import PortfolioSnapshot
+        from .portfolio import KPI_FIELDS, compute_kpis
+
+        kpis = compute_kpis()
+        PortfolioSnapshot.objects.create(**{**kpis, 'total_loans': 2})
+        user = User.objects.create_superuser('kpidash', 'kd@example.com', 'pass')
+        self.client.force_login(user)
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['total_loans'], 5)
+        self.assertEqual(response.context['active_defaults'], 2)
+        trend = response.context['trends']['total_loans']
+        self.assertEqual((trend['values'], trend['change']), ([2.0, 5.0], 150.0))
+        self.assertEqual(set(KPI_FIELDS) - set(response.context['trends']), set())
+        self.assertContains(response, 'data-kpi="total_disbursed"')
+
+
+class AnalyticsDatasetTests(TestCase):
+    """The portfolio exports to a typed columnar dataset that loads only the requested columns."""
+
+    def setUp(self):
+        import tempfile
+        self.root = tempfile.mkdtemp()
+        borrower = Client.objects.create(client_id='AD1', name='Analytics', age=40, monthly_income=60000)
+        for n, (history, recovery) in enumerate([('On-Time', 'Pending'), ('Missed', 'Fully Recovered'),
+                                                 ('Missed', 'Pending')]):
+            Loan.objects.create(loan_id=f'AD{n}', client=borrower, amount=1000 * (n + 1), tenure=12, interest_rate=10,
+                                outstanding_amount=500, monthly_emi=100, payment_history=history,
+                                recovery_status=recovery, days_past_due=n)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def check_export(self, fmt):
+        from .columnar import export_analytics, load_analytics
+
+        path = os.path.join(self.root, fmt)
+        self.assertIsNone(load_analytics(path))
+        meta = export_analytics(path, fmt=fmt, chunk_size=2)
+        self.assertEqual(meta['rows'], 3)
+        self.assertEqual(sorted(meta['categories']['Payment_History']), ['Missed', 'On-Time'])
+
+        df = load_analytics(path, columns=['Payment_History', 'Loan_Amount', 'Days_Past_Due'])
+        self.assertEqual(list(df.columns), ['Payment_History', 'Loan_Amount', 'Days_Past_Due'])
+        self.assertEqual(str(df['Payment_History'].dtype), 'category')
+        self.assertEqual(df['Payment_History'].tolist(), ['On-Time', 'Missed', 'Missed'])
+        self.assertEqual(df['Loan_Amount'].tolist(), [1000.0, 2000.0, 3000.0])
+        self.assertEqual(str(df['Days_Past_Due'].dtype), 'int32')
+
+        # A re-export replaces the dataset in place
+        Loan.objects.filter(loan_id='AD0').delete()
+        self.assertEqual(export_analytics(path, fmt=fmt)['rows'], 2)
+        self.assertEqual(len(load_analytics(path, columns=['Age'])), 2)
+
+    def test_npy_export_round_trips(self):
+        self.check_export('npy')
+
+    def test_parquet_export_round_trips(self):
+        from .columnar import available_formats
+        if 'parquet' not in available_formats():
+            self.skipTest("pyarrow is not installed")
+        self.check_export('parquet')
+
+    def test_analytics_frame_prefers_the_exported_dataset(self):
+        from django.test import override_settings
+        from .columnar import export_analytics
+        from .ml_utils import LoanMLSystem
+
+        path = os.path.join(self.root, 'dataset')
+        system = LoanMLSystem.__new__(LoanMLSystem)
+        system._analytics_frames, system._analytics_state = {}, None
+        with override_settings(ANALYTICS_DATASET_DIR=path):
+            # Nothing exported yet: the bundled CSV, projected to the requested columns
+            csv_frame = system.analytics_frame(['Recovery_Status', 'Loan_Amount'])
+            self.assertEqual(list(csv_frame.columns), ['Recovery_Status', 'Loan_Amount'])
+            self.assertGreater(len(csv_frame), 3)
+
+            export_analytics(path, fmt='npy')
+            frame = system.analytics_frame(['Recovery_Status', 'Loan_Amount'])
+            self.assertEqual(frame['Recovery_Status'].tolist(), ['Pending', 'Fully Recovered', 'Pending'])
+            self.assertIs(system.analytics_frame(['Recovery_Status', 'Loan_Amount']), frame)
+
+
+class ConnectionPoolingTests(TestCase):
+    """DB_POOL_MODE maps to safe connection settings, and the per-worker pool bounds open connections."""
+
+    class FakeConnection:
+        def __init__(self):
+            self.closed = 0
+
+        def close(self):
+            self.closed = 1
+
+    def test_pool_modes(self):
+        from django.core.exceptions import ImproperlyConfigured
+        from intellidebt.db_pool import POOLED_ENGINE, configure_database
+
+        postgres = {'ENGINE': 'django.db.backends.postgresql', 'NAME': 'intellidebt', 'OPTIONS': {}}
+        sqlite = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'db.sqlite3'}
+
+        persistent = configure_database(sqlite, 'persistent', conn_max_age=600)
+        self.assertEqual((persistent['CONN_MAX_AGE'], persistent['CONN_HEALTH_CHECKS']), (600, True))
+        # A frozen lambda can't close its socket: never keep connections between invocations
+        serverless = configure_database(postgres, 'pgbouncer', conn_max_age=600, serverless=True)
+        self.assertEqual((serverless['CONN_MAX_AGE'], serverless['DISABLE_SERVER_SIDE_CURSORS']), (0, True))
+
+        pooled = configure_database(postgres, 'pool', pool_size=3)
+        self.assertEqual((pooled['ENGINE'], pooled['CONN_MAX_AGE'], pooled['POOL_SIZE']), (POOLED_ENGINE, 0, 3))
+        self.assertEqual(postgres['ENGINE'], 'django.db.backends.postgresql')  # input left untouched
+        with self.assertRaises(ImproperlyConfigured):
+            configure_database(sqlite, 'pool')
+        with self.assertRaises(ImproperlyConfigured):
+            configure_database(sqlite, 'pooled')
+
+    def test_pool_reuses_and_bounds_connections(self):
+        from intellidebt.db_pool import ConnectionPool, PoolTimeout
+
+        pool = ConnectionPool(size=2, timeout=0.05)
+        first = pool.acquire(self.FakeConnection)
+        second = pool.acquire(self.FakeConnection)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(self.FakeConnection)
+
+        pool.release(first)
+        self.assertIs(pool.acquire(self.FakeConnection), first)
+        self.assertEqual(pool.stats()['opened'], 2)
+
+        # Discarded or closed connections are replaced, not handed out again
+        pool.release(first, discard=True)
+        second.closed = 1
+        pool.release(second)
+        self.assertTrue(first.closed)
+        replacement = pool.acquire(self.FakeConnection)
+        self.assertIsNot(replacement, second)
+        self.assertEqual(pool.stats(), {'size': 2, 'idle': 0, 'opened': 3})
+
+    def test_stale_idle_connections_are_closed(self):
+        from intellidebt.db_pool import ConnectionPool
+
+        pool = ConnectionPool(size=1, timeout=0.05, max_idle=0)
+        connection = pool.acquire(self.FakeConnection)
+        pool.release(connection)
+        self.assertIsNot(pool.acquire(self.FakeConnection), connection)
+        self.assertTrue(connection.closed)
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    """Analytical reads go to the replica when one is configured; writes, transactions and recent writers stay on the primary."""
+
+    REPLICA_DATABASES = {**settings.DATABASES, 'replica': {**settings.DATABASES['default']}}
+
+    def test_router_decisions(self):
+        from django.test import override_settings
+        from .db_routing import REPLICA_ALIAS, ReplicaRouter, pin_primary, use_replica
+
+        router = ReplicaRouter()
+        with use_replica():
+            # No replica configured: everything on the primary
+            self.assertIsNone(router.db_for_read(Loan))
+            with override_settings(DATABASES=self.REPLICA_DATABASES):
+                self.assertEqual(router.db_for_read(Loan), REPLICA_ALIAS)
+                self.assertEqual(router.db_for_write(Loan), 'default')
+                with pin_primary():
+                    self.assertIsNone(router.db_for_read(Loan))
+        with override_settings(DATABASES=self.REPLICA_DATABASES):
+            # Outside replica_reads views reads stay on the primary
+            self.assertIsNone(router.db_for_read(Loan))
+        self.assertFalse(router.allow_migrate(REPLICA_ALIAS, 'core'))
+        self.assertTrue(router.allow_migrate('default', 'core'))
+
+    def test_sticky_primary_after_write(self):
+        from django.contrib.sessions.backends.signed_cookies import SessionStore
+        from django.http import HttpResponse
+        from django.test import RequestFactory, override_settings
+        from .db_routing import STICKY_SESSION_KEY, _pin_primary
+        from .middleware import ReplicaStickinessMiddleware
+
+        pinned = []
+
+        def view(request):
+            pinned.append(_pin_primary.get())
+            return HttpResponse()
+
+        middleware = ReplicaStickinessMiddleware(view)
+        session = SessionStore()
+        factory = RequestFactory()
+
+        def send(method):
+            request = getattr(factory, method)('/')
+            request.session = session
+            middleware(request)
+
+        with override_settings(DATABASES=self.REPLICA_DATABASES, REPLICA_STICKY_SECONDS=60):
+            send('get')
+            send('post')
+            send('get')
+        self.assertEqual(pinned, [False, False, True])
+        self.assertIn(STICKY_SESSION_KEY, session)
+
+        # Expired stickiness reads from the replica again
+        session[STICKY_SESSION_KEY] = 0
+        with override_settings(DATABASES=self.REPLICA_DATABASES):
+            send('get')
+        self.assertFalse(pinned[-1])
+
+
+class AsyncViewTests(TransactionTestCase):
+    """The async dashboard and loan detail render what the sync views do, with their queries on the query threads."""
+
+    def setUp(self):
+        borrower = Client.objects.create(client_id='AS1', name='Async Borrower', monthly_income=50000)
+        self.loan = Loan.objects.create(loan_id='AS_LOAN', client=borrower, amount=1000, tenure=12, interest_rate=10,
+                                        outstanding_amount=800, monthly_emi=100)
+        self.other = Loan.objects.create(loan_id='AS_OTHER', client=borrower, amount=500, tenure=6, interest_rate=10,
+                                         outstanding_amount=500, monthly_emi=90)
+        self.payment = Payment.objects.create(loan=self.loan, amount_paid=Decimal('200.00'), reference_number='AS_PAY')
+        self.user = User.objects.create_superuser('async', 'async@example.com', 'pass')
+
+    def render(self, view, path, *args):
+        from asgiref.sync import async_to_sync
+        from django.test import RequestFactory
+
+        request = RequestFactory().get(path)
+        request.user = self.user
+        with contextlib.redirect_stdout(io.StringIO()):
+            return async_to_sync(view)(request, *args)
+
+    def test_async_views_match_sync_views(self):
+        from django.test import override_settings
+        from . import views
+
+        on_request_thread = {}
+        for query_threads in (0, 2):
+            with override_settings(ASYNC_QUERY_THREADS=query_threads), CaptureQueriesContext(connection) as ctx:
+                dashboard = self.render(views.dashboard_async, '/dashboard/')
+                detail = self.render(views.loan_detail_async, f'/loan/{self.loan.pk}/', self.loan.pk)
+            on_request_thread[query_threads] = len(ctx.captured_queries)
+            self.assertEqual(dashboard.status_code, 200)
+            self.assertContains(dashboard, 'Async Borrower')
+            self.assertEqual(detail.status_code, 200)
+            for text in (f'#{self.other.pk}<', f'#TXN-{self.payment.pk:05d}'):
+                self.assertContains(detail, text)
+        # With query threads only the loan lookup stays on the request thread's connection
+        self.assertEqual(on_request_thread[2], 1)
+        self.assertGreater(on_request_thread[0], on_request_thread[2])
+        # Scored and recorded like the sync view; re-viewing unchanged inputs adds no history
+        self.assertEqual(RiskScore.objects.filter(loan=self.loan, source='loan_detail').count(), 1)
+
+    def test_query_thread_queries_are_recorded_in_metrics(self):
+        from django.test import override_settings
+        from . import views
+        from .metrics import end_request, query_timers, start_request
+
+        self.render(views.loan_detail_async, f'/loan/{self.loan.pk}/', self.loan.pk)  # stamps the score once
+        recorded = {}
+        with override_settings(METRICS_ENABLED=True):
+            for query_threads in (0, 2):
+                # As MetricsMiddleware wraps a request: timers on the request thread's connections only
+                with override_settings(ASYNC_QUERY_THREADS=query_threads), query_timers():
+                    token = start_request()
+                    self.render(views.loan_detail_async, f'/loan/{self.loan.pk}/', self.loan.pk)
+                    recorded[query_threads] = end_request(token)['db_queries']
+        # Same view, same queries: counted whether they ran on the request thread or the query threads
+        self.assertGreater(recorded[0], 1)
+        self.assertEqual(recorded[2], recorded[0])
+
+    def test_anonymous_users_are_redirected(self):
+        from asgiref.sync import async_to_sync
+        from django.contrib.auth.models import AnonymousUser
+        from django.test import RequestFactory
+        from . import views
+
+        request = RequestFactory().get('/dashboard/')
+        request.user = AnonymousUser()
+        response = async_to_sync(views.dashboard_async)(request)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(settings.LOGIN_URL, response.url)
+
+
+class MetricsTests(TestCase):
+    """MetricsMiddleware records per-view latency, queries and render time; /metrics/ exports them to staff or the token."""
+
+    def setUp(self):
+        from .metrics import registry
+
+        registry.reset()
+        self.addCleanup(registry.reset)
+        self.staff = User.objects.create_superuser('metrics', 'metrics@example.com', 'pass')
+
+    def test_render_prometheus(self):
+        from .metrics import registry, render_prometheus
+
+        registry.record_request('loan_list', 0.03, {'db_queries': 7, 'db': 0.01, 'ml': 0.0, 'template': 0.02})
+        registry.incr('intellidebt_score_cache_total', {'result': 'hit'}, amount=3)
+        text = render_prometheus()
+        lines = text.splitlines()
+        self.assertIn('# TYPE intellidebt_request_duration_seconds histogram', lines)
+        # Cumulative buckets: 0.03s falls in le=0.05 and above, not le=0.025
+        self.assertIn('intellidebt_request_duration_seconds_bucket{view="loan_list",le="0.025"} 0', lines)
+        self.assertIn('intellidebt_request_duration_seconds_bucket{view="loan_list",le="0.05"} 1', lines)
+        self.assertIn('intellidebt_request_duration_seconds_bucket{view="loan_list",le="+Inf"} 1', lines)
+        self.assertIn('intellidebt_db_queries_per_request_bucket{view="loan_list",le="10"} 1', lines)
+        self.assertIn('intellidebt_template_render_seconds_total{view="loan_list"} 0.02', lines)
+        self.assertIn('intellidebt_score_cache_total{result="hit"} 3', lines)
+        self.assertTrue(text.endswith('\n'))
+
+    def test_middleware_records_requests_and_template_time(self):
+        from django.test import override_settings
+        from .metrics import registry
+
+        self.client.force_login(self.staff)
+        with override_settings(METRICS_ENABLED=True), contextlib.redirect_stdout(io.StringIO()):
+            self.client.get(reverse('loan_list'))
+            self.client.get(reverse('loan_list'))
+        stats = registry.views['loan_list']
+        self.assertEqual(stats.latency.count, 2)
+        self.assertEqual(stats.queries.count, 2)
+        self.assertGreater(stats.queries.total, 0)
+        # Timed by InstrumentedDjangoTemplates, the configured template backend
+        self.assertGreater(stats.template_seconds, 0)
+
+        # Disabled: nothing is recorded
+        registry.reset()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.client.get(reverse('loan_list'))
+        self.assertEqual(registry.views, {})
+
+    def test_template_backend_times_renders(self):
+        from django.template import engines
+        from .metrics import end_request, start_request
+
+        token = start_request()
+        self.assertEqual(engines.all()[0].from_string('{{ value }}').render({'value': 'x'}), 'x')
+        self.assertGreater(end_request(token)['template'], 0)
+
+    def test_endpoint_gating(self):
+        from django.test import override_settings
+
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 404)
+        with override_settings(METRICS_ENABLED=True, METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get(url).status_code, 403)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer s3cretX').status_code, 403)
+            response = self.client.get(url, HTTP_AUTHORIZATION='Bearer s3cret')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+            officer = User.objects.create_user('officer', 'officer@example.com', 'pass')
+            self.client.force_login(officer)
+            self.assertEqual(self.client.get(url).status_code, 403)
+            self.client.force_login(self.staff)
+            self.assertEqual(self.client.get(url).status_code, 200)
+        # No token configured: a bare "Bearer " header is not a credential
+        with override_settings(METRICS_ENABLED=True, METRICS_TOKEN=''):
+            self.client.logout()
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+
+class CursorPaginationTests(TestCase):
+    """Cursor pages walk the book both ways on -id, and a tampered token falls back to the first page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        borrower = Client.objects.create(client_id='CP1', name='Cursor', monthly_income=50000)
+        Loan.objects.bulk_create([
+            Loan(loan_id=f'CP{n:02d}', client=borrower, amount=1000, tenure=12, interest_rate=10,
+                 outstanding_amount=1000, monthly_emi=100)
+            for n in range(25)
+        ])
+        cls.ids = list(Loan.objects.order_by('-id').values_list('id', flat=True))
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def page_ids(self, page):
+        return [loan.id for loan in page]
+
+    def test_next_and_previous_round_trip(self):
+        from .pagination import CursorPaginator
+
+        paginator = CursorPaginator(Loan.objects.all(), 10)
+        first = paginator.get_page()
+        second = paginator.get_page(first.next_cursor)
+        third = paginator.get_page(second.next_cursor)
+        self.assertEqual(self.page_ids(first), self.ids[:10])
+        self.assertEqual(self.page_ids(second), self.ids[10:20])
+        # The last page is short and has no next page; the first has no previous one
+        self.assertEqual(self.page_ids(third), self.ids[20:])
+        self.assertFalse(third.has_next())
+        self.assertFalse(first.has_previous())
+        self.assertEqual(first.approximate_total, 25)
+
+        back = paginator.get_page(third.previous_cursor)
+        self.assertEqual(self.page_ids(back), self.ids[10:20])
+        self.assertTrue(back.has_next() and back.has_previous())
+        start = paginator.get_page(back.previous_cursor)
+        self.assertEqual(self.page_ids(start), self.ids[:10])
+        self.assertFalse(start.has_previous())
+        self.assertEqual(self.page_ids(paginator.get_page(start.next_cursor)), self.ids[10:20])
+
+    def test_exact_page_boundary(self):
+        from .pagination import CursorPaginator
+
+        paginator = CursorPaginator(Loan.objects.all(), 5)
+        page = paginator.get_page()
+        for _ in range(4):
+            page = paginator.get_page(page.next_cursor)
+        # 25 rows in pages of 5: the fifth page is full and is the last one
+        self.assertEqual(self.page_ids(page), self.ids[20:])
+        self.assertFalse(page.has_next())
+
+    def test_tampered_cursors_are_ignored(self):
+        import base64
+        import json
+        from .pagination import decode_cursor, encode_cursor
+
+        def token(raw):
+            return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+        self.assertEqual(decode_cursor(encode_cursor(42, 'p')), (42, 'p'))
+        for bad in ['not-a-cursor!', token('{"id":Infinity,"d":"n"}'), token(json.dumps({'id': 10 ** 26, 'd': 'n'})),
+                    token('{"id":-1,"d":"n"}'), token('{"id":1.5,"d":"n"}'), token('{"id":true,"d":"n"}'),
+                    token('{"id":"7","d":"n"}'), token('[1, 2]'), token('{"d":"n"}')]:
+            self.assertEqual(decode_cursor(bad), (None, None), bad)
+
+        user = User.objects.create_superuser('cursor', 'cursor@example.com', 'pass')
+        self.client.force_login(user)
+        for bad in [token('{"id":Infinity,"d":"n"}'), token(json.dumps({'id': 10 ** 26, 'd': 'p'}))]:
+            with contextlib.redirect_stdout(io.StringIO()):
+                response = self.client.get(reverse('loan_list'), {'cursor': bad})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([loan.id for loan in response.context['page_obj']], self.ids[:20])
+
+    def test_approximate_count_is_cached(self):
+        from .pagination import approximate_count
+
+        borrower = Client.objects.get(client_id='CP1')
+        queryset = Loan.objects.filter(client=borrower)
+        self.assertEqual(approximate_count(queryset), 25)
+        Loan.objects.create(loan_id='CP_NEW', client=borrower, amount=1000, tenure=12, interest_rate=10,
+                            outstanding_amount=1000, monthly_emi=100)
+        with self.assertNumQueries(0):
+            self.assertEqual(approximate_count(queryset), 25)
+        # A different filter is a different cache entry
+        self.assertEqual(approximate_count(queryset.filter(loan_id__startswith='CP_')), 1)
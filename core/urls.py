@@ -1,19 +1,26 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# ASYNC_VIEWS serves the async dashboard / loan detail (run under an ASGI server)
+dashboard_view = views.dashboard_async if settings.ASYNC_VIEWS else views.dashboard
+loan_detail_view = views.loan_detail_async if settings.ASYNC_VIEWS else views.loan_detail
+
 urlpatterns = [
     path('', views.landing_page, name='landing_page'),
-    path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/', dashboard_view, name='dashboard'),
     path('loans/', views.loan_list, name='loan_list'),
+    path('worklist/', views.collection_worklist, name='collection_worklist'),
     path('settings/', views.settings_view, name='settings'),
     path('analytics/', views.analytics_view, name='analytics'),
     path('create-loan/', views.create_loan, name='create_loan'),
     path('create-client/', views.create_client, name='create_client'),
-    path('loan/<int:loan_id>/', views.loan_detail, name='loan_detail'),
+    path('loan/<int:loan_id>/', loan_detail_view, name='loan_detail'),
     path('run-reminders/', views.trigger_reminders, name='trigger_reminders'),
     path('loan/<int:loan_id>/pay/', views.add_payment, name='add_payment'),
     path('loan/<int:loan_id>/settlement/', views.generate_settlement, name='generate_settlement'),
     path('clients/', views.client_list, name='client_list'),
+    path('clients/autocomplete/', views.client_autocomplete, name='client_autocomplete'),
     path('client/<int:client_id>/delete/', views.delete_client, name='delete_client'),
     path('loan/<int:loan_id>/log/', views.log_interaction, name='log_interaction'),
     path('model-performance/', views.model_performance_view, name='model_performance'),
@@ -24,5 +31,6 @@ urlpatterns = [
     path('contact/', views.contact_view, name='contact'),
     path('privacy/', views.privacy_view, name='privacy'),
     path('terms/', views.terms_view, name='terms'),
+    path('metrics/', views.metrics_view, name='metrics'),
     path('.well-known/appspecific/com.chrome.devtools.json', views.chrome_devtools_json),
 ]
\ No newline at end of file
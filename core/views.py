@@ -1,13 +1,28 @@
+import asyncio
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required, permission_required
-from .models import Loan, Client, Reminder, CollectionLog, Payment
+from .models import Loan, Client, Reminder, CollectionLog, Payment, RiskScore, Installment, RISK_BAND_CHOICES, get_risk_band_thresholds
+from .amortization import installment_amount, schedule_installments
+from .cohorts import cohort_report
+from .concurrency import async_login_required, gather_queries, run_in_thread, run_query
+from . import metrics
+from .db_routing import replica_reads
+from .forecast import get_forecast
+from .portfolio import STATUS_FIELDS, compute_kpis, kpi_history, kpi_trends, live_kpis, loan_kpis, record_change
+from .scoring import stamp_scores
+from .strategy import CHANNELS, apply_to_loans
 from .forms import LoanForm, ClientForm, PaymentForm# You assume a ModelForm exists
-from django.db.models import Sum, Q, Count
+from django.db.models import F, Sum, Count
 from datetime import date
 from .ml_utils import ml_system
+from .search import search_loans, search_clients, autocomplete_clients
+from .pagination import paginate
 from datetime import date
+import hmac
 import json
+from django.conf import settings
 from django.contrib import messages
 from django.core.paginator import Paginator # For pagination
 import plotly.express as px
@@ -17,7 +32,7 @@ from sklearn.metrics import precision_score, recall_score, f1_score, confusion_m
 import pandas as pd
 import plotly.express as px
 import csv
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.utils import timezone
 from datetime import timedelta
 from django.db.models import Sum, Count
@@ -26,61 +41,80 @@ from django.contrib.auth.decorators import login_required, permission_required
 
 # In core/views.py
 
-@login_required
-def dashboard(request):
-    # 1. Standard Stats
-    total_loans = Loan.objects.count()
-    active_defaults = Loan.objects.filter(
-        Q(status='Defaulted') | 
-        Q(status='Active', days_past_due__gt=0)
-    ).count()
-    active_loans_count = Loan.objects.filter(status='Active').count()
-    total_disbursed = Loan.objects.aggregate(Sum('amount'))['amount__sum'] or 0
-    
-    # 2. Search Logic
-    query = request.GET.get('q', '').strip()
-    search_results = None # Variable to hold multiple results for the table
-    recent_loans = None # Default to empty list if no query is provided
+SEGMENT_NAMES = [
+    "Steady Repayer", "High Risk", "Early Bird", "Moderate Income, High Loan Burden",
+    "High Income, Low Default Risk", "Moderate Income, Medium Risk", "High Loan, Higher Default Risk",
+]
 
-    if query:
-        # If searching, find up to 20 matches by Name, ID, or Phone Number
-        search_results = Loan.objects.select_related('client').filter(
-            Q(client__name__icontains=query) | 
-            Q(id__icontains=query) |
-            Q(client__phone_number__icontains=query)
-        ).order_by('-id')[:20]
-    else:
-        # If not searching, just show the 10 most recent loans
-        recent_loans = Loan.objects.select_related('client').order_by('-id')[:10]
 
-    status_counts = Loan.objects.values('status').annotate(count=Count('status'))
-    status_data = {item['status']: item['count'] for item in status_counts}
+def segment_inputs():
+    """Clustering inputs for every open loan (one query, read as dicts rather than Loan objects)."""
+    return list(Loan.objects.filter(status__in=['Active', 'Defaulted']).values(
+        Age=F('client__age'), Monthly_Income=F('client__monthly_income'), Loan_Amount=F('amount'),
+        Loan_Tenure=F('tenure'), Interest_Rate=F('interest_rate'), Collateral_Value=F('collateral_value'),
+        Outstanding_Loan_Amount=F('amount'), Monthly_EMI=F('monthly_emi'), Num_Missed_Payments=F('missed_payments'),
+        Days_Past_Due=F('days_past_due'),
+    ))
 
-    
-    ml_input_data = [{'Age': l.client.age, 'Monthly_Income': l.client.monthly_income, 'Loan_Amount': l.amount, 'Loan_Tenure': l.tenure, 'Interest_Rate': l.interest_rate, 'Collateral_Value': l.collateral_value, 'Outstanding_Loan_Amount': l.amount, 'Monthly_EMI': l.monthly_emi, 'Num_Missed_Payments': l.missed_payments, 'Days_Past_Due': l.days_past_due} for l in Loan.objects.filter(status__in=['Active', 'Defaulted']).select_related('client')]
-    segments = ml_system.get_client_segments(ml_input_data)
-    segment_counts = {k: v for k, v in {
-        "Steady Repayer": segments.count("Steady Repayer"),
-        "High Risk": segments.count("High Risk"),
-        "Early Bird": segments.count("Early Bird"),
-        "Moderate Income, High Loan Burden": segments.count("Moderate Income, High Loan Burden"),
-        "High Income, Low Default Risk": segments.count("High Income, Low Default Risk"),
-        "Moderate Income, Medium Risk": segments.count("Moderate Income, Medium Risk"),
-        "High Loan, Higher Default Risk": segments.count("High Loan, Higher Default Risk"),
-    }.items() if v > 0}
 
-    context = {
-        'total_loans': total_loans,
-        'active_defaults': active_defaults,
-        'active_loans_count': active_loans_count,
-        'total_disbursed': total_disbursed,
+def dashboard_loans(query):
+    """(search results, recent loans): up to 20 ranked matches for `query`, else the 10 newest loans."""
+    if query:
+        # If searching, find up to 20 ranked matches by Name, ID, or Phone Number
+        return list(search_loans(Loan.objects.select_related('client'), query)[:20]), None
+    # If not searching, just show the 10 most recent loans
+    return None, list(Loan.objects.select_related('client').order_by('-id')[:10])
+
+
+def dashboard_context(query, kpis, trends, loans, segments):
+    search_results, recent_loans = loans
+    status_data = {status: kpis[field] for status, field in STATUS_FIELDS.items() if kpis[field]}
+    segment_counts = {name: segments.count(name) for name in SEGMENT_NAMES if segments.count(name) > 0}
+    return {
+        'total_loans': kpis['total_loans'],
+        'active_defaults': kpis['active_defaults'],
+        'active_loans_count': kpis['active_loans'],
+        'total_disbursed': kpis['total_disbursed'],
+        'trends': trends,
+        'sparkline_data': json.dumps({field: trend['values'] for field, trend in trends.items()}),
         'segment_data': json.dumps(segment_counts),
         'status_data': json.dumps(status_data),
         'recent_loans': recent_loans,
         'query': query,
         'search_results': search_results,
     }
-    return render(request, 'dashboard.html', context)
+
+
+@login_required
+def dashboard(request):
+    # 1. Standard Stats: live totals (one row) and their trend over the stored snapshots
+    kpis = live_kpis()
+    trends = kpi_trends(kpis)
+
+    # 2. Search results or the most recent loans
+    query = request.GET.get('q', '').strip()
+    loans = dashboard_loans(query)
+
+    # 3. Client segments of the open book
+    segments = ml_system.get_client_segments(segment_inputs())
+    return render(request, 'dashboard.html', dashboard_context(query, kpis, trends, loans, segments))
+
+
+@async_login_required
+async def dashboard_async(request):
+    """dashboard for ASGI: its independent queries run concurrently and the clustering off the event loop."""
+    query = request.GET.get('q', '').strip()
+
+    async def segments():
+        rows = await run_query(segment_inputs)
+        return await run_in_thread(ml_system.get_client_segments, rows)
+
+    kpis, history, loans, labels = await asyncio.gather(
+        run_query(live_kpis), run_query(kpi_history), run_query(lambda: dashboard_loans(query)), segments(),
+    )
+    trends = kpi_trends(kpis, history=history)
+    context = dashboard_context(query, kpis, trends, loans, labels)
+    return await sync_to_async(render)(request, 'dashboard.html', context)
 
 @login_required
 def create_loan(request):
@@ -89,17 +123,9 @@ def create_loan(request):
         if form.is_valid():
             loan = form.save(commit=False)
             
-            if loan.tenure > 0:
-                # Flat Rate Calculation (Principal + Total Interest) / Tenure
-                # Note: We cast to float to ensure accurate decimal math
-                amount = float(loan.amount)
-                rate = float(loan.interest_rate) / 100.0
-                years = loan.tenure / 12.0
-                
-                total_interest = amount * rate * years
-                loan.monthly_emi = (amount + total_interest) / loan.tenure
-            else:
-                loan.monthly_emi = 0
+            # Flat or reducing-balance instalment (0 when tenure <= 0), same maths as the stored schedule
+            emi = installment_amount(float(loan.amount), float(loan.interest_rate), loan.tenure, loan.amortization_method)
+            loan.monthly_emi = Decimal(str(round(float(emi), 2)))
             
             loan.outstanding_amount = loan.amount
             loan.status = 'Active' # Default status
@@ -113,16 +139,22 @@ def create_loan(request):
                 'Interest_Rate': loan.interest_rate,
                 'Collateral_Value': loan.collateral_value,
                 'Outstanding_Loan_Amount': loan.amount, 
-                'Monthly_EMI': (loan.amount / loan.tenure) if loan.tenure > 0 else 0,
+                'Monthly_EMI': loan.monthly_emi,  # the stored EMI, as every re-scoring path reads it
                 'Num_Missed_Payments': 0,
                 'Days_Past_Due': 0
             }
+            # The 3 engineered features the model was trained on (same as loan_detail)
+            safe_income = float(loan.client.monthly_income) if loan.client.monthly_income > 0 else 1
+            safe_collateral = float(loan.collateral_value) if loan.collateral_value > 0 else 1
+            ml_features['DTI_Ratio'] = float(loan.monthly_emi) / safe_income
+            ml_features['Loan_to_Collateral'] = float(loan.amount) / safe_collateral
+            ml_features['Payment_Strain'] = 0.0
+            history = []
             
             try:
                 # NEW WAY: The Smart Threshold
                 threshold = ml_system.get('custom_threshold', 0.50)
-                df_input = pd.DataFrame([ml_features])[ml_system.features_list]
-                risk_probability = ml_system.classifier.predict_proba(df_input)[0][1]
+                risk_probability = ml_system.predict_proba([ml_features])[0]
                 predicted_default_risk = 1 if risk_probability >= threshold else 0
                 
                 explanation = ml_system.explain_prediction(ml_features)
@@ -130,6 +162,8 @@ def create_loan(request):
                 loan.predicted_default_risk = predicted_default_risk
                 loan.risk_percentage = risk_probability * 100
                 loan.risk_explanation = ", ".join(explanation)
+                history = stamp_scores([loan], [ml_features], [risk_probability],
+                                       ml_system.model_version, ml_system.features_list, source='create_loan')
             except Exception as e:
                 # Fallback if ML fails
                 print(f"ML Error: {e}")
@@ -137,7 +171,11 @@ def create_loan(request):
                 loan.risk_percentage = 50.0
                 loan.risk_explanation = "Manual Review Required (ML Error)"
 
+            installments = schedule_installments([loan])
             loan.save()
+            RiskScore.objects.bulk_create(history)
+            Installment.objects.bulk_create(installments)
+            record_change(after=loan_kpis([loan]))
             messages.success(request, f"Loan Created! Risk Assessment: {'Risky' if loan.predicted_default_risk == 1 else 'Low Risk'}")
             return redirect('dashboard')
         else:
@@ -150,10 +188,14 @@ def create_loan(request):
 
 
 
+# Analytics dataset columns read by analytics_view
+ANALYTICS_VIEW_COLUMNS = ['Payment_History', 'Recovery_Status', 'Loan_Amount', 'Monthly_Income', 'Num_Missed_Payments']
+
 @login_required
+@replica_reads
 def analytics_view(request):
-    # 1. Grab the live dataframe from your loaded ML System
-    df = ml_system.df_data
+    # 1. Grab the columns the charts plot from the (memory-mapped) analytics dataset
+    df = ml_system.analytics_frame(ANALYTICS_VIEW_COLUMNS)
     
     # 2. Build the Plotly Figure
     fig = px.histogram(
@@ -254,7 +296,8 @@ def analytics_view(request):
 
     clustering_features = ['Monthly_Income', 'Loan_Amount']
     X_cluster = ml_system.cluster_scaler.transform(df[clustering_features])
-    df['Borrower_Segment'] = ml_system.kmeans.predict(X_cluster)
+    # (assign() leaves the cached analytics frame untouched)
+    df = df.assign(Borrower_Segment=ml_system.kmeans.predict(X_cluster))
     
     # 2. Map the segment numbers to your descriptive names
     df['Segment_Name'] = df['Borrower_Segment'].map(ml_system.segment_map)
@@ -314,12 +357,11 @@ def create_client(request):
         form = ClientForm()
     return render(request, 'client_form.html', {'form': form})
 
-@login_required
-def loan_detail(request, loan_id):
-    # FIX 1: Use pk=loan_id to search by the database ID instead of the string LN_ID
-    loan = get_object_or_404(Loan, pk=loan_id)
-    client = loan.client
-
+def score_loan_detail(loan):
+    """
+    Re-scores `loan` for its detail page (zero risk once repaid) and saves the
+    score with its RiskScore history. Returns the page's risk fields.
+    """
     safe_income = loan.client.monthly_income if loan.client.monthly_income > 0 else 1
     safe_collateral = loan.collateral_value if loan.collateral_value > 0 else 1
     missed_payments = loan.missed_payments if hasattr(loan, 'missed_payments') else 0
@@ -361,8 +403,7 @@ def loan_detail(request, loan_id):
         try:
             # NEW WAY: The Smart Threshold
             threshold = ml_system.get('custom_threshold', 0.50)
-            df_input = pd.DataFrame([ml_features])[ml_system.features_list]
-            risk_probability = ml_system.classifier.predict_proba(df_input)[0][1]
+            risk_probability = ml_system.predict_proba([ml_features], loan_ids=[loan.pk])[0]
             risk_score = 1 if risk_probability >= threshold else 0
             
             explanation = ml_system.explain_prediction(ml_features)
@@ -377,7 +418,10 @@ def loan_detail(request, loan_id):
             loan.predicted_default_risk = risk_score
             loan.risk_percentage = risk_percentage
             loan.risk_explanation = ", ".join(explanation)
+            history = stamp_scores([loan], [ml_features], [risk_probability],
+                                   ml_system.model_version, ml_system.features_list, source='loan_detail')
             loan.save()
+            RiskScore.objects.bulk_create(history)
         except Exception as e:
             print(f"ML Error in loan_detail view: {e}")
             risk_score = loan.predicted_default_risk
@@ -386,45 +430,49 @@ def loan_detail(request, loan_id):
             risk_percentage = loan.risk_percentage if loan.risk_percentage else round(risk_score * 100, 1)
             threshold_percentage = 50
     
-    # Safely get logs just in case the related_name differs
-    try:
-        logs = CollectionLog.objects.filter(loan=loan).order_by('-id')
-    except AttributeError:
-        logs = CollectionLog.objects.filter(loan=loan).order_by('-id')
-    
-    other_loans = Loan.objects.filter(client=client).exclude(id=loan.id).order_by('-id')
-
-    try:
-        # Assuming your related_name is 'reminders'
-        reminders = Reminder.objects.filter(loan=loan).order_by('-id')
-    except AttributeError:
-        # Fallback if you didn't set a related_name in models.py
-        reminders = Reminder.objects.filter(loan=loan).order_by('-id')
-
-    # ==========================================
-    # NEW: Fetch Transaction History (Payments)
-    # ==========================================
-    try:
-        # Tries to fetch using a custom related_name if you set one in models.py
-        transactions = Payment.objects.filter(loan=loan).order_by('-id')
-    except AttributeError:
-        # Fallback if you didn't use a related_name
-        transactions = Payment.objects.filter(loan=loan).order_by('-id')
-
-    context = {
-        'loan': loan,
+    return {
         'risk_score_display': round(risk_score, 2),
         'risk_percentage': risk_percentage,
         'threshold_percentage': threshold_percentage,
         'explanation': explanation,
         'recommendation': recommendation,
-        'logs': logs,
-        'other_loans': other_loans,
-        'reminders': reminders,
-        'transactions': transactions,
     }
+
+
+def loan_activity(loan):
+    """Callables fetching the loan's collection logs, the client's other loans, reminders and payments."""
+    return [
+        lambda: list(CollectionLog.objects.filter(loan=loan).order_by('-id')),
+        lambda: list(Loan.objects.filter(client=loan.client).exclude(id=loan.id).order_by('-id')),
+        lambda: list(Reminder.objects.filter(loan=loan).order_by('-id')),
+        # Transaction History (Payments)
+        lambda: list(Payment.objects.filter(loan=loan).order_by('-id')),
+    ]
+
+
+ACTIVITY_KEYS = ['logs', 'other_loans', 'reminders', 'transactions']
+
+
+@login_required
+def loan_detail(request, loan_id):
+    # FIX 1: Use pk=loan_id to search by the database ID instead of the string LN_ID
+    loan = get_object_or_404(Loan.objects.select_related('client'), pk=loan_id)
+    context = {'loan': loan, **score_loan_detail(loan)}
+    context.update(zip(ACTIVITY_KEYS, [fetch() for fetch in loan_activity(loan)]))
     return render(request, 'loan_detail.html', context)
 
+
+@async_login_required
+async def loan_detail_async(request, loan_id):
+    """loan_detail for ASGI: scoring and the four activity queries run concurrently once the loan is loaded."""
+    try:
+        loan = await Loan.objects.select_related('client').aget(pk=loan_id)
+    except Loan.DoesNotExist:
+        raise Http404("No Loan matches the given query.")
+    scores, *activity = await gather_queries(lambda: score_loan_detail(loan), *loan_activity(loan))
+    context = {'loan': loan, **scores, **dict(zip(ACTIVITY_KEYS, activity))}
+    return await sync_to_async(render)(request, 'loan_detail.html', context)
+
 @login_required
 def log_interaction(request, loan_id):
     loan = get_object_or_404(Loan, pk=loan_id)
@@ -451,9 +499,10 @@ def trigger_reminders(request):
     overdue_loans = Loan.objects.filter(
         status='Active', 
         days_past_due__gt=0
-    )
+    ).select_related('client')
     
     count = 0
+    reminders = []
     for loan in overdue_loans:
         # 2. Simulate the Email/SMS Logic
         message = (
@@ -465,13 +514,15 @@ def trigger_reminders(request):
         # Print to Console (Simulating an email server)
         print(f" [SENDING EMAIL] To: {loan.client.phone_number} | Body: {message}")
         
-        # 3. Log it in the database
-        Reminder.objects.create(
+        # 3. Queue it for the database (written in one batch below)
+        reminders.append(Reminder(
             loan=loan,
             message=message,
             scheduled_date=timezone.now()
-        )
+        ))
         count += 1
+
+    Reminder.objects.bulk_create(reminders, batch_size=1000)
         
     print(f"JOB COMPLETE: Sent {count} reminders.")
     print("------------------------------------------------")
@@ -480,7 +531,7 @@ def trigger_reminders(request):
 
 @login_required
 def add_payment(request, loan_id):
-    loan = get_object_or_404(Loan, pk=loan_id)
+    loan = get_object_or_404(Loan.objects.select_related('client'), pk=loan_id)
     
     if request.method == 'POST':
         form = PaymentForm(request.POST)
@@ -503,6 +554,7 @@ def add_payment(request, loan_id):
             payment = form.save(commit=False)
             payment.loan = loan
             payment.save()
+            before = loan_kpis([loan])
             
             # 1. Update Financials
             loan.outstanding_amount = current_balance - attempted_payment
@@ -512,6 +564,7 @@ def add_payment(request, loan_id):
             safe_collateral = loan.collateral_value if loan.collateral_value > 0 else 1
             missed_payments = loan.missed_payments if hasattr(loan, 'missed_payments') else 0
             days_late = loan.days_past_due if hasattr(loan, 'days_past_due') else 0
+            history = []
             
             # 2. Check for Full Payment
             if loan.outstanding_amount <= 0:
@@ -546,18 +599,21 @@ def add_payment(request, loan_id):
                 try:
                     # NEW WAY: The Smart Threshold
                     threshold = ml_system.get('custom_threshold', 0.50)
-                    df_input = pd.DataFrame([ml_features])[ml_system.features_list]
-                    risk_probability = ml_system.classifier.predict_proba(df_input)[0][1]
+                    risk_probability = ml_system.predict_proba([ml_features], loan_ids=[loan.pk])[0]
                     new_risk = 1 if risk_probability >= threshold else 0
 
                     loan.predicted_default_risk = new_risk
                     loan.risk_percentage = risk_probability * 100
                     new_explanation_list = ml_system.explain_prediction(ml_features)
                     loan.risk_explanation = ", ".join(new_explanation_list)
+                    history = stamp_scores([loan], [ml_features], [risk_probability],
+                                           ml_system.model_version, ml_system.features_list, source='add_payment')
                 except Exception as e:
                     print(f"ML Error during payment update: {e}")
 
             loan.save()
+            RiskScore.objects.bulk_create(history)
+            record_change(before, loan_kpis([loan]))
                 
             messages.success(request, f"Payment of KES {payment.amount_paid} recorded. New Risk Score: {loan.predicted_default_risk:.2f}")
             return redirect('loan_detail', loan_id=loan.id)
@@ -568,33 +624,28 @@ def add_payment(request, loan_id):
 
 @login_required
 def generate_settlement(request, loan_id):
-    loan = get_object_or_404(Loan, pk=loan_id)
+    loan = get_object_or_404(Loan.objects.select_related('client'), pk=loan_id)
     
     # 1. Check if eligible (Only active/defaulted loans with high risk)
     if loan.status == 'Paid':
         messages.warning(request, "This loan is already paid.")
         return redirect('loan_detail', loan_id=loan.id)
         
-    risk_score = loan.predicted_default_risk if loan.predicted_default_risk else 0.0
-    
-    # 2. Smart Calculation Logic
-    if risk_score > 0.75:
-        # High Risk: We are desperate. Offer 30% discount.
-        discount_percent = 30
+    # 2. Smart Calculation Logic (same thresholds as the worklist, see core/strategy.py)
+    apply_to_loans([loan])
+    if loan.recovery_channel == 'legal':
         reason = "High risk of total default. Aggressive offer generated."
-    elif risk_score > 0.50:
-        # Medium Risk: Offer 15% discount.
-        discount_percent = 15
+    elif loan.recovery_channel == 'settlement':
         reason = "Moderate risk. Incentive provided for immediate payment."
     else:
         # Low Risk: No discount recommended.
         messages.info(request, "Customer risk is low. No settlement recommended.")
         return redirect('loan_detail', loan_id=loan.id)
-        
-    # Calculate amounts
-    discount_amount = (loan.outstanding_amount * discount_percent) / 100
-    settlement_amount = loan.outstanding_amount - discount_amount
-    
+
+    discount_percent = loan.settlement_discount
+    settlement_amount = loan.settlement_amount
+    discount_amount = loan.outstanding_amount - settlement_amount
+
     context = {
         'loan': loan,
         'discount_percent': discount_percent,
@@ -613,85 +664,93 @@ def loan_list(request):
     # 2. SEARCH LOGIC (Name or ID)
     query = request.GET.get('q')
     if query:
-        loans = loans.filter(
-            Q(client__name__icontains=query) | 
-            Q(id__icontains=query)
-        )
+        loans = search_loans(loans, query)
 
     # 3. FILTER LOGIC (Status & Risk)
     status_filter = request.GET.get('status')
     if status_filter:
         loans = loans.filter(status=status_filter)
 
+    # Band counts for the current search/status filter, grouped in SQL
+    band_counts = {row['risk_band']: row['count'] for row in loans.order_by().values('risk_band').annotate(count=Count('id'))}
+
     risk_filter = request.GET.get('risk')
-    if risk_filter == 'high':
-        # Safely filter assuming the field exists
-        loans = loans.filter(predicted_default_risk__gt=0.5)
-    elif risk_filter == 'low':
-        loans = loans.filter(predicted_default_risk__lte=0.5)
+    if risk_filter in dict(RISK_BAND_CHOICES):
+        loans = loans.filter(risk_band=risk_filter)
 
-    # 4. ONE SINGLE PAGINATION BLOCK (Removed the duplicate that erased your scores)
+    # 4. ONE SINGLE PAGINATION BLOCK (badge colour/label come from the stored risk_band)
     per_page = request.session.get('ui_items_per_page', 20)
-    paginator = Paginator(loans, per_page) 
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
-    # 5. Attach display helpers
-    for loan in page_obj:
-        # Check if the loan is closed/paid
-        if loan.status == 'Paid' or loan.outstanding_amount <= 0:
-            loan.risk_score_display = 0.0
-            loan.risk_percentage = 0.0
-            loan.risk_badge_color = "success"
-            loan.risk_label = "Closed"
-        elif loan.risk_percentage is not None:
-            loan.risk_score_display = round(loan.risk_percentage, 1) 
-            
-            # thresholds for badges (consistent with progress bar colors)
-            if loan.risk_percentage >= 70:
-                loan.risk_badge_color = "danger"
-                loan.risk_label = "High Risk"
-            elif loan.risk_percentage >= 40:
-                loan.risk_badge_color = "warning"
-                loan.risk_label = "Medium Risk"
-            else:
-                loan.risk_badge_color = "success"
-                loan.risk_label = "Low Risk"
-        else:
-            loan.risk_score_display = "N/A"
-            loan.risk_badge_color = "light"
-            loan.risk_label = "Pending"
-            
+    page_obj = paginate(request, loans, per_page)
+
+    medium_threshold, high_threshold = get_risk_band_thresholds()
     context = {
         'loans': page_obj, 
         'page_obj': page_obj,
         'query': query,
         'status_filter': status_filter,
-        'risk_filter': risk_filter
+        'risk_filter': risk_filter,
+        'band_counts': band_counts,
+        'medium_threshold': medium_threshold,
+        'high_threshold': high_threshold,
     }
     return render(request, 'loan_list.html', context)
 
+
+@login_required
+def collection_worklist(request):
+    """Open loans in priority order (expected loss), straight from the stored strategy columns."""
+    open_channels = [key for key in CHANNELS if key != 'closed']
+    channel_filter = request.GET.get('channel')
+    channels = [channel_filter] if channel_filter in open_channels else open_channels
+
+    loans = Loan.objects.filter(recovery_channel__in=channels).select_related('client').order_by('-collection_priority', 'id')
+    channel_counts = dict(
+        Loan.objects.filter(recovery_channel__in=open_channels).order_by()
+        .values_list('recovery_channel').annotate(count=Count('id'))
+    )
+    per_page = request.session.get('ui_items_per_page', 20)
+    page_obj = Paginator(loans, per_page).get_page(request.GET.get('page'))
+
+    context = {
+        'page_obj': page_obj,
+        'channel_filter': channel_filter if channel_filter in open_channels else '',
+        'channels': [(key, CHANNELS[key], channel_counts.get(key, 0)) for key in open_channels],
+    }
+    return render(request, 'worklist.html', context)
+
 @login_required
 def settings_view(request):
     if request.method == 'POST':
         # Save settings to User Session (Simple & Effective)
         theme = request.POST.get('theme')
         items_per_page = int(request.POST.get('items_per_page'))
+        pagination_mode = request.POST.get('pagination', 'pages')
         
         request.session['ui_theme'] = theme
         request.session['ui_items_per_page'] = items_per_page
+        request.session['ui_pagination'] = pagination_mode
         messages.success(request, "Settings saved successfully!")
         
     # Get current settings
     current_theme = request.session.get('ui_theme', 'light')
     current_per_page = request.session.get('ui_items_per_page', 10)
+    current_pagination = request.session.get('ui_pagination', 'pages')
     
     return render(request, 'settings.html', {
         'current_theme': current_theme, 
-        'current_per_page': current_per_page
+        'current_per_page': current_per_page,
+        'current_pagination': current_pagination,
     })
 
 
+@login_required
+def client_autocomplete(request):
+    """Select2-format JSON for the loan form's client picker: top matches only."""
+    rows = autocomplete_clients(request.GET.get('q', ''))
+    return JsonResponse({
+        'results': [{'id': pk, 'text': f"{name} ({client_id})"} for pk, client_id, name in rows],
+    })
+
 @login_required
 def client_list(request):
     # 1. Base Query
@@ -700,17 +759,10 @@ def client_list(request):
     # 2. Search Logic
     query = request.GET.get('q')
     if query:
-        clients = clients.filter(
-            Q(name__icontains=query) | 
-            Q(phone_number__icontains=query) |
-            Q(email__icontains=query) |
-            Q(employment_type__icontains=query)
-        )
+        clients = search_clients(clients, query)
 
     # 3. Pagination (Grid of 9 cards per page looks good)
-    paginator = Paginator(clients, 9) 
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, clients, 9)
     
     context = {
         'page_obj': page_obj,
@@ -724,7 +776,9 @@ def delete_client(request, client_id):
     client = get_object_or_404(Client, pk=client_id)
     
     if request.method == 'POST':
+        removed = compute_kpis(client.loans.all())
         client.delete()
+        record_change(before=removed)
         messages.success(request, f"Client '{client.name}' and all associated loans deleted.")
         return redirect('client_list')
     
@@ -740,12 +794,15 @@ def delete_loan(request, loan_id):
         return redirect('loan_detail', loan_id=loan.id)
         
     if request.method == 'POST':
+        removed = loan_kpis([loan])
         loan.delete()
+        record_change(before=removed)
         messages.success(request, "Loan record permanently deleted.")
         return redirect('loan_list') # Redirect to wherever your loans are listed
     return render(request, 'confirm_delete.html', {'object': loan, 'type': 'Loan'})
 
 @login_required
+@replica_reads
 def model_performance_view(request):
     # ==========================================
     # 1. FEATURE IMPORTANCE CHART
@@ -822,7 +879,7 @@ def model_performance_view(request):
 
 @login_required
 def clearance_certificate(request, loan_id):
-    loan = get_object_or_404(Loan, id=loan_id)
+    loan = get_object_or_404(Loan.objects.select_related('client'), id=loan_id)
     
     # Security Check: Only allow certificates for fully paid loans
     if loan.status != 'Paid' or loan.outstanding_amount > 0:
@@ -836,6 +893,7 @@ def clearance_certificate(request, loan_id):
     return render(request, 'clearance_certificate.html', context)
 
 @login_required
+@replica_reads
 def report_generation(request):
     # Determine the timeframe from the URL (e.g., ?period=weekly)
     period = request.GET.get('period', 'monthly') # Defaults to monthly
@@ -855,9 +913,9 @@ def report_generation(request):
     new_loans = Loan.objects.filter(created_at__gte=start_date)
     recent_payments = Payment.objects.filter(payment_date__gte=start_date)
     
-    # Calculate Metrics
-    total_disbursed = sum(loan.amount for loan in new_loans)
-    total_collected = sum(payment.amount_paid for payment in recent_payments)
+    # Calculate Metrics (summed in SQL rather than by loading every row)
+    total_disbursed = new_loans.aggregate(total=Sum('amount'))['total'] or 0
+    total_collected = recent_payments.aggregate(total=Sum('amount_paid'))['total'] or 0
     
     # CSV Export Logic
     if 'export' in request.GET:
@@ -882,7 +940,21 @@ def report_generation(request):
         'total_collected': total_collected,
         'loans_count': new_loans.count(),
         'payments_count': recent_payments.count(),
+        # Monte Carlo projection of collections, stored by `manage.py forecast_collections`
+        'forecast': get_forecast(ml_system.model_version or ''),
     }
+
+    # Roll rates and vintage curves from the daily LoanSnapshot table (cached per snapshot date)
+    cohorts = cohort_report()
+    context['cohorts'] = cohorts
+    if cohorts and cohorts['vintages']:
+        fig = go.Figure([
+            go.Scatter(x=[mob for mob, _ in curve], y=[pct for _, pct in curve], mode='lines+markers', name=vintage)
+            for vintage, curve in cohorts['vintages'].items()
+        ])
+        fig.update_layout(xaxis_title='Months on book', yaxis_title='% of loans 30+ DPD', height=360,
+                          margin=dict(l=40, r=20, t=20, b=40), legend_title_text='Vintage')
+        context['vintage_chart'] = fig.to_html(full_html=False, include_plotlyjs='cdn')
     return render(request, 'reports.html', context)
 
 
@@ -900,9 +972,12 @@ def landing_page(request):
 from .ml_service import ml_system as ingestion_ml_system
 from decimal import Decimal, InvalidOperation
 
+# IDs per lookup / insert batch (keeps IN (...) lists under SQLite's variable limit)
+UPLOAD_LOOKUP_BATCH = 500
+
 @login_required
 def upload_portfolio(request):
-    """Admin-only CSV upload with instant ML risk scoring per row."""
+    """Admin-only CSV upload with instant ML risk scoring of every row."""
     if not request.user.is_staff:
         messages.error(request, "Access denied. Staff privileges required.")
         return redirect('dashboard')
@@ -955,34 +1030,50 @@ def upload_portfolio(request):
         error_count = 0
         error_details = []
         loans_to_create = []
+        upload_features = []
+        score_history = []
+
+        # Look up every referenced client / loan ID up front (a few queries, not two per row)
+        borrower_ids = df['Borrower_ID'].astype(str).str.strip().unique().tolist()
+        upload_loan_ids = df['Loan_ID'].astype(str).str.strip().unique().tolist()
+        clients_by_id = {}
+        existing_loan_ids = set()
+        for start in range(0, max(len(borrower_ids), len(upload_loan_ids)), UPLOAD_LOOKUP_BATCH):
+            clients_by_id.update(Client.objects.in_bulk(borrower_ids[start:start + UPLOAD_LOOKUP_BATCH], field_name='client_id'))
+            existing_loan_ids.update(Loan.objects.filter(
+                loan_id__in=upload_loan_ids[start:start + UPLOAD_LOOKUP_BATCH]
+            ).values_list('loan_id', flat=True))
+        new_clients = {}
 
         for idx, row in df.iterrows():
             row_num = idx + 2  # Excel row (header = row 1)
             try:
-                # 1. Get or Create Client
+                # 1. Get or Create Client (new ones are bulk inserted below)
                 client_id = str(row['Borrower_ID']).strip()
-                client, _ = Client.objects.get_or_create(
-                    client_id=client_id,
-                    defaults={
-                        'name': str(row['Borrower_Name']).strip(),
-                        'age': int(row['Age']),
-                        'gender': str(row.get('Gender', 'Unknown')),
-                        'monthly_income': Decimal(str(row['Monthly_Income'])),
-                        'employment_type': str(row.get('Employment_Type', 'Salaried')),
-                        'address': str(row.get('Address', 'N/A')),
-                        'phone_number': str(row.get('Phone_Number', '')),
-                        'email': str(row.get('Email', '')),
-                        'num_dependents': int(row.get('Num_Dependents', 0)),
-                    }
-                )
-
-                # 2. Check for duplicate loan
+                client = clients_by_id.get(client_id) or new_clients.get(client_id)
+                if client is None:
+                    client = Client(
+                        client_id=client_id,
+                        name=str(row['Borrower_Name']).strip(),
+                        age=int(row['Age']),
+                        gender=str(row.get('Gender', 'Unknown')),
+                        monthly_income=Decimal(str(row['Monthly_Income'])),
+                        employment_type=str(row.get('Employment_Type', 'Salaried')),
+                        address=str(row.get('Address', 'N/A')),
+                        phone_number=str(row.get('Phone_Number', '')),
+                        email=str(row.get('Email', '')),
+                        num_dependents=int(row.get('Num_Dependents', 0)),
+                    )
+                    new_clients[client_id] = client
+
+                # 2. Check for duplicate loan (already stored, or repeated in this file)
                 loan_id = str(row['Loan_ID']).strip()
-                if Loan.objects.filter(loan_id=loan_id).exists():
+                if loan_id in existing_loan_ids:
                     skipped_count += 1
                     continue
+                existing_loan_ids.add(loan_id)
 
-                # 3. Run ML Model for risk scoring
+                # 3. Collect ML features (every valid row is scored in one batch below)
                 ml_features = {
                     'Age': float(row['Age']),
                     'Monthly_Income': float(row['Monthly_Income']),
@@ -995,14 +1086,12 @@ def upload_portfolio(request):
                     'Num_Missed_Payments': float(row['Num_Missed_Payments']),
                     'Days_Past_Due': float(row['Days_Past_Due']),
                 }
-
-                # NEW WAY: The Smart Threshold
-                threshold = ingestion_ml_system.get('custom_threshold', 0.50)
-                df_input_row = pd.DataFrame([ml_features])[ingestion_ml_system.features_list]
-                risk_probability = ingestion_ml_system.classifier.predict_proba(df_input_row)[0][1]
-                risk_score_binary = 1 if risk_probability >= threshold else 0
-                
-                explanation = ingestion_ml_system.explain_prediction(ml_features)
+                # The 3 engineered features the model was trained on (same as loan_detail)
+                safe_income = ml_features['Monthly_Income'] if ml_features['Monthly_Income'] > 0 else 1
+                safe_collateral = ml_features['Collateral_Value'] if ml_features['Collateral_Value'] > 0 else 1
+                ml_features['DTI_Ratio'] = ml_features['Monthly_EMI'] / safe_income
+                ml_features['Loan_to_Collateral'] = ml_features['Outstanding_Loan_Amount'] / safe_collateral
+                ml_features['Payment_Strain'] = ml_features['Days_Past_Due'] * ml_features['Monthly_EMI']
 
                 # 4. Determine status from data
                 days_past = int(row['Days_Past_Due'])
@@ -1019,7 +1108,6 @@ def upload_portfolio(request):
                 # 5. Build loan object
                 loan = Loan(
                     loan_id=loan_id,
-                    client=client,
                     amount=Decimal(str(row['Loan_Amount'])),
                     tenure=int(row['Loan_Tenure']),
                     interest_rate=Decimal(str(row['Interest_Rate'])),
@@ -1028,13 +1116,13 @@ def upload_portfolio(request):
                     monthly_emi=Decimal(str(row['Monthly_EMI'])),
                     missed_payments=missed,
                     days_past_due=days_past,
+                    opening_missed_payments=missed,  # arrears as of today, rolled forward by age_loans
+                    opening_days_past_due=days_past,
                     status=status,
                     recovery_status=str(row.get('Recovery_Status', 'Pending')),
-                    predicted_default_risk=float(risk_score_binary),
-                    risk_percentage=risk_probability * 100,
-                    risk_explanation='; '.join(explanation) if explanation else "System Assessment Complete",
                 )
-                loans_to_create.append(loan)
+                loans_to_create.append((client_id, loan))
+                upload_features.append(ml_features)
                 created_count += 1
 
             except (ValueError, InvalidOperation, KeyError) as e:
@@ -1042,9 +1130,52 @@ def upload_portfolio(request):
                 error_details.append(f"Row {row_num}: {str(e)}")
                 continue
 
-        # Bulk create all valid loans
+        # Score and explain all valid rows in one model call each (NEW WAY: The Smart Threshold)
+        upload_loans = [loan for _, loan in loans_to_create]
+        if upload_loans:
+            threshold = ingestion_ml_system.get('custom_threshold', 0.50)
+            try:
+                probabilities = ingestion_ml_system.predict_proba(upload_features)
+                explanations = ingestion_ml_system.explain_batch(upload_features)
+                for loan, risk_probability, explanation in zip(upload_loans, probabilities, explanations):
+                    loan.predicted_default_risk = float(1 if risk_probability >= threshold else 0)
+                    loan.risk_percentage = risk_probability * 100
+                    loan.risk_explanation = '; '.join(explanation) if explanation else "System Assessment Complete"
+                score_history = stamp_scores(upload_loans, upload_features, probabilities, ingestion_ml_system.model_version,
+                                             ingestion_ml_system.features_list, source='upload_portfolio')
+            except Exception as e:
+                # Fallback if ML fails: keep the rows, flag them for review
+                print(f"ML Error during upload: {e}")
+                for loan in upload_loans:
+                    loan.predicted_default_risk = 0.5
+                    loan.risk_percentage = 50.0
+                    loan.risk_explanation = "Manual Review Required (ML Error)"
+            # bulk_create skips save(), so derive band and strategy here
+            for loan in upload_loans:
+                loan.refresh_risk_band()
+            apply_to_loans(upload_loans)
+
+        # Bulk create new clients, then link and bulk create all valid loans
+        if new_clients:
+            Client.objects.bulk_create(new_clients.values(), batch_size=UPLOAD_LOOKUP_BATCH, ignore_conflicts=True)
+            created_ids = list(new_clients)
+            for start in range(0, len(created_ids), UPLOAD_LOOKUP_BATCH):
+                clients_by_id.update(Client.objects.in_bulk(created_ids[start:start + UPLOAD_LOOKUP_BATCH], field_name='client_id'))
         if loans_to_create:
-            Loan.objects.bulk_create(loans_to_create, ignore_conflicts=True)
+            for client_id, loan in loans_to_create:
+                loan.client_id = clients_by_id[client_id].pk
+            Loan.objects.bulk_create([loan for _, loan in loans_to_create], batch_size=UPLOAD_LOOKUP_BATCH, ignore_conflicts=True)
+
+            # ignore_conflicts leaves pks unset; fetch them so the score history can point at its loans
+            for start in range(0, len(upload_loans), UPLOAD_LOOKUP_BATCH):
+                chunk = upload_loans[start:start + UPLOAD_LOOKUP_BATCH]
+                pks = dict(Loan.objects.filter(loan_id__in=[loan.loan_id for loan in chunk]).values_list('loan_id', 'pk'))
+                for loan in chunk:
+                    loan.pk = pks.get(loan.loan_id)
+            RiskScore.objects.bulk_create(
+                [score for score in score_history if score.loan.pk is not None], batch_size=UPLOAD_LOOKUP_BATCH,
+            )
+            record_change(after=loan_kpis([loan for loan in upload_loans if loan.pk is not None]))
 
         results = {
             'total_rows': len(df),
@@ -1070,7 +1201,17 @@ def privacy_view(request):
     return render(request, 'privacy.html')
 
 
-from django.http import JsonResponse
+def metrics_view(request):
+    """Prometheus scrape endpoint for the per-view metrics recorded by MetricsMiddleware."""
+    if not metrics.metrics_enabled():
+        raise Http404("Metrics are disabled (set METRICS_ENABLED=True).")
+
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    bearer = request.headers.get('Authorization', '')
+    if not (request.user.is_staff or (token and hmac.compare_digest(bearer.encode(), f"Bearer {token}".encode()))):
+        return HttpResponse("Forbidden", status=403, content_type='text/plain')
+
+    return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 def chrome_devtools_json(request):
     """Serves the .well-known file to resolve DevTools 404 errors."""
@@ -0,0 +1,59 @@
+import os
+import threading
+
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.base import IsolationLevel
+from psycopg2 import extensions
+
+from intellidebt.db_pool import DEFAULT_POOL_SIZE, DEFAULT_POOL_TIMEOUT, ConnectionPool, PoolTimeout
+
+# (pid, alias, connection params) -> ConnectionPool. The pid keeps a forked gunicorn worker off its
+# parent's sockets; the params keep e.g. the test runner's maintenance-db connections apart.
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, settings_dict, conn_params):
+    key = (os.getpid(), alias, repr(sorted(conn_params.items())))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(
+                size=settings_dict.get('POOL_SIZE', DEFAULT_POOL_SIZE),
+                timeout=settings_dict.get('POOL_TIMEOUT', DEFAULT_POOL_TIMEOUT),
+            )
+        return _pools[key]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL (psycopg2) with connections drawn from a per-process ConnectionPool instead of opened per request."""
+
+    # Unknown = broken socket or mid-protocol; never handed to the next request
+    REUSABLE_STATES = (extensions.TRANSACTION_STATUS_IDLE, extensions.TRANSACTION_STATUS_INTRANS,
+                       extensions.TRANSACTION_STATUS_INERROR)
+
+    def get_new_connection(self, conn_params):
+        pool = get_pool(self.alias, self.settings_dict, conn_params)
+        try:
+            connection = pool.acquire(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        except PoolTimeout as e:
+            raise self.Database.OperationalError(str(e)) from e
+        self._pool = pool
+        # A reused connection keeps the isolation level it was opened with
+        self.isolation_level = IsolationLevel(
+            self.settings_dict['OPTIONS'].get('isolation_level', IsolationLevel.READ_COMMITTED)
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        connection = self.connection
+        status = extensions.TRANSACTION_STATUS_UNKNOWN if connection.closed else connection.info.transaction_status
+        # Errors (a failed is_usable() included) also retire the connection
+        discard = self.errors_occurred or status not in self.REUSABLE_STATES
+        try:
+            if not discard and status != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except self.Database.Error:
+            discard = True
+        self._pool.release(connection, discard=discard)
@@ -0,0 +1,128 @@
+import threading
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+
+# DB_POOL_MODE values (see configure_database)
+POOL_MODES = ('persistent', 'pool', 'pgbouncer', 'off')
+
+POOLED_ENGINE = 'intellidebt.backends.pooled_postgresql'
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_POOL_TIMEOUT = 10.0
+# Idle pooled connections older than this are closed instead of reused (server-side idle timeouts)
+DEFAULT_POOL_MAX_IDLE = 300.0
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of DB-API connections for one worker process.
+
+    At most `size` connections are checked out at once; a caller beyond that
+    waits up to `timeout` seconds for one to come back, then gets PoolTimeout.
+    Idle connections are reused most-recent first, and dropped when closed or
+    idle for longer than `max_idle` seconds.
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, timeout=DEFAULT_POOL_TIMEOUT, max_idle=DEFAULT_POOL_MAX_IDLE):
+        self.size, self.timeout, self.max_idle = size, timeout, max_idle
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []  # (connection, returned at)
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def acquire(self, connect):
+        """A pooled connection, or a new one from `connect()` when none is idle."""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f"All {self.size} pooled connections busy for {self.timeout}s")
+        try:
+            now = time.monotonic()
+            stale = []
+            connection = None
+            with self._lock:
+                while self._idle and connection is None:
+                    candidate, returned_at = self._idle.pop()
+                    if candidate.closed or now - returned_at > self.max_idle:
+                        stale.append(candidate)
+                    else:
+                        connection = candidate
+            for candidate in stale:
+                _close_quietly(candidate)
+            if connection is None:
+                connection = connect()
+                with self._lock:
+                    self.opened += 1
+            return connection
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection, discard=False):
+        """Returns a checked-out connection; `discard` (or a closed connection) closes it instead."""
+        try:
+            if discard or connection.closed:
+                _close_quietly(connection)
+            else:
+                with self._lock:
+                    self._idle.append((connection, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def close_idle(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            _close_quietly(connection)
+
+    def stats(self):
+        with self._lock:
+            return {'size': self.size, 'idle': len(self._idle), 'opened': self.opened}
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+def configure_database(config, mode='persistent', conn_max_age=600, serverless=False,
+                       pool_size=DEFAULT_POOL_SIZE, pool_timeout=DEFAULT_POOL_TIMEOUT):
+    """
+    Applies DB_POOL_MODE to a dj_database_url config dict:
+
+    persistent  one connection per gunicorn thread, kept for conn_max_age seconds
+                (Django's CONN_MAX_AGE) with health checks. Not on serverless,
+                where a frozen lambda leaves the socket dangling: there it is 0.
+    pool        PostgreSQL only. A bounded pool of pool_size connections per
+                worker process shared by its threads (the pooled_postgresql
+                backend); each request checks a connection out and back in.
+    pgbouncer   DATABASE_URL points at a transaction-mode pooler (PgBouncer,
+                Supabase's port 6543). Server-side cursors are disabled since
+                consecutive statements may run on different server connections.
+    off         a new connection per request.
+    """
+    if mode not in POOL_MODES:
+        raise ImproperlyConfigured(f"DB_POOL_MODE must be one of {', '.join(POOL_MODES)}, not {mode!r}.")
+    config = dict(config)
+    config['CONN_MAX_AGE'] = 0 if serverless or mode == 'off' else conn_max_age
+    config['CONN_HEALTH_CHECKS'] = config['CONN_MAX_AGE'] != 0
+
+    if mode == 'pool':
+        if not config['ENGINE'].endswith('postgresql'):
+            raise ImproperlyConfigured("DB_POOL_MODE=pool needs a PostgreSQL DATABASE_URL.")
+        config.update({
+            'ENGINE': POOLED_ENGINE,
+            # Connections go back to the pool at the end of every request
+            'CONN_MAX_AGE': 0,
+            'CONN_HEALTH_CHECKS': False,
+            'POOL_SIZE': pool_size,
+            'POOL_TIMEOUT': pool_timeout,
+        })
+    elif mode == 'pgbouncer':
+        config['DISABLE_SERVER_SIDE_CURSORS'] = True
+    return config
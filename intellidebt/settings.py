@@ -14,6 +14,8 @@ from pathlib import Path
 import dj_database_url
 from dotenv import load_dotenv
 
+from intellidebt.db_pool import configure_database
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -48,8 +50,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
+    "core.middleware.ReplicaStickinessMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
@@ -61,7 +65,8 @@ ROOT_URLCONF = "intellidebt.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # Django templates + render timing for the metrics endpoint
+        "BACKEND": "core.metrics.InstrumentedDjangoTemplates",
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -81,14 +86,59 @@ WSGI_APPLICATION = "intellidebt.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Connection handling (intellidebt/db_pool.py):
+#   DB_POOL_MODE=persistent  one connection per gunicorn thread, reused for DB_CONN_MAX_AGE seconds
+#   DB_POOL_MODE=pool        at most DB_POOL_SIZE connections per worker process, shared by its threads
+#                            (requests wait up to DB_POOL_TIMEOUT seconds for one); PostgreSQL only
+#   DB_POOL_MODE=pgbouncer   DATABASE_URL is a transaction-mode pooler (PgBouncer, Supabase :6543)
+#   DB_POOL_MODE=off         a new connection per request
+# On Vercel (VERCEL is set) the default is pgbouncer and connections are never kept between
+# invocations: a frozen lambda cannot close its socket.
+SERVERLESS = bool(os.getenv('VERCEL'))
+DB_POOL_MODE = os.getenv('DB_POOL_MODE', 'pgbouncer' if SERVERLESS else 'persistent')
+
 DATABASES = {
-    'default': dj_database_url.config(
-        default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}",
-        conn_max_age=600,
-        conn_health_checks=True,
+    'default': configure_database(
+        dj_database_url.config(default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}"),
+        mode=DB_POOL_MODE,
+        conn_max_age=int(os.getenv('DB_CONN_MAX_AGE', '600')),
+        serverless=SERVERLESS,
+        pool_size=int(os.getenv('DB_POOL_SIZE', '4')),
+        pool_timeout=float(os.getenv('DB_POOL_TIMEOUT', '10')),
     )
 }
 
+# Read replica (core/db_routing.py). When DATABASE_REPLICA_URL is set, the heavy
+# read-only views (analytics, model performance, reports, CSV exports) read from
+# it; every write, and any job that writes back what it read (update_scores.py),
+# stays on DATABASE_URL. After a POST a session reads from the primary for
+# REPLICA_STICKY_SECONDS so it sees its own writes despite replication lag.
+# Locally, two SQLite files will do:
+#   cp db.sqlite3 replica.sqlite3 && DATABASE_REPLICA_URL=sqlite:///replica.sqlite3 python manage.py runserver
+if os.getenv('DATABASE_REPLICA_URL'):
+    DATABASES['replica'] = configure_database(
+        dj_database_url.parse(os.environ['DATABASE_REPLICA_URL']),
+        mode=DB_POOL_MODE,
+        conn_max_age=int(os.getenv('DB_CONN_MAX_AGE', '600')),
+        serverless=SERVERLESS,
+        pool_size=int(os.getenv('DB_POOL_SIZE', '4')),
+        pool_timeout=float(os.getenv('DB_POOL_TIMEOUT', '10')),
+    )
+    # Tests read the replica through the test database's own connection
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['core.db_routing.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '10'))
+
+# Async views (core/concurrency.py). ASYNC_VIEWS=1 routes /dashboard/ and
+# /loan/<id>/ to async views whose independent queries run concurrently; serve
+# them with an ASGI server (uvicorn intellidebt.asgi:application). Queries run
+# on a shared pool of ASYNC_QUERY_THREADS threads per process, each holding its
+# own database connection (count them against DB_POOL_SIZE / the server's
+# limit); 0 runs them one after another on the request thread.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', '0') == '1'
+ASYNC_QUERY_THREADS = int(os.getenv('ASYNC_QUERY_THREADS', '4'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -134,4 +184,79 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
-CSRF_TRUSTED_ORIGINS = ['https://intellidebt-manager.onrender.com', 'https://intellidebt.vercel.app']
\ No newline at end of file
+CSRF_TRUSTED_ORIGINS = ['https://intellidebt-manager.onrender.com', 'https://intellidebt.vercel.app']
+
+# Risk bands (percent). Changing these requires `python manage.py rebuild_risk_bands`.
+RISK_BAND_THRESHOLDS = {
+    'medium': 40,
+    'high': 70,
+}
+
+# Recovery strategy thresholds (core/strategy.py), shared by loan_detail, settlement
+# offers and the collector worklist. risk is the default probability (0-1).
+# Changing these requires `python manage.py assign_strategies`.
+RECOVERY_STRATEGY = {
+    'legal_risk': 0.75,          # above this (or past legal_dpd days overdue): legal action
+    'settlement_risk': 0.50,     # at or above this: settlement offers
+    'legal_dpd': 90,
+    'legal_discount': 30,        # settlement discount (%) offered per channel
+    'settlement_discount': 15,
+}
+
+# Cash-flow forecast on the reports page (core/forecast.py): monthly collections
+# simulated over `scenarios` draws of every open loan's default month. Computed by
+# `python manage.py forecast_collections` (schedule it daily) and stored per model
+# version, config and day; the page only reads it. See DEFAULT_FORECAST for the keys.
+CASHFLOW_FORECAST = {
+    'horizon_months': 12,
+    'scenarios': int(os.getenv('FORECAST_SCENARIOS', '1000')),
+    'recovery_rate': 0.35,       # share of the balance at default eventually recovered,
+    'recovery_lag_months': 6,    # this many months after the default
+}
+
+# Per-view latency / query / ML / template metrics, exported at /metrics/ in
+# Prometheus text format. Scrapers authenticate with `Authorization: Bearer <METRICS_TOKEN>`;
+# staff users can open the page in a logged-in browser.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'False') == 'True'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Per-request latency budget for risk scoring, in milliseconds. When set, ml_system
+# serves the most accurate model whose p99 (measured by `manage.py train_model`)
+# fits the budget, e.g. the compact gradient-boosted model instead of the full forest.
+# Unset = always serve the full RandomForest.
+ML_LATENCY_BUDGET_MS = float(os.getenv('ML_LATENCY_BUDGET_MS', '0')) or None
+
+# Score with core.forest_engine (the forest flattened into NumPy arrays) instead of
+# sklearn's predict_proba. Same probabilities, ~100x lower single-loan latency.
+# Only applies when the serving model is a tree forest.
+ML_FAST_INFERENCE = os.getenv('ML_FAST_INFERENCE', 'False') == 'True'
+
+# Versioned model registry (see core/model_registry.py and `manage.py model_registry`).
+# Workers re-check the ACTIVE/SHADOW pointers every MODEL_RELOAD_INTERVAL seconds and
+# hot-swap without a restart. With no ACTIVE version the bundled loan_ml_model.joblib is served.
+MODEL_REGISTRY_DIR = os.getenv('MODEL_REGISTRY_DIR', os.path.join(BASE_DIR, 'model_registry'))
+MODEL_RELOAD_INTERVAL = float(os.getenv('MODEL_RELOAD_INTERVAL', '5'))
+
+# Columnar analytics dataset written by `manage.py export_analytics` (core/columnar.py).
+# The analytics charts memory-map only the columns they plot; until a dataset has been
+# exported they fall back to the bundled synthetic_loans_1000.csv.
+ANALYTICS_DATASET_DIR = os.getenv('ANALYTICS_DATASET_DIR', os.path.join(BASE_DIR, 'analytics_data'))
+
+# Memoized risk scores, keyed by (model version, quantized feature vector), in
+# front of ml_system for request-sized batches (core/score_cache.py).
+# ML_SCORE_CACHE_SIZE is the per-worker LRU bound (0 disables the cache).
+# Set ML_SCORE_CACHE_DIR to also share scores between gunicorn workers through a
+# file-based Django cache, or ML_SCORE_CACHE_BACKEND to any other CACHES alias.
+ML_SCORE_CACHE_SIZE = int(os.getenv('ML_SCORE_CACHE_SIZE', '10000'))
+ML_SCORE_CACHE_TTL = float(os.getenv('ML_SCORE_CACHE_TTL', '3600'))
+ML_SCORE_CACHE_BACKEND = os.getenv('ML_SCORE_CACHE_BACKEND', '')
+if os.getenv('ML_SCORE_CACHE_DIR'):
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'ml_scores': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('ML_SCORE_CACHE_DIR'),
+            'OPTIONS': {'MAX_ENTRIES': ML_SCORE_CACHE_SIZE * 10},
+        },
+    }
+    ML_SCORE_CACHE_BACKEND = ML_SCORE_CACHE_BACKEND or 'ml_scores'
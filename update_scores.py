@@ -1,24 +1,69 @@
 import os
+import sys
 import django
 
 # Setup Django Environment
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'intellidebt.settings')
 django.setup()
 
-from core.models import Loan
+from core.models import Loan, RiskScore
 from core.ml_utils import ml_system
+from core.scoring import feature_hashes, stamp_scores
+from core.strategy import STRATEGY_FIELDS, apply_to_loans
 
-def update_all_risk_scores():
+# Loans scored and written back per round trip
+CHUNK_SIZE = 2000
+
+
+def _flush(batch, force=False):
+    """
+    Scores one chunk in a single model call and writes it back with one bulk UPDATE.
+    Loans already scored by the active model on identical inputs are skipped unless `force`.
+    Returns the number of loans re-scored.
+    """
+    features = [{col: f.get(col, 0) for col in ml_system.features_list} for _, f in batch]
+    hashes = feature_hashes(features, ml_system.features_list)
+    todo = [
+        (loan, row) for (loan, _), row, digest in zip(batch, features, hashes)
+        if force or (loan.model_version, loan.feature_hash) != (ml_system.model_version, digest)
+    ]
+    if not todo:
+        return 0
+
+    loans = [loan for loan, _ in todo]
+    rows = [row for _, row in todo]
+    scores = ml_system.predict_proba(rows, loan_ids=[loan.pk for loan in loans]) if ml_system.classifier else [0.5] * len(todo)
+    explanations = ml_system.explain_batch(rows)
+    for loan, risk_score, explanation in zip(loans, scores, explanations):
+        loan.predicted_default_risk = float(risk_score)
+        loan.risk_percentage = float(risk_score) * 100
+        loan.risk_explanation = ", ".join(explanation)
+        loan.refresh_risk_band()
+    apply_to_loans(loans)
+    history = stamp_scores(loans, rows, scores, ml_system.model_version, ml_system.features_list, source='update_scores')
+    Loan.objects.bulk_update(loans, [
+        'predicted_default_risk', 'risk_percentage', 'risk_explanation', 'risk_band',
+        'model_version', 'feature_hash', 'scored_at', *STRATEGY_FIELDS,
+    ])
+    RiskScore.objects.bulk_create(history)
+    return len(loans)
+
+
+def update_all_risk_scores(force=False):
     print("Loading Machine Learning Model...")
-    loans = Loan.objects.all()
+    # Scores and strategies are written back from these reads, so they come from the
+    # primary even when a read replica is configured (a lagging copy would write stale ones)
+    loans = Loan.objects.select_related('client').order_by('id')
     print(f"Found {loans.count()} loans. Calculating risk scores...")
 
     count = 0
-    for loan in loans:
+    rescored = 0
+    batch = []
+    for loan in loans.iterator(chunk_size=CHUNK_SIZE):
         # 1. Prepare Features
         features = {
             'Age': loan.client.age,
-            'Monthly_Income': loan.client.income,
+            'Monthly_Income': loan.client.monthly_income,
             'Loan_Amount': loan.amount,
             'Loan_Tenure': loan.tenure,
             'Interest_Rate': loan.interest_rate,
@@ -26,25 +71,31 @@ def update_all_risk_scores():
             'Outstanding_Loan_Amount': loan.outstanding_amount,
             'Monthly_EMI': loan.monthly_emi,
             'Num_Missed_Payments': loan.missed_payments,
-            'Days_Past_Due': loan.days_past_due
+            'Days_Past_Due': loan.days_past_due,
+
+            # The 3 engineered features (same as loan_detail, so both produce the same feature hash)
+            'DTI_Ratio': float(loan.monthly_emi) / float(loan.client.monthly_income if loan.client.monthly_income > 0 else 1),
+            'Loan_to_Collateral': float(loan.outstanding_amount) / float(loan.collateral_value if loan.collateral_value > 0 else 1),
+            'Payment_Strain': float(loan.days_past_due) * float(loan.monthly_emi)
         }
+        batch.append((loan, features))
 
-        # 2. Get Risk Score from ML System
-        risk_score, strategy = ml_system.predict_risk(features)
-        explanation = ml_system.explain_prediction(features)
+        # 2. Score + save to Database one chunk at a time
+        if len(batch) >= CHUNK_SIZE:
+            rescored += _flush(batch, force)
+            batch = []
 
-        # 3. Save to Database
-        loan.predicted_default_risk = risk_score
-        loan.risk_explanation = ", ".join(explanation)
-        loan.save()
-        
         count += 1
         if count % 50 == 0:
             print(f"Processed {count} loans...")
 
+    if batch:
+        rescored += _flush(batch, force)
+
     print("------------------------------------------------")
-    print("Success! Risk scores updated for all loans.")
+    print(f"Success! {rescored} of {count} loans re-scored with model {ml_system.model_version}.")
     print("------------------------------------------------")
 
 if __name__ == '__main__':
-    update_all_risk_scores()
\ No newline at end of file
+    # --all re-scores every loan, even those already scored by this model on the same inputs
+    update_all_risk_scores(force='--all' in sys.argv)